@@ -1,14 +1,24 @@
+import gc, hmac
 from flask import Flask, request, session
 from flask_cors import CORS, cross_origin
-from flask_socketio import SocketIO, send, emit, ConnectionRefusedError, join_room
+from flask_socketio import SocketIO, send, emit, join_room
 from model.model import Model
 from model.config import Config
+from model.metrics import metrics
+from model.observers import ObserverHub
+from model.session_store import SessionStore
+from model.tasks import load_task_templates
+from model.compression import PayloadCompressor
+from model.qos import QoSScheduler
 
 # --- create the app --- #
 
 # has to be passed by clients to connect
 # might want to set this in the environment variables: AUTH = os.environ['GOLMI_AUTH']
 AUTH = "GiveMeTheBigBluePasswordOnTheLeft"
+# has to be passed to the admin routes and events (metrics switch, profiler), see is_admin.
+# Keep it separate from AUTH, which every participant's client knows
+ADMIN_AUTH = "change this to a secret only the experimenters know"
 app = Flask(__name__)
 # --- app settings --- # 
 # Secret key used for sessions: 
@@ -17,157 +27,143 @@ app = Flask(__name__)
 # (This is the recommendation by the Flask documentation: https://flask.palletsprojects.com/en/2.0.x/quickstart/#sessions)
 app.config["SECRET KEY"] = "definite change this to some random value!".encode("utf-8")
 app.config["DATA_COLLECTION"] = "app/static/resources/data_collection"
+# task files that clients can load by name (see preload)
+app.config["TASKS"] = "app/static/resources/tasks"
+# verbose per-message logging of socketio and engineio. Expensive, disable in production
+app.config["SOCKETIO_LOGGING"] = True
+# record performance metrics from the start. Can be toggled at runtime via /metrics
+app.config["METRICS"] = False
+# SQLite file to journal sessions in, so they survive a restart. None to keep sessions in memory only
+app.config["SESSION_STORE"] = None
+# stored sessions without actions for this many seconds are deleted. None to keep them forever
+app.config["SESSION_MAX_AGE"] = 7 * 24 * 3600
+# payloads with a JSON of at least this many bytes are compressed for clients that connect
+# with the option 'compression' (see parse_auth). Clients can pass their own threshold
+app.config["COMPRESSION_THRESHOLD"] = 1024
+# actions per second all sessions together should not exceed. Sessions of lower priority classes
+# (e.g. 'bot') are throttled first, see model/qos.py. None to only limit each session's rate
+app.config["QOS_CAPACITY"] = 500
 
 # enable cross-origin requests 
 # TODO: restrict sources
 CORS(app)
 # add socket io
-socketio = SocketIO(app, logger=True, engineio_logger=True, cors_allowed_origins='*')
+socketio = SocketIO(app, logger=app.config["SOCKETIO_LOGGING"], 
+	engineio_logger=app.config["SOCKETIO_LOGGING"], cors_allowed_origins='*')
+metrics.enabled = app.config["METRICS"]
 
 # --- create a data model --- #
 
 config = Config("app/static/resources/config/pentomino_types.json")
+# shared by all sessions, changes by a client are stored in a per-session overlay
+config.freeze()
 # session ids mapped to Model instances
 client_models = dict()
+# read-only subscribers of sessions
+observer_hub = ObserverHub(socketio)
+# optional durable storage of sessions, clients resume by passing a session key
+session_store = SessionStore(app.config["SESSION_STORE"], max_age=app.config["SESSION_MAX_AGE"]) \
+	if app.config["SESSION_STORE"] else None
+# session keys of the connected clients mapped to their session ids
+session_keys = dict()
+# action budgets of the sessions by session class (connection option 'session_class')
+qos = QoSScheduler(capacity=app.config["QOS_CAPACITY"])
+# task names mapped to parsed states, filled by preload()
+task_templates = dict()
+
+def preload(freeze=True):
+	"""
+	Load and compile the read-only data shared by all sessions: block matrices of all
+	types in all orientations and the task templates. Call this before server workers
+	are forked, so the data is built once and shared copy-on-write between them.
+	@param freeze 	move all objects created so far to the permanent generation of the
+		garbage collector (gc.freeze), so collections in forked workers don't write to
+		(and thereby copy) the shared memory pages
+	"""
+	config.get_type_table().compile()
+	task_templates.update(load_task_templates(app.config["TASKS"], config))
+	if freeze:
+		gc.collect()
+		gc.freeze()
+
+def is_admin(token):
+	"""
+	@param token 	token passed with an admin request or event
+	@return True if the token is ADMIN_AUTH
+	"""
+	return type(token) == str and hmac.compare_digest(token.encode("utf-8"), ADMIN_AUTH.encode("utf-8"))
 
 # finally load the routes
 from app import views
 
 # --- socketio events --- #
 # --- connection --- #
+def parse_auth(auth):
+	"""
+	Clients pass the token directly or as key 'token' of a dict
+	that can hold further connection options (e.g. 'role', 'compression', 'session_class', 'session',
+	'admin' for session classes that require the admin token).
+	@return dict of connection options or None if the token is wrong
+	"""
+	options = auth if type(auth) == dict else {"token": auth}
+	return options if options.get("token") == AUTH else None
+
+def make_compressor(options):
+	"""
+	@param options 	connection options, see parse_auth. 'compression' is true to accept
+		compressed payloads above the app's threshold or a custom threshold in bytes
+	@return PayloadCompressor or None if the client did not ask for compression
+	"""
+	accepted = options.get("compression")
+	if not accepted:
+		return None
+	if type(accepted) == int:
+		return PayloadCompressor(threshold=accepted)
+	return PayloadCompressor(threshold=app.config["COMPRESSION_THRESHOLD"])
+
+from app.events import SocketEvents, EVENTS
+# validation and dispatch of the events, shared with the asyncio server (app/asgi.py)
+events = SocketEvents(client_models, observer_hub)
+
 @socketio.on("connect")
+@metrics.timed("socket.connect")
 def client_connect(auth):
-	# authenticate the client:
-	if auth != AUTH:
-		raise ConnectionRefusedError("unauthorized")
+	# authenticate the client
+	options = events.authorize(auth)
+	# observers only subscribe to other sessions, they don't get a model
+	if options.get("role") == "observer":
+		return
 
 	# add client to the list, for now each client gets their own room
 	# create a model for this client
-	client_models[request.sid] = Model(config, socketio, request.sid)
+	model = events.create_model(Model, socketio, request.sid, options)
+	# with a session store, a client passing a session key continues where it left off
+	session_key = events.claim_session(options, request.sid)
+	if session_key:
+		try:
+			events.restore_session(model, options, session_key)
+		except Exception:
+			events.release_session(session_key)
+			raise
 	room = session.get("room")
 	join_room(room)
 
-	# send config and state
-	emit("update_config", client_models[request.sid].config.to_dict())
-	emit("update_state", client_models[request.sid].state.to_dict())
-
-# --- state --- #
-@socketio.on("load_state")
-def load_state(json):
-	client_models[request.sid].set_state(json)
-
-# --- configuration --- #
-@socketio.on("load_config")
-def load_config(json):
-	client_models[request.sid].set_config(json)
-
-# --- gripper --- #
-@socketio.on("add_gripper")
-def add_gripper(gr_id=None):
-	# if no id was passed (or None), use the session id
-	if not gr_id:
-		gr_id = request.sid
-	# add gripper to the model
-	client_models[request.sid].add_gr(gr_id)
-	emit("attach_gripper", gr_id)
-
-@socketio.on("remove_gripper")
-def remove_gripper(gr_id=None):
-	# if no id was passed (or None), use the session id
-	if not gr_id:
-		gr_id = request.sid
-	# delete the gripper
-	client_models[request.sid].remove_gr(gr_id)
-
-# For all actions: move, flip, rotate, grip, there are 2 options: 'one-time action' and 'looped action'.
-# See the documentation for details.
-
-@socketio.on("move")
-def move(params):
-	# check the arguments and make sure the gripper exists
-	if type(params) == dict and "id" in params and "dx" in params and "dy" in params and \
-		client_models[request.sid].get_gripper_by_id(str(params["id"])) != None:
-
-		step_size = params["step_size"] if "step_size" in params else None
-		# continuous / looped action
-		if "loop" in params and params["loop"]:
-			client_models[request.sid].start_moving(
-				str(params["id"]), params["dx"], params["dy"], step_size)
-		# one-time action
-		else:
-			client_models[request.sid].move(
-				str(params["id"]), params["dx"], params["dy"], step_size)
-
-@socketio.on("stop_move")
-def stop_move(params):
-	# check the arguments and make sure the gripper exists
-	if type(params) == dict and "id" in params and \
-		client_models[request.sid].get_gripper_by_id(str(params["id"])):
-
-		client_models[request.sid].stop_moving(str(params["id"]))
-
-@socketio.on("rotate")
-def rotate(params):
-	# check the arguments and make sure the gripper exists
-	if type(params) == dict or "id" in params and "direction" in params and \
-		client_models[request.sid].get_gripper_by_id(str(params["id"])) != None:
-		
-		step_size = params["step_size"] if "step_size" in params else None
-		# continuous / looped action
-		if "loop" in params and params["loop"]:
-			client_models[request.sid].start_rotating(
-				str(params["id"]), params["direction"], step_size)
-		# one-time action
-		else:
-			client_models[request.sid].rotate(
-				str(params["id"]), params["direction"], step_size)
-
-@socketio.on("stop_rotate")
-def stop_rotate(params):
-	# check the arguments and make sure the gripper exists
-	if type(params) == dict or "id" in params and \
-		client_models[request.sid].get_gripper_by_id(str(params["id"])) != None:
-
-		client_models[request.sid].stop_rotating(str(params["id"]))
-
-@socketio.on("flip")
-def flip(params):
-	# check the arguments and make sure the gripper exists
-	if type(params) == dict or "id" in params and \
-		client_models[request.sid].get_gripper_by_id(str(params["id"])) != None:
-		
-		# continuous / looped action
-		if "loop" in params and params["loop"]:
-			client_models[request.sid].start_flipping(str(params["id"]))
-		# one-time action
-		else:
-			client_models[request.sid].flip(str(params["id"]))
-
-@socketio.on("stop_flip")
-def stop_flip(params):
-	# check the arguments and make sure the gripper exists
-	if type(params) == dict or "id" in params and \
-		client_models[request.sid].get_gripper_by_id(str(params["id"])) != None:
-		
-		client_models[request.sid].stop_flipping(str(params["id"]))
-
-@socketio.on("grip")
-def grip(params):
-	# check the arguments and make sure the gripper exists
-	if type(params) == dict and "id" in params and \
-		client_models[request.sid].get_gripper_by_id(str(params["id"])) != None:
-
-		# continuous / looped action
-		if "loop" in params and params["loop"]:
-			client_models[request.sid].start_gripping(str(params["id"]))
-		# one-time action
-		else:
-			client_models[request.sid].grip(str(params["id"]))
-
-@socketio.on("stop_grip")
-def stop_grip(params):
-	# check the arguments and make sure the gripper exists
-	if type(params) == dict or "id" in params and \
-		client_models[request.sid].get_gripper_by_id(str(params["id"])) != None:
-
-		client_models[request.sid].stop_gripping(str(params["id"]))
+	# send config and state, compressed if large and the client asked for it
+	for event_name, data in events.open(request.sid, model, options):
+		emit(event_name, data)
+
+@socketio.on("disconnect")
+@metrics.timed("socket.disconnect")
+def client_disconnect(*args):
+	events.close(request.sid)
+
+def _handler(event_name):
+	@metrics.timed("socket." + event_name)
+	def handler(*args):
+		return events.dispatch(event_name, request.sid, *args)
+	return handler
+
+# all other events, see app/events.py. For all actions: move, flip, rotate, grip, there are
+# 2 options: 'one-time action' and 'looped action'. See the documentation for details.
+for event_name in EVENTS:
+	socketio.on_event(event_name, _handler(event_name))
@@ -0,0 +1,164 @@
+import asyncio, json
+import socketio
+from flask import render_template
+from urllib.parse import parse_qs
+from app import app, is_admin, preload, task_templates
+from app.events import SocketEvents, EVENTS
+from app.views import write_log
+from model.async_model import AsyncModel
+from model.metrics import metrics
+from model.observers import AsyncObserverHub
+from model.profiler import profiler
+from model.type_registry import type_registry
+
+# --- asyncio server mode --- #
+# Alternative to the Flask-SocketIO/eventlet server with the same socket events,
+# built on python-socketio's ASGI support.
+# usage: python run.py --asgi   or   uvicorn app.asgi:asgi_app --host HOST --port PORT
+
+# build the shared data unless run.py already did, e.g. when started by uvicorn directly
+if not task_templates:
+	preload()
+
+sio = socketio.AsyncServer(async_mode="asgi", cors_allowed_origins="*")
+# session ids mapped to AsyncModel instances
+client_models = dict()
+# read-only subscribers of sessions
+observer_hub = AsyncObserverHub(sio)
+
+# the pages only depend on url_for, so they are rendered once
+with app.test_request_context():
+	PAGES = {
+		"/": render_template("index.html"),
+		"/demo": render_template("demo.html")
+	}
+
+# --- http routes --- #
+
+async def _read_body(receive):
+	body = b""
+	more_body = True
+	while more_body:
+		message = await receive()
+		body += message.get("body", b"")
+		more_body = message.get("more_body", False)
+	return body
+
+async def _respond(send, status, body, content_type="text/plain", headers=None):
+	if type(body) == str:
+		body = body.encode("utf-8")
+	await send({"type": "http.response.start", "status": status,
+		"headers": [(b"content-type", content_type.encode("utf-8"))] + (headers or list())})
+	await send({"type": "http.response.body", "body": body})
+
+async def http_app(scope, receive, send):
+	"""
+	Minimal ASGI application for the routes of app/views.py.
+	"""
+	path = scope["path"]
+	method = scope["method"]
+	# see views.metrics_endpoint and views.profile
+	admin = is_admin(dict(scope["headers"]).get(b"x-admin-token", b"").decode("utf-8", "replace"))
+	if path in PAGES and method == "GET":
+		await _respond(send, 200, PAGES[path], "text/html")
+	elif path == "/save_log" and method == "POST":
+		try:
+			json_data = json.loads(await _read_body(receive))
+		except ValueError:
+			await _respond(send, 400, "bad request")
+			return
+		# the disk write must not block the event loop
+		await asyncio.get_running_loop().run_in_executor(
+			None, write_log, app.config["DATA_COLLECTION"], json_data)
+		await _respond(send, 200, "0")
+	elif path.startswith("/types/") and method == "GET":
+		# see views.types
+		table = type_registry.get(path[len("/types/"):])
+		if not table:
+			await _respond(send, 404, "not found")
+			return
+		etag = '"{}"'.format(table.hash).encode("utf-8")
+		headers = [(b"etag", etag), (b"cache-control", b"public, max-age=31536000, immutable")]
+		if etag in dict(scope["headers"]).get(b"if-none-match", b""):
+			await _respond(send, 304, b"", "application/json", headers)
+		else:
+			await _respond(send, 200, table.json, "application/json", headers)
+	elif path == "/metrics" and method in ("GET", "POST"):
+		# see views.metrics_endpoint
+		if method == "POST":
+			if not admin:
+				await _respond(send, 403, "forbidden")
+				return
+			try:
+				json_data = json.loads(await _read_body(receive))
+			except ValueError:
+				json_data = None
+			if type(json_data) != dict:
+				await _respond(send, 400, "bad request")
+				return
+			if "enabled" in json_data:
+				metrics.enabled = bool(json_data["enabled"])
+			if json_data.get("reset"):
+				metrics.reset()
+		if parse_qs(scope["query_string"].decode("utf-8")).get("format") == ["prometheus"]:
+			await _respond(send, 200, metrics.to_prometheus())
+		else:
+			await _respond(send, 200, json.dumps(metrics.to_dict()), "application/json")
+	elif path.startswith("/profile/") and method in ("GET", "POST", "DELETE"):
+		# see views.profile
+		if not admin:
+			await _respond(send, 403, "forbidden")
+			return
+		session_id = path[len("/profile/"):]
+		if method == "POST":
+			profiler.start(session_id)
+		elif method == "DELETE":
+			profiler.stop(session_id)
+		await _respond(send, 200, profiler.collapsed(session_id))
+	else:
+		await _respond(send, 404, "not found")
+
+asgi_app = socketio.ASGIApp(sio, other_asgi_app=http_app, static_files={"/static": "app/static"})
+
+# --- socketio events --- #
+# validation and dispatch are shared with the Flask-SocketIO server, see app/events.py
+events = SocketEvents(client_models, observer_hub)
+
+@sio.on("connect")
+@metrics.timed("socket.connect")
+async def client_connect(sid, environ, auth=None):
+	# authenticate the client
+	options = events.authorize(auth)
+	# observers only subscribe to other sessions, they don't get a model
+	if options.get("role") == "observer":
+		return
+
+	# create a model for this client, each client gets their own room (the session id)
+	model = events.create_model(AsyncModel, sio, sid, options)
+	# resume a stored session, see app/__init__.py
+	session_key = events.claim_session(options, sid)
+	if session_key:
+		try:
+			# reading and replaying the journal must not block the event loop
+			await asyncio.get_running_loop().run_in_executor(None, events.restore_session, model, options, session_key)
+		except Exception:
+			events.release_session(session_key)
+			raise
+
+	# send config and state, compressed if large and the client asked for it
+	for event_name, data in events.open(sid, model, options):
+		await sio.emit(event_name, data, to=sid)
+
+@sio.on("disconnect")
+@metrics.timed("socket.disconnect")
+async def client_disconnect(sid, *args):
+	events.close(sid)
+
+def _handler(event_name):
+	@metrics.timed("socket." + event_name)
+	async def handler(sid, *args):
+		return events.dispatch(event_name, sid, *args)
+	return handler
+
+for event_name in EVENTS:
+	sio.on(event_name, _handler(event_name))
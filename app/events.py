@@ -0,0 +1,301 @@
+from math import isfinite
+import secrets
+from socketio.exceptions import ConnectionRefusedError
+from app import config, parse_auth, is_admin, make_compressor, qos, session_store, session_keys, task_templates
+from model.model import MAX_LEGAL_STEPS
+from model.metrics import metrics
+from model.profiler import profiler
+
+# --- socket events shared by both server modes --- #
+# The Flask-SocketIO server (app/__init__.py) and the asyncio server (app/asgi.py) only
+# differ in how they receive events and send replies. Validation and dispatch to the
+# models are done here, so the two servers can't drift apart.
+
+class SocketEvents:
+	def __init__(self, models, observer_hub):
+		"""
+		@param models 	dict mapping session ids to the Model instances of the server
+		@param observer_hub 	ObserverHub of the server
+		"""
+		self.models = models
+		self.observer_hub = observer_hub
+		# event names mapped to methods taking the session id and the event's arguments
+		self.handlers = {name: getattr(self, name) for name in EVENTS}
+
+	def dispatch(self, event_name, sid, *args):
+		"""
+		Handle an event of a connected client. Events for a model are ignored if the
+		client has none (observers).
+		@return the result for the acknowledgement callback
+		"""
+		if sid not in self.models and event_name not in SESSIONLESS_EVENTS:
+			return None
+		return self.handlers[event_name](sid, *args)
+
+	# --- connection --- #
+
+	def authorize(self, auth):
+		"""
+		Check the connection options, see parse_auth. Raises ConnectionRefusedError.
+		@return dict of connection options
+		"""
+		options = parse_auth(auth)
+		if options is None:
+			raise ConnectionRefusedError("unauthorized")
+		if options.get("role") == "observer":
+			# observers see every session, they need the admin token
+			if not is_admin(options.get("admin")):
+				raise ConnectionRefusedError("unauthorized")
+			return options
+		# humans unless stated otherwise, agents should connect as 'bot'
+		session_class = options.setdefault("session_class", "human")
+		if session_class not in qos.classes:
+			raise ConnectionRefusedError("unknown session class")
+		if qos.classes[session_class].admin_only and not is_admin(options.get("admin")):
+			raise ConnectionRefusedError("unauthorized session class")
+		return options
+
+	def create_model(self, model_class, socket, sid, options):
+		"""
+		@return new model for a client, compressing its updates if the client asked for it
+		"""
+		model = model_class(config, socket, sid, self.observer_hub)
+		model.compressor = make_compressor(options)
+		return model
+
+	def claim_session(self, options, sid):
+		"""
+		Reserve the stored session a client wants to resume, see app.config["SESSION_STORE"].
+		With the option 'session' true, a new session key is issued instead. Raises
+		ConnectionRefusedError if another client uses the session.
+		@return the session key or None if the client does not use a durable session
+		"""
+		session_key = options.get("session")
+		if not session_store or not session_key:
+			return None
+		if session_key is True:
+			# keys are only issued by the server, so they can't be guessed
+			session_key = secrets.token_urlsafe(24)
+		elif type(session_key) != str:
+			raise ConnectionRefusedError("unknown session")
+		if session_key in session_keys:
+			raise ConnectionRefusedError("session in use")
+		session_keys[session_key] = sid
+		return session_key
+
+	def restore_session(self, model, options, session_key):
+		"""
+		Load a claimed session into the model, or store it if it is new. Reads the database,
+		so the asyncio server calls it in an executor. Raises ConnectionRefusedError if
+		the client passed a key that is not stored.
+		"""
+		new = options.get("session") is True
+		if not session_store.restore(model, session_key, create=new) and not new:
+			raise ConnectionRefusedError("unknown session")
+
+	def release_session(self, session_key):
+		session_keys.pop(session_key, None)
+
+	def open(self, sid, model, options):
+		"""
+		Register the model of a connected client.
+		@return list of (event name, data) to send to the client: the compression
+			settings if any, the configuration and the state
+		"""
+		model.budget = qos.register(sid, options["session_class"])
+		self.models[sid] = model
+		metrics.set_gauge("active_sessions", len(self.models))
+		initial = list()
+		if model.journal:
+			# the key to resume the session with
+			initial.append(("session", model.journal.session))
+		if model.compressor:
+			initial.append(("compression", model.compressor.to_dict()))
+		initial.append(("update_config", model.encode("update_config", model.config.to_dict())))
+		initial.append(("update_state", model.encode("update_state", model.get_state_dict())))
+		return initial
+
+	def close(self, sid):
+		"""
+		Stop any looped actions and discard the client's model, or end its subscriptions
+		if it is an observer.
+		"""
+		if sid in self.models:
+			model = self.models.pop(sid)
+			model.stop_all_loops()
+			# the journal stays in the store to resume the session later
+			if model.journal:
+				self.release_session(model.journal.session)
+			self.observer_hub.close(sid)
+			qos.unregister(sid)
+		self.observer_hub.unsubscribe(sid)
+		metrics.set_gauge("active_sessions", len(self.models))
+
+	# --- observers --- #
+
+	def observe(self, sid, room):
+		# read-only subscription to the updates of another session, for observer connections only.
+		# Returns whether the session exists.
+		if sid in self.models or room not in self.models:
+			return False
+		model = self.models[room]
+		self.observer_hub.subscribe(room, sid, [
+			("update_config", model.config.to_dict()),
+			("update_state", model.get_state_dict())])
+		return True
+
+	def stop_observing(self, sid, room=None):
+		# unsubscribe from a single session or, if no room is given, from all
+		self.observer_hub.unsubscribe(sid, room)
+
+	# --- profiling --- #
+
+	def profile(self, sid, params):
+		# toggle sampling of some session, default: the client's own session. Requires the key 'admin'
+		# with the admin token. Returns the collapsed stacks when sampling is stopped.
+		if type(params) == dict and "enabled" in params and is_admin(params.get("admin")):
+			session_id = params["session"] if "session" in params else sid
+			if params["enabled"]:
+				profiler.start(session_id)
+			else:
+				profiler.stop(session_id)
+				return profiler.collapsed(session_id)
+
+	# --- state --- #
+
+	def load_state(self, sid, json):
+		self.models[sid].set_state(json)
+
+	def load_task(self, sid, name):
+		# load one of the preloaded tasks by name. Returns whether the task exists.
+		if name not in task_templates:
+			return False
+		self.models[sid].set_state(task_templates[name].copy())
+		return True
+
+	# --- configuration --- #
+
+	def load_config(self, sid, json):
+		self.models[sid].set_config(json)
+
+	# --- gripper --- #
+
+	def add_gripper(self, sid, gr_id=None):
+		# if no id was passed (or None), use the session id
+		if not gr_id:
+			gr_id = sid
+		self.models[sid].add_gr(gr_id)
+		self.models[sid].send("attach_gripper", gr_id)
+
+	def remove_gripper(self, sid, gr_id=None):
+		# if no id was passed (or None), use the session id
+		if not gr_id:
+			gr_id = sid
+		self.models[sid].remove_gr(gr_id)
+
+	# For all actions: move, flip, rotate, grip, there are 2 options: 'one-time action' and 'looped action'.
+	# See the documentation for details.
+
+	def _valid(self, model, params, *keys):
+		"""
+		@return True if params is a dict with all keys and an 'id' of an existing gripper
+		"""
+		return type(params) == dict and "id" in params and all(key in params for key in keys) and \
+			model.get_gripper_by_id(str(params["id"])) != None
+
+	def move(self, sid, params):
+		model = self.models[sid]
+		if self._valid(model, params, "dx", "dy"):
+			step_size = params["step_size"] if "step_size" in params else None
+			# continuous / looped action
+			if "loop" in params and params["loop"]:
+				model.start_moving(str(params["id"]), params["dx"], params["dy"], step_size)
+			# one-time action, numbered if the client predicts it
+			else:
+				model.apply_sequenced(str(params["id"]), params.get("seq"),
+					model.move, str(params["id"]), params["dx"], params["dy"], step_size)
+
+	def stop_move(self, sid, params):
+		if self._valid(self.models[sid], params):
+			self.models[sid].stop_moving(str(params["id"]))
+
+	def rotate(self, sid, params):
+		model = self.models[sid]
+		if self._valid(model, params, "direction"):
+			step_size = params["step_size"] if "step_size" in params else None
+			if "loop" in params and params["loop"]:
+				model.start_rotating(str(params["id"]), params["direction"], step_size)
+			else:
+				model.apply_sequenced(str(params["id"]), params.get("seq"),
+					model.rotate, str(params["id"]), params["direction"], step_size)
+
+	def stop_rotate(self, sid, params):
+		if self._valid(self.models[sid], params):
+			self.models[sid].stop_rotating(str(params["id"]))
+
+	def flip(self, sid, params):
+		model = self.models[sid]
+		if self._valid(model, params):
+			if "loop" in params and params["loop"]:
+				model.start_flipping(str(params["id"]))
+			else:
+				model.apply_sequenced(str(params["id"]), params.get("seq"), model.flip, str(params["id"]))
+
+	def stop_flip(self, sid, params):
+		if self._valid(self.models[sid], params):
+			self.models[sid].stop_flipping(str(params["id"]))
+
+	def grip(self, sid, params):
+		model = self.models[sid]
+		if self._valid(model, params):
+			if "loop" in params and params["loop"]:
+				model.start_gripping(str(params["id"]))
+			else:
+				model.apply_sequenced(str(params["id"]), params.get("seq"), model.grip, str(params["id"]))
+
+	def stop_grip(self, sid, params):
+		if self._valid(self.models[sid], params):
+			self.models[sid].stop_gripping(str(params["id"]))
+
+	def set_viewport(self, sid, params=None):
+		# only send the part of the board the client displays, see Model.set_viewport.
+		# None to receive the whole board again.
+		if type(params) == dict and all(key in params and type(params[key]) in (int, float) and
+			isfinite(params[key]) for key in ("x", "y", "width", "height")):
+			self.models[sid].set_viewport(params)
+		elif params is None:
+			self.models[sid].set_viewport(None)
+
+	def batch(self, sid, params):
+		# apply a list of actions with a single update, see Model.apply_batch. Returns the results.
+		if type(params) == dict and type(params.get("actions")) == list:
+			model = self.models[sid]
+			# a batch counts as many actions as it holds. If throttled, the result says when to retry
+			if not model.admit(len(params["actions"])):
+				return {"committed": False, "results": [None] * len(params["actions"]),
+					"retry_after": model.budget.retry_after}
+			return model.apply_batch(params["actions"], bool(params.get("atomic", True)))
+
+	# --- agents --- #
+
+	def get_legal_actions(self, sid, params):
+		# returns the action mask, see Model.get_legal_actions. max_steps must be an int from 1 to
+		# MAX_LEGAL_STEPS, step_size a positive number. Counts as an action of the session's budget.
+		if type(params) == dict and "id" in params:
+			max_steps = params["max_steps"] if "max_steps" in params else 1
+			step_size = params["step_size"] if "step_size" in params else None
+			if type(max_steps) != int or not 1 <= max_steps <= MAX_LEGAL_STEPS:
+				return None
+			if step_size is not None and (type(step_size) not in (int, float) or
+				not isfinite(step_size) or step_size <= 0):
+				return None
+			model = self.models[sid]
+			if model.admit():
+				return model.get_legal_actions(str(params["id"]), max_steps, step_size)
+
+# events that don't need a model, e.g. sent by observers
+SESSIONLESS_EVENTS = ("observe", "stop_observing", "profile")
+# events clients may send after connecting, see SocketEvents.dispatch
+EVENTS = ("observe", "stop_observing", "profile", "load_state", "load_task", "load_config",
+	"add_gripper", "remove_gripper", "move", "stop_move", "rotate", "stop_rotate", "flip", "stop_flip",
+	"grip", "stop_grip", "set_viewport", "batch", "get_legal_actions")
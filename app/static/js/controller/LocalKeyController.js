@@ -5,12 +5,17 @@ $(document).ready(function () {
 	 * at connection. If a gripperId is passed, an existing gripper with this id is assigned.
 	 * Otherwise a new gripper is added with the given id or alternatively the session id. 
 	 * The user's keystrokes are used to control the assigned gripper(s) and any gripped object.
-	 * @param {optional Array of [socket, gripperId], where gripperId can be null, default:null} modelSockets
+	 * One-time actions are numbered. If a view is attached together with a model, moves are
+	 * shown by the view right away (see View.predictMove) and corrected by the model's updates.
+	 * @param {optional Array of [socket, gripperId, view], where gripperId and view can be null, default:null} modelSockets
 	 */
 	this.LocalKeyController = class LocalKeyController {
 		constructor(modelSockets=null) {
 			// array of model socket-gripperId pairs that are controlled
 			this.models = modelSockets ? modelSockets : new Array();
+
+			// sequence number of the last action sent
+			this.seq = 0;
 			
 			// assign functions to key codes: [function for keydown, function for keyup, down?] 
 			// grip and flip are one-time actions, move and rotate are looped
@@ -47,8 +52,9 @@ $(document).ready(function () {
 		 * passed, the session id of the socket is used.
 		 * @param {socket of the model server to notify} socket
 		 * @param {optional: id of the gripper to control, default: null} grId
+		 * @param {optional: view of the model that should predict the gripper's moves, default: null} view
 		 */
-		attachModel(socket, grId=null) {
+		attachModel(socket, grId=null, view=null) {
 			// make sure not to subscribe a model-gripper pair twice
 			for (let [s, g] of this.models) {
 				if (s.id == socket.id && g == grId) { return; }
@@ -57,7 +63,7 @@ $(document).ready(function () {
 			socket.emit("add_gripper", grId);
 			// use the id authoratively assigned by the model
 			socket.on("attach_gripper", (assignedId) => {
-				this.models.push([socket, assignedId]);
+				this.models.push([socket, assignedId, view]);
 			});
 		}
 
@@ -71,7 +77,7 @@ $(document).ready(function () {
 			if (grId) {
 				// only remove pairs [socket, gripperId]
 				for (let i = 0; i < this.models.length; i++) {
-					if (this.models[i][0].id == socket.id && this.models[i][2] == grId) {
+					if (this.models[i][0].id == socket.id && this.models[i][1] == grId) {
 						this.models[i][0].emit("remove_gripper", grId);
 						this.models.splice(i, 1); 
 					}
@@ -97,7 +103,7 @@ $(document).ready(function () {
 			let loop = false;
 			// send an event to each model
 			thisArg.models.forEach(([socket, grId]) => {
-				socket.emit("grip", {"id": grId, "loop":loop});
+				socket.emit("grip", {"id": grId, "loop":loop, "seq": thisArg._nextSeq()});
 			});
 		}
 
@@ -142,8 +148,11 @@ $(document).ready(function () {
  		 */
 		_moveGr(dx, dy) {
 			let loop = false;
-			this.models.forEach(([socket, grId]) => {
-				socket.emit("move", {"id": grId, "dx": dx, "dy": dy, "loop": loop});
+			this.models.forEach(([socket, grId, view]) => {
+				let seq = this._nextSeq();
+				// show the move before the model confirms it
+				if (view) { view.predictMove(grId, seq, dx, dy); }
+				socket.emit("move", {"id": grId, "dx": dx, "dy": dy, "loop": loop, "seq": seq});
 			});
 		}
 
@@ -172,7 +181,7 @@ $(document).ready(function () {
 		_rotate(direction) {
 			let loop = false;
 			this.models.forEach(([socket, grId]) => {
-				socket.emit("rotate", {"id":grId, "direction":direction, "loop":loop});
+				socket.emit("rotate", {"id":grId, "direction":direction, "loop":loop, "seq": this._nextSeq()});
 			});
 		}
 
@@ -189,7 +198,7 @@ $(document).ready(function () {
 		flip(thisArg) { 
 			let loop = false;
 			thisArg.models.forEach(([socket, grId]) => {
-				socket.emit("flip", {"id":grId, "loop":loop});
+				socket.emit("flip", {"id":grId, "loop":loop, "seq": thisArg._nextSeq()});
 			});
 		}
 
@@ -199,6 +208,15 @@ $(document).ready(function () {
 			});
 		}
 
+		/**
+		 * The model acknowledges the highest number it applied, so numbers have to increase.
+		 * @return int, sequence number for the next action
+		 */
+		_nextSeq() {
+			this.seq += 1;
+			return this.seq;
+		}
+
 		// --- Reacting to user events ---
 
 		/**
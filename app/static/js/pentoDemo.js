@@ -74,7 +74,7 @@ $(document).ready(function () {
 			// send the initial task state
 			socket.emit("load_state", TESTGAME);
 			// subscribe the controller to some gripper (here we create a new gripper)
-			controller.attachModel(socket, "0");
+			controller.attachModel(socket, "0", layerView);
 			setup_complete = true;
 		}
 	});
@@ -90,14 +90,15 @@ $(document).ready(function () {
 			ctx.fillRect(0,0, this.canvasWidth, this.canvasHeight);
 
 			// horizontal lines
-			for (let row = 0; row <= this.rows; row++) {
-				ctx.moveTo(0, row*this.blockSize);
-				ctx.lineTo(this.canvasWidth, row*this.blockSize);
+			let [x0, y0, x1, y1] = this.visibleArea;
+			for (let row = Math.ceil(y0); row <= y1; row++) {
+				ctx.moveTo(0, this._toPxlY(row));
+				ctx.lineTo(this.canvasWidth, this._toPxlY(row));
 			}
 			// vertical lines
-			for (let col = 0; col <= this.cols; col++) {
-				ctx.moveTo(col*this.blockSize, 0);
-				ctx.lineTo(col*this.blockSize, this.canvasHeight);
+			for (let col = Math.ceil(x0); col <= x1; col++) {
+				ctx.moveTo(this._toPxlX(col), 0);
+				ctx.lineTo(this._toPxlX(col), this.canvasHeight);
 			}
 			// draw to the screen
 			ctx.stroke();
@@ -118,7 +119,7 @@ $(document).ready(function () {
 		 */
 		drawObjs() {
 			// draw each object
-			for (const obj of Object.values(this.objs))	{
+			for (const obj of Object.values(this.staticObjs).concat(Object.values(this.objs)))	{
 				// skip any gripped object here
 				if (obj.gripped) { continue; }
 
@@ -178,10 +179,10 @@ $(document).ready(function () {
 				ctx.lineWidth = 2;
 				// draw. The gripper is a simple cross
 				ctx.beginPath();
-				ctx.moveTo(this._toPxl(gripper.x-grSize), this._toPxl(gripper.y-grSize));
-				ctx.lineTo(this._toPxl(gripper.x+grSize), this._toPxl(gripper.y+grSize));
-				ctx.moveTo(this._toPxl(gripper.x-grSize), this._toPxl(gripper.y+grSize));
-				ctx.lineTo(this._toPxl(gripper.x+grSize), this._toPxl(gripper.y-grSize));
+				ctx.moveTo(this._toPxlX(gripper.x-grSize), this._toPxlY(gripper.y-grSize));
+				ctx.lineTo(this._toPxlX(gripper.x+grSize), this._toPxlY(gripper.y+grSize));
+				ctx.moveTo(this._toPxlX(gripper.x-grSize), this._toPxlY(gripper.y+grSize));
+				ctx.lineTo(this._toPxlX(gripper.x+grSize), this._toPxlY(gripper.y-grSize));
 				ctx.stroke();
 			}
 		}
@@ -225,10 +226,10 @@ $(document).ready(function () {
 			ctx.fillStyle = color;
 
 			ctx.beginPath();
-			ctx.moveTo(this._toPxl(x), this._toPxl(y)); 
-			ctx.lineTo(this._toPxl(x+1), this._toPxl(y)); // top right
-			ctx.lineTo(this._toPxl(x+1), this._toPxl(y+1)); // bottom right
-			ctx.lineTo(this._toPxl(x), this._toPxl(y+1)); // bottom left
+			ctx.moveTo(this._toPxlX(x), this._toPxlY(y)); 
+			ctx.lineTo(this._toPxlX(x+1), this._toPxlY(y)); // top right
+			ctx.lineTo(this._toPxlX(x+1), this._toPxlY(y+1)); // bottom right
+			ctx.lineTo(this._toPxlX(x), this._toPxlY(y+1)); // bottom left
 			ctx.closePath(); // return to starting point
 			ctx.stroke(); // draw the returning line
 			ctx.fill(); // add color
@@ -244,8 +245,8 @@ $(document).ready(function () {
 			ctx.lineWidth = borderWidth;
 
 			ctx.beginPath();
-			ctx.moveTo(this._toPxl(x1), this._toPxl(y1));
-			ctx.lineTo(this._toPxl(x2), this._toPxl(y2));
+			ctx.moveTo(this._toPxlX(x1), this._toPxlY(y1));
+			ctx.lineTo(this._toPxlX(x2), this._toPxlY(y2));
 			ctx.stroke();
 		}
 
@@ -253,5 +254,15 @@ $(document).ready(function () {
 			return coord * this.blockSize;
 		}
 
+		// board x coordinate to canvas pixels, relative to the displayed area
+		_toPxlX(x) {
+			return this._toPxl(x - this.visibleArea[0]);
+		}
+
+		// board y coordinate to canvas pixels, relative to the displayed area
+		_toPxlY(y) {
+			return this._toPxl(y - this.visibleArea[1]);
+		}
+
 	}; // class LayerView end
 }); // on document ready end
@@ -14,6 +14,8 @@ $(document).ready(function () {
 			this.startTime;
 			// if used, only log updates for this gripper
 			this.grId;
+			// settings of the payload compression, see View.js: decodePayload
+			this.compression = null;
 			// only used if logFullState is true
 			this.currentObjs = new Object();
 			this.currentGrippers = new Object();
@@ -50,10 +52,14 @@ $(document).ready(function () {
 		 * initialization, the view logs the client-server communication.
 		 */
 		_initSocketEvents() {
+			this.socket.on("compression", (settings) => {
+				this.compression = settings;
+			});
 			this.socket.on("attach_gripper", (assignedId) => {
 				this.grId = assignedId;
 			});
 			this.socket.on("update_state", (state) => {
+				state = document.decodePayload(state, this.compression);
 				// Assumes the logging starts at first 'update_state' event.
 				let timeOffset;
 				if (!this.startTime) {
@@ -78,6 +84,7 @@ $(document).ready(function () {
 				//}
 			})
 			this.socket.on("update_grippers", (grippers) => {
+				grippers = document.decodePayload(grippers, this.compression);
 				if (this.startTime) {
 					let timeOffset = Date.now() - this.startTime;
 					if (this.logFullState) {
@@ -104,6 +111,7 @@ $(document).ready(function () {
 				
 			});
 			this.socket.on("update_objs", (objs) => {
+				objs = document.decodePayload(objs, this.compression);
 				if (this.startTime) {
 					let timeOffset = Date.now() - this.startTime;
 					if (this.logFullState) {
@@ -117,17 +125,19 @@ $(document).ready(function () {
 				}
 			});
 			this.socket.on("update_config", (config) => {
+				config = document.decodePayload(config, this.compression);
 				if (this.startTime) {
 					let timeOffset = Date.now() - this.startTime;
 					if (this.logFullState) {
-						this.currentConfig = config;
+						// updates only contain the changed values
+						this.currentConfig = Object.assign({}, this.currentConfig, config);
 						this._addSnapshot(timeOffset, this._getFullState());
 					} else {
 						this._addSnapshot(timeOffset, {"config": config});
 					}
 				} else if (this.logFullState) {
 					// save the config for later in case it arrived before the first state
-					this.currentConfig = config;
+					this.currentConfig = Object.assign({}, this.currentConfig, config);
 				} else {
 					// save the config once in the beginning in case it arrived before the first state
 					this._addSnapshot(-1, {"config": config});
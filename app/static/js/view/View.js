@@ -1,4 +1,20 @@
 $(document).ready(function () {
+	// type tables (object types mapped to block matrices) by content hash, shared by all views.
+	// Maps each hash to the promise of the fetched table.
+	const TYPE_TABLES = new Map();
+
+	/**
+	 * Decode a payload the model compressed because of its size (see model/compression.py):
+	 * {zlib: <binary>} is inflated with the preset dictionary the model sent with the event
+	 * 'compression'. Requires inflate.js. Other payloads are returned as they are.
+	 * @param data 	payload of an update event
+	 * @param compression 	settings received with the event 'compression', null if none
+	 */
+	this.decodePayload = function (data, compression) {
+		if (!compression || !data || data.zlib === undefined) { return data; }
+		return JSON.parse(new TextDecoder().decode(document.inflate(data.zlib, compression.zdict)));
+	};
+
 	/**
 	 * Abstract interface class. Separates the interface into background, objects and grippers
 	 * which concrete implementations of this view might want to draw separately to improve the
@@ -15,10 +31,26 @@ $(document).ready(function () {
 			// Configuration. Is assigned at startDrawing()
 			this.cols;			// canvas width in blocks
 			this.rows;			// canvas height in blocks
+			this.typeHash;		// content hash of the type configuration
+			this.typeConfig;	// object types mapped to block matrices, fetched for typeHash
+			this.moveStep;		// step size of moves in blocks
+			this.preventOverlap;	// true if objects may not overlap
+
+			// displayed area of the board {x, y, width, height} in blocks, null for the whole board
+			this.viewport = null;
+
+			// settings of the payload compression, if the client connected with the option 'compression'
+			this.compression = null;
 
 			// Current state
 			this.objs = new Object();
 			this.grippers = new Object();
+			// static objects (e.g. walls), only sent with the initial state
+			this.staticObjs = new Object();
+
+			// Moves applied locally that the model has not acknowledged yet.
+			// Maps gripper ids to arrays of {seq, dx, dy}, see predictMove()
+			this.pending = new Object();
 		}
 
 		/**
@@ -26,11 +58,18 @@ $(document).ready(function () {
 		 * initialization, the view reacts to model updates.
 		 */
 		_initSocketEvents() {
+			// large payloads are compressed if the client asked for it, see decodePayload
+			this.socket.on("compression", (settings) => {
+				this.compression = settings;
+			});
 			// new state -> redraw object and gripper layer
 			this.socket.on("update_state", (state) => {
+				state = document.decodePayload(state, this.compression);
 				if (state["grippers"] && state["objs"]) {
 					this.grippers = state["grippers"];
 					this.objs = state["objs"];
+					if (state["static"]) { this.staticObjs = state["static"]; }
+					this._reconcile();
 					this.redrawGr();
 					this.redrawObjs();
 				} else {
@@ -40,16 +79,20 @@ $(document).ready(function () {
 			});
 			// new gripper state -> redraw grippers
 			this.socket.on("update_grippers", (grippers) => {
+				grippers = document.decodePayload(grippers, this.compression);
 				this.grippers = grippers;
+				this._reconcile();
 				this.redrawGr();
 			});
 			// new object state -> redraw objects
 			this.socket.on("update_objs", (objs) => {
+				objs = document.decodePayload(objs, this.compression);
 				this.objs = objs;
 				this.redrawObjs();
 			});
 			// new configuration -> save values and redraw everything
 			this.socket.on("update_config", (config) => {
+				config = document.decodePayload(config, this.compression);
 				this._loadConfig(config);
 				this.redraw();
 			});
@@ -68,7 +111,39 @@ $(document).ready(function () {
 		}
 		
 		get blockSize() {
-			return this.canvasWidth/this.cols;
+			return this.canvasWidth/(this.viewport ? this.viewport.width : this.cols);
+		}
+
+		// displayed area as [x0, y0, x1, y1] in blocks
+		get visibleArea() {
+			if (this.viewport) {
+				return [this.viewport.x, this.viewport.y,
+					this.viewport.x + this.viewport.width, this.viewport.y + this.viewport.height];
+			}
+			return [0, 0, this.cols, this.rows];
+		}
+
+		// --- viewport --- //
+
+		/**
+		 * Only display an area of the board. The model is told to only send updates for
+		 * this area, which keeps updates small on large boards. It answers with the content
+		 * of the area, so the view is redrawn at the next update_state.
+		 * Pass null to display the whole board again.
+		 * @param {x coordinate of the top left corner in blocks} x
+		 * @param {y coordinate of the top left corner in blocks} y
+		 * @param {width in blocks, the height follows from the canvas aspect ratio} width
+		 */
+		setViewport(x, y=0, width=0) {
+			if (x === null) {
+				this.viewport = null;
+				this.socket.emit("set_viewport", null);
+			} else {
+				let height = width * this.canvasHeight / this.canvasWidth;
+				this.viewport = {"x": x, "y": y, "width": width, "height": height};
+				this.socket.emit("set_viewport", this.viewport);
+			}
+			this.redrawBg();
 		}
 
 		// --- drawing functions --- //
@@ -151,15 +226,142 @@ $(document).ready(function () {
 		/**
 		 * Loads a configuration received from the model. The values are saved since the configuration is
 		 * not expected to change frequently. 
-		 * If no configuration is passed, it is requested from the model.
-		 * Implemented as an async function to make sure the configuration is complete before 
-		 * subsequent steps (i.e. drawing) are made.
+		 * Updates after the initial configuration only contain the changed values,
+		 * any missing value is left as before.
 		 * @param {config object, obtained from the model} config
 		 */
 		_loadConfig(config) {
 			// Save all relevant values
-			this.cols = config.width;
-			this.rows = config.height;
+			if (config.width !== undefined) { this.cols = config.width; }
+			if (config.height !== undefined) { this.rows = config.height; }
+			if (config.move_step !== undefined) { this.moveStep = config.move_step; }
+			if (config.prevent_overlap !== undefined) { this.preventOverlap = config.prevent_overlap; }
+			if (config.type_hash !== undefined && config.type_hash !== this.typeHash) {
+				this.typeHash = config.type_hash;
+				this._loadTypes(config.type_hash);
+			}
+		}
+
+		/**
+		 * Fetch the type configuration with the given content hash from the model.
+		 * The table for a hash never changes, so it is requested at most once per page
+		 * and the browser may serve it from its cache.
+		 * @param {content hash received in update_config} typeHash
+		 */
+		_loadTypes(typeHash) {
+			if (!TYPE_TABLES.has(typeHash)) {
+				TYPE_TABLES.set(typeHash, fetch(`${this.socket.io.uri}/types/${typeHash}`)
+					.then(response => response.ok ? response.json() : null)
+					.catch(() => null));
+			}
+			TYPE_TABLES.get(typeHash).then(types => {
+				// ignore the table if another one was requested in the meantime
+				if (types && typeHash === this.typeHash) { this.typeConfig = types; }
+			});
+		}
+
+		// --- client-side prediction --- //
+
+		/**
+		 * Show a move of a gripper right away instead of waiting for the model's update.
+		 * The move is checked with the rules of the model (board limits, overlaps) and
+		 * kept as pending until an update acknowledges its sequence number.
+		 * @param {id of the moved gripper} grId
+		 * @param {sequence number the move was sent with} seq
+		 * @param {steps in x direction} dx
+		 * @param {steps in y direction} dy
+		 */
+		predictMove(grId, seq, dx, dy) {
+			if (!this.grippers[grId] || this.moveStep === undefined) { return; }
+			if (!this.pending[grId]) { this.pending[grId] = new Array(); }
+			this.pending[grId].push({"seq": seq, "dx": dx, "dy": dy});
+			if (this._applyMove(grId, dx, dy)) { this.redrawGr(); }
+		}
+
+		/**
+		 * Apply the model's authoritative gripper state: moves up to the sequence number
+		 * acknowledged by the model ('last_seq' of each gripper) are dropped, the remaining
+		 * pending moves are applied again on top of the new state. Call after this.grippers
+		 * was replaced by an update.
+		 */
+		_reconcile() {
+			for (const grId of Object.keys(this.pending)) {
+				let gripper = this.grippers[grId];
+				// the gripper was removed or the state was replaced: nothing to apply the moves to
+				if (!gripper || gripper.last_seq === undefined) {
+					delete this.pending[grId];
+					continue;
+				}
+				this.pending[grId] = this.pending[grId].filter(move => move.seq > gripper.last_seq);
+				for (const move of this.pending[grId]) {
+					this._applyMove(grId, move.dx, move.dy);
+				}
+			}
+		}
+
+		/**
+		 * Move a gripper and the object it holds in the local state, same rules as Model.move.
+		 * @return bool, true if the move was allowed
+		 */
+		_applyMove(grId, dx, dy) {
+			let gripper = this.grippers[grId];
+			dx = dx * this.moveStep;
+			dy = dy * this.moveStep;
+			if (!this._inLimits(gripper.x + dx, gripper.y + dy)) { return false; }
+			if (gripper.gripped) {
+				let [objId, obj] = Object.entries(gripper.gripped)[0];
+				if (!this._inLimits(obj.x + obj.width/2 + dx, obj.y + obj.height/2 + dy) ||
+					(this.preventOverlap && this._hasOverlap(objId, obj.x + dx, obj.y + dy, obj.block_matrix))) {
+					return false;
+				}
+				obj.x += dx;
+				obj.y += dy;
+			}
+			gripper.x += dx;
+			gripper.y += dy;
+			return true;
+		}
+
+		_inLimits(x, y) {
+			return x >= 0 && x <= this.cols && y >= 0 && y <= this.rows;
+		}
+
+		/**
+		 * Check whether an object placed at (x, y) would overlap with another object.
+		 * Same computation as Model._has_overlap.
+		 * @return bool, true if some block would overlap
+		 */
+		_hasOverlap(objId, x, y, blockMatrix) {
+			// update_grippers only carries the positions of gripped objects
+			let objs = Object.assign(new Object(), this.staticObjs, this.objs);
+			for (const gripper of Object.values(this.grippers)) {
+				if (gripper.gripped) { Object.assign(objs, gripper.gripped); }
+			}
+			let height = blockMatrix.length;
+			let width = blockMatrix[0].length;
+			for (const [otherId, other] of Object.entries(objs)) {
+				if (otherId == objId) { continue; }
+				let xOffset = x - other.x;
+				let yOffset = y - other.y;
+				if (xOffset >= other.width || xOffset <= -width || yOffset >= other.height || yOffset <= -height) {
+					continue;
+				}
+				let otherMatrix = other.block_matrix;
+				for (let row = 0; row < height; row++) {
+					// with fractional offsets, a block covers up to 2 rows and 2 columns of the other object
+					let rows = [Math.floor(row + yOffset), Math.ceil(row + yOffset)];
+					for (let col = 0; col < width; col++) {
+						if (!blockMatrix[row][col]) { continue; }
+						let cols = [Math.floor(col + xOffset), Math.ceil(col + xOffset)];
+						for (const r of rows) {
+							for (const c of cols) {
+								if (otherMatrix[r] && otherMatrix[r][c]) { return true; }
+							}
+						}
+					}
+				}
+			}
+			return false;
 		}
 
 	}; // class View end
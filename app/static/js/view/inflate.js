@@ -0,0 +1,221 @@
+$(document).ready(function () {
+	// --- zlib decoder (RFC 1950 and 1951) --- //
+	// Inflates the payloads the model compresses (see model/compression.py), including the
+	// preset dictionary. Served with the app, so the views don't load a library from a CDN.
+
+	// base lengths and extra bits of the length symbols 257 to 285
+	const LENGTH_BASE = [3, 4, 5, 6, 7, 8, 9, 10, 11, 13, 15, 17, 19, 23, 27, 31,
+		35, 43, 51, 59, 67, 83, 99, 115, 131, 163, 195, 227, 258];
+	const LENGTH_EXTRA = [0, 0, 0, 0, 0, 0, 0, 0, 1, 1, 1, 1, 2, 2, 2, 2,
+		3, 3, 3, 3, 4, 4, 4, 4, 5, 5, 5, 5, 0];
+	// base distances and extra bits of the distance symbols 0 to 29
+	const DIST_BASE = [1, 2, 3, 4, 5, 7, 9, 13, 17, 25, 33, 49, 65, 97, 129, 193,
+		257, 385, 513, 769, 1025, 1537, 2049, 3073, 4097, 6145, 8193, 12289, 16385, 24577];
+	const DIST_EXTRA = [0, 0, 0, 0, 1, 1, 2, 2, 3, 3, 4, 4, 5, 5, 6, 6,
+		7, 7, 8, 8, 9, 9, 10, 10, 11, 11, 12, 12, 13, 13];
+	// order in which a dynamic block lists the code lengths of the code length alphabet
+	const CODE_LENGTH_ORDER = [16, 17, 18, 0, 8, 7, 9, 6, 10, 5, 11, 4, 12, 3, 13, 2, 14, 1, 15];
+
+	/**
+	 * Canonical Huffman code given by the code length of each symbol.
+	 * @param lengths 	code length per symbol, 0 for unused symbols
+	 * @return {counts: number of codes per length, symbols: symbols ordered by code}
+	 */
+	function huffman(lengths) {
+		let counts = new Uint16Array(16);
+		for (let length of lengths) { counts[length]++; }
+		counts[0] = 0;
+		let offsets = new Uint16Array(16);
+		for (let length = 1; length < 16; length++) {
+			offsets[length] = offsets[length-1] + counts[length-1];
+		}
+		let symbols = new Uint16Array(lengths.length);
+		for (let symbol = 0; symbol < lengths.length; symbol++) {
+			if (lengths[symbol]) { symbols[offsets[lengths[symbol]]++] = symbol; }
+		}
+		return {counts: counts, symbols: symbols};
+	}
+
+	function fixedCodes() {
+		let lengths = new Array(288);
+		lengths.fill(8, 0, 144);
+		lengths.fill(9, 144, 256);
+		lengths.fill(7, 256, 280);
+		lengths.fill(8, 280, 288);
+		return {literals: huffman(lengths), distances: huffman(new Array(30).fill(5))};
+	}
+
+	function adler32(bytes, start) {
+		let a = 1;
+		let b = 0;
+		for (let i = start; i < bytes.length; i++) {
+			a = (a + bytes[i]) % 65521;
+			b = (b + a) % 65521;
+		}
+		return ((b << 16) | a) >>> 0;
+	}
+
+	class Inflater {
+		constructor(input, dictionary) {
+			this.input = input;
+			this.pos = 0;		// next byte of the input
+			this.bitBuffer = 0;
+			this.bitCount = 0;
+			// the dictionary precedes the output, so back references can reach into it
+			this.output = new Uint8Array(Math.max(1024, dictionary.length + input.length * 4));
+			this.output.set(dictionary);
+			this.start = dictionary.length;
+			this.length = dictionary.length;
+		}
+
+		byte() {
+			if (this.pos >= this.input.length) { throw new Error("inflate: unexpected end of data"); }
+			return this.input[this.pos++];
+		}
+
+		bits(n) {
+			while (this.bitCount < n) {
+				this.bitBuffer |= this.byte() << this.bitCount;
+				this.bitCount += 8;
+			}
+			let value = this.bitBuffer & ((1 << n) - 1);
+			this.bitBuffer >>>= n;
+			this.bitCount -= n;
+			return value;
+		}
+
+		decode(code) {
+			// codes are read bit by bit, first code of each length as in zlib's puff.c
+			let value = 0;
+			let first = 0;
+			let index = 0;
+			for (let length = 1; length < 16; length++) {
+				value |= this.bits(1);
+				let count = code.counts[length];
+				if (value - first < count) { return code.symbols[index + value - first]; }
+				index += count;
+				first = (first + count) << 1;
+				value <<= 1;
+			}
+			throw new Error("inflate: invalid Huffman code");
+		}
+
+		put(byte) {
+			if (this.length == this.output.length) {
+				let grown = new Uint8Array(this.output.length * 2);
+				grown.set(this.output);
+				this.output = grown;
+			}
+			this.output[this.length++] = byte;
+		}
+
+		stored() {
+			// the length fields start at the next byte boundary
+			this.bitBuffer = 0;
+			this.bitCount = 0;
+			let length = this.byte() | (this.byte() << 8);
+			let inverse = this.byte() | (this.byte() << 8);
+			if (length != (~inverse & 0xffff)) { throw new Error("inflate: invalid stored block"); }
+			for (let i = 0; i < length; i++) { this.put(this.byte()); }
+		}
+
+		dynamicCodes() {
+			let nLiterals = this.bits(5) + 257;
+			let nDistances = this.bits(5) + 1;
+			let nCodeLengths = this.bits(4) + 4;
+			let codeLengths = new Array(19).fill(0);
+			for (let i = 0; i < nCodeLengths; i++) { codeLengths[CODE_LENGTH_ORDER[i]] = this.bits(3); }
+			let lengthCode = huffman(codeLengths);
+			let lengths = new Array();
+			while (lengths.length < nLiterals + nDistances) {
+				let symbol = this.decode(lengthCode);
+				if (symbol < 16) {
+					lengths.push(symbol);
+				} else if (symbol == 16) {
+					if (lengths.length == 0) { throw new Error("inflate: no length to repeat"); }
+					let previous = lengths[lengths.length-1];
+					for (let repeat = 3 + this.bits(2); repeat > 0; repeat--) { lengths.push(previous); }
+				} else {
+					let zeros = symbol == 17 ? 3 + this.bits(3) : 11 + this.bits(7);
+					for (; zeros > 0; zeros--) { lengths.push(0); }
+				}
+			}
+			return {literals: huffman(lengths.slice(0, nLiterals)),
+				distances: huffman(lengths.slice(nLiterals, nLiterals + nDistances))};
+		}
+
+		compressed(codes) {
+			while (true) {
+				let symbol = this.decode(codes.literals);
+				if (symbol < 256) {
+					this.put(symbol);
+				} else if (symbol == 256) {
+					return;
+				} else {
+					symbol -= 257;
+					if (symbol >= LENGTH_BASE.length) { throw new Error("inflate: invalid length"); }
+					let length = LENGTH_BASE[symbol] + this.bits(LENGTH_EXTRA[symbol]);
+					let distSymbol = this.decode(codes.distances);
+					if (distSymbol >= DIST_BASE.length) { throw new Error("inflate: invalid distance"); }
+					let distance = DIST_BASE[distSymbol] + this.bits(DIST_EXTRA[distSymbol]);
+					if (distance > this.length) { throw new Error("inflate: distance too far back"); }
+					// byte by byte, the copy may overlap its own output
+					for (let i = 0; i < length; i++) { this.put(this.output[this.length - distance]); }
+				}
+			}
+		}
+
+		inflate() {
+			let last = 0;
+			while (!last) {
+				last = this.bits(1);
+				let type = this.bits(2);
+				if (type == 0) {
+					this.stored();
+				} else if (type == 1) {
+					this.compressed(fixedCodes());
+				} else if (type == 2) {
+					this.compressed(this.dynamicCodes());
+				} else {
+					throw new Error("inflate: invalid block type");
+				}
+			}
+			// the checksum follows at the next byte boundary
+			this.bitBuffer = 0;
+			this.bitCount = 0;
+			return this.output.subarray(this.start, this.length);
+		}
+	}
+
+	/**
+	 * Decompress a zlib stream, see zlib.decompressobj in Python.
+	 * @param data 	compressed bytes (Uint8Array or ArrayBuffer)
+	 * @param dictionary 	preset dictionary the data was compressed with, if any
+	 * @return Uint8Array of the decompressed bytes
+	 */
+	this.inflate = function (data, dictionary=null) {
+		let input = new Uint8Array(data);
+		let dict = dictionary ? new Uint8Array(dictionary) : new Uint8Array(0);
+		if (input.length < 6 || (input[0] & 0x0f) != 8 || ((input[0] << 8) | input[1]) % 31 != 0) {
+			throw new Error("inflate: invalid zlib header");
+		}
+		let inflater = new Inflater(input, new Uint8Array(0));
+		inflater.pos = 2;
+		if (input[1] & 0x20) {
+			// the header names the dictionary by its checksum
+			let dictId = ((input[2] << 24) | (input[3] << 16) | (input[4] << 8) | input[5]) >>> 0;
+			if (dictId != adler32(dict, 0)) { throw new Error("inflate: wrong dictionary"); }
+			inflater = new Inflater(input, dict);
+			inflater.pos = 6;
+		}
+		let output = inflater.inflate();
+		let pos = inflater.pos;
+		if (pos + 4 <= input.length) {
+			let checksum = ((input[pos] << 24) | (input[pos+1] << 16) | (input[pos+2] << 8) | input[pos+3]) >>> 0;
+			if (checksum != adler32(inflater.output.subarray(0, inflater.length), inflater.start)) {
+				throw new Error("inflate: checksum mismatch");
+			}
+		}
+		return output;
+	};
+}); // on document ready end
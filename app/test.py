@@ -1,78 +1,227 @@
-# TODO: update these for socketio
-
-def selftest(): 
-	with app.test_client() as c:
-		# --- attaching and detaching views --- #
-		dummy_view = "127.0.0.1:666"
-		rv = c.post("/attach-view", data=json.dumps({"url":dummy_view}))
-		assert rv.status == "200 OK" and dummy_view in model.views
-		# delete view again or there view be errors in the following tests
-		# when the model tries to notify the dummy view
-		c.delete("/attach-view", data=json.dumps({"url":dummy_view}))
-		assert dummy_view not in model.views
-
-		# --- loading a state --- #
-		f = open("resources/state/pento_test2.json", mode="r", encoding="utf-8")
-		json_state = f.read()
-		f.close()
-		rv_state = c.post("/state", data=json_state)
-		test_state = json.loads(json_state)
-
-		# --- gripper position --- #
-		rv2 = c.get("/gripper")
-		gripper = rv2.get_json()
-		assert float(gripper["1"]["x"]) == float(test_state["grippers"]["1"]["x"]) and \
-			float(gripper["1"]["y"]) == float(test_state["grippers"]["1"]["y"]), "Grippers should be at the same location: {} vs {}".format(gripper["1"], test_state["grippers"]["1"])
-		# move gripper once with default step size
-		rv_move_gripper = c.post("/gripper/position", data=json.dumps({"id":"1", "dx":3, "dy":0}))
-		assert rv_move_gripper.status == "200 OK"
-		assert model.get_gripper_coords("1")[0] > gripper["1"]["x"] and \
-			model.get_gripper_coords("1")[1] == gripper["1"]["y"]
-		# move gripper with custom step size
-		rv_move_gripper2 = c.post("/gripper/position", data=json.dumps({"id":"1", "dx":0, "dy":3, "step_size":1, "loop": True}))
-		assert rv_move_gripper2.status == "200 OK"
-		assert float(model.get_gripper_coords("1")[1]) == float(gripper["1"]["y"] + 3)
-		# stop moving the gripper
-		rv_stop_gripper = c.delete("/gripper/position", data=json.dumps({"id": "1"}))
-		assert rv_stop_gripper.status == "200 OK"
-
-		# --- rotating the gripped object --- #
-		rv_rotate = c.post("/gripper/rotate", data=json.dumps({"id": "1", "direction": 1, "step_size": 45, "loop": True}))
-		# even if no object is gripped, should return OK
-		assert rv_rotate.status == "200 OK"
-		rv_stop_rotate = c.delete("/gripper/rotate", data=json.dumps({"id": "1"}))
-		assert rv_rotate.status == "200 OK"
-
-		# --- flipping the gripped object --- # 
-		# flip once
-		rv_flip = c.post("/gripper/flip", data=json.dumps({"id": "1"}))
-		assert rv_flip.status == "200 OK"
-
-		# --- gripping --- #
-		rv4 = c.get("/gripper/grip")
-		# both data structures show no object gripped or same object is gripped
-		if "gripped" not in test_state["grippers"]["1"] or test_state["grippers"]["1"]["gripped"] == None:
-			assert "1" not in rv4.get_json() or rv4.get_json()["1"] == None or len(rv4.get_json()["1"]) == 0, \
-				"test state gripper '1' has no object gripped but model seems to have one: {}".format(rv4.get_json()["1"]) 
-		else:
-			assert test_state["grippers"]["1"]["gripped"] in rv4.get_json()["1"].keys(), \
-				"test state gripper '1' and model gripper '1' do not have the same object gripped: {} vs {}".format(test_state["grippers"]["1"]["gripped"], rv4.get_json()["1"].keys())
-
-		# bad request: missing gripper id
-		rv5_bad_request = c.post("/gripper/grip")
-		# valid request
-		assert rv5_bad_request.status == "400 BAD REQUEST"
-		rv5_start_gripping = c.post("/gripper/grip", data=json.dumps({"id":"1"}))
-		assert rv5_start_gripping.status == "200 OK"
-
-		# stop gripping
-		rv5_stop_gripping = c.delete("/gripper/grip", data=json.dumps({"id":"1"}))
-		assert rv5_stop_gripping.status == "200 OK"
-
-		# --- objects --- #
-		rv6 = c.get("/objects")
-		assert rv6.get_json().keys() == test_state["objs"].keys()
-
-		# --- deleting the state --- #
-		rv_reset = c.delete("/state")
-		assert rv_reset.status == "200 OK" and len(model.get_object_dict()) == 0
\ No newline at end of file
+from app import app, socketio, config, AUTH, ADMIN_AUTH, client_models
+from model.legal_actions import compute_legal_actions, batch_move_masks
+from model.model import Model
+from model.session_store import SessionStore
+import json, os, tempfile
+
+def _event_names(client):
+	return [event["name"] for event in client.get_received()]
+
+def selftest():
+	# --- connecting --- #
+	# a client without the right token is refused
+	unauthorized = socketio.test_client(app, auth="wrong")
+	assert not unauthorized.is_connected(), "client with wrong token should be refused"
+
+	known_sessions = set(client_models.keys())
+	client = socketio.test_client(app, auth=AUTH)
+	assert client.is_connected()
+	# configuration and state are sent at connection
+	assert _event_names(client) == ["update_config", "update_state"]
+	new_sessions = set(client_models.keys()) - known_sessions
+	assert len(new_sessions) == 1, "a model should be created for the client"
+	model = client_models[new_sessions.pop()]
+
+	# --- loading a state --- #
+	f = open("app/static/resources/tasks/pento_test.json", mode="r", encoding="utf-8")
+	test_state = json.loads(f.read())
+	f.close()
+	client.emit("load_state", test_state)
+	assert "update_state" in _event_names(client)
+	assert model.get_obj_dict().keys() == test_state["objs"].keys()
+
+	# --- gripper position --- #
+	gripper = model.get_gripper_dict()
+	assert float(gripper["0"]["x"]) == float(test_state["grippers"]["0"]["x"]) and \
+		float(gripper["0"]["y"]) == float(test_state["grippers"]["0"]["y"]), \
+		"Grippers should be at the same location: {} vs {}".format(gripper["0"], test_state["grippers"]["0"])
+	# move gripper once with default step size
+	client.emit("move", {"id": "0", "dx": 3, "dy": 0})
+	assert model.get_gripper_coords("0")[0] > gripper["0"]["x"] and \
+		model.get_gripper_coords("0")[1] == gripper["0"]["y"]
+	assert "update_grippers" in _event_names(client)
+	# move gripper with custom step size
+	client.emit("move", {"id": "0", "dx": 0, "dy": 3, "step_size": 1})
+	assert float(model.get_gripper_coords("0")[1]) == float(gripper["0"]["y"]) + 3
+
+	# --- adding and removing grippers --- #
+	client.emit("add_gripper", "test")
+	assert "test" in model.get_gripper_ids()
+	client.emit("remove_gripper", "test")
+	assert "test" not in model.get_gripper_ids()
+	client.get_received()
+
+	# --- gripping --- #
+	# place the gripper on a block of object "0"
+	obj = model.get_obj_by_id("0")
+	for row, blocks in enumerate(obj.block_matrix):
+		if 1 in blocks:
+			client.emit("move", {"id": "0", "step_size": 1,
+				"dx": obj.x + blocks.index(1) + 0.5 - model.get_gripper_coords("0")[0],
+				"dy": obj.y + row + 0.5 - model.get_gripper_coords("0")[1]})
+			break
+	client.emit("grip", {"id": "0"})
+	assert model.get_gripped_obj("0") == "0", "gripper should hold object '0'"
+
+	# --- rotating and flipping the gripped object --- #
+	rotation = obj.rotation
+	client.emit("rotate", {"id": "0", "direction": 1})
+	client.emit("rotate", {"id": "0", "direction": -1})
+	assert obj.rotation == rotation
+	mirrored = obj.mirrored
+	client.emit("flip", {"id": "0"})
+	client.emit("flip", {"id": "0"})
+	assert obj.mirrored == mirrored
+
+	# ungrip
+	client.emit("grip", {"id": "0"})
+	assert model.get_gripped_obj("0") is None
+
+	# --- legal actions --- #
+	# invalid parameters are ignored
+	assert not client.emit("get_legal_actions", {"id": "0", "max_steps": 10**6}, callback=True)
+	assert not client.emit("get_legal_actions", {"id": "0", "step_size": float("nan")}, callback=True)
+	mask = client.emit("get_legal_actions", {"id": "0", "max_steps": 2}, callback=True)
+	assert len(mask["move"]) == 4 and all(len(steps) == 2 for steps in mask["move"])
+	# with a step size that is not a multiple of 1/8, the vectorized masks have to round like Model.move.
+	# Object "0" starts right next to object "2" and is moved away in steps of 0.3. Rounding
+	# depends on the position, so several start columns are tried.
+	model.set_config({"move_step": 0.3})
+	for start in range(8):
+		pair = {obj_id: dict(test_state["objs"][obj_id], x=start, y=2) for obj_id in ("0", "2")}
+		model.set_state({"objs": pair, "grippers": {}})
+		blocks = model.get_obj_by_id("0").block_matrix
+		pair["0"]["x"] += model.get_obj_by_id("2").width
+		while pair["0"]["x"] > 0 and not model._has_overlap("0", pair["0"]["x"] - 1, pair["0"]["y"], blocks):
+			pair["0"]["x"] -= 1
+		row = next(row for row in range(len(blocks)) if 1 in blocks[row])
+		gripper = {"x": pair["0"]["x"] + blocks[row].index(1) + 0.5, "y": pair["0"]["y"] + row + 0.5}
+		model.set_state({"objs": pair, "grippers": {"0": gripper}})
+		model.grip("0")
+		assert model.get_gripped_obj("0") == "0"
+		for i in range(12):
+			expected = compute_legal_actions(model, "0", 4, 0.3)["move"]
+			assert batch_move_masks([model], ["0"], 4)[0].tolist() == expected, \
+				"masks differ at x={}".format(model.get_obj_by_id("0").x)
+			model.move("0", 1, 0)
+	model.set_config({"move_step": config.move_step})
+	model.set_state(test_state)
+	client.get_received()
+
+	# --- atomic batches --- #
+	# a failing action in the middle restores the state before the batch, including its version
+	obj = model.get_obj_by_id("0")
+	row = next(row for row, blocks in enumerate(obj.block_matrix) if 1 in blocks)
+	model.move("0", obj.x + obj.block_matrix[row].index(1) + 0.5 - model.get_gripper_coords("0")[0],
+		obj.y + row + 0.5 - model.get_gripper_coords("0")[1], 1)
+	before = model.state.to_dict()
+	version = model.state.version
+	result = client.emit("batch", {"actions": [
+		{"action": "grip", "id": "0"},
+		{"action": "move", "id": "0", "dx": 1, "dy": 0},
+		{"action": "move", "id": "0", "dx": -1000, "dy": 0},
+		{"action": "move", "id": "0", "dx": 1, "dy": 0}]}, callback=True)
+	assert result == {"committed": False, "results": [True, True, False, None]}, result
+	assert model.state.to_dict() == before and model.state.version == version
+	assert model.get_gripped_obj("0") is None
+	# the spatial index is restored as well: the object is still found at its position
+	assert "0" in model.state.get_objs_in_area(obj.x, obj.y, obj.x + obj.width, obj.y + obj.height)
+
+	# --- static objects --- #
+	# object "2" is an obstacle, object "0" starts right next to it
+	pair = {obj_id: dict(test_state["objs"][obj_id], x=2, y=2) for obj_id in ("0", "2")}
+	pair["2"]["static"] = True
+	model.set_state({"objs": pair, "grippers": {}})
+	blocks = model.get_obj_by_id("0").block_matrix
+	pair["0"]["x"] += model.state.static["2"].width
+	while pair["0"]["x"] > 0 and not model._has_overlap("0", pair["0"]["x"] - 1, pair["0"]["y"], blocks):
+		pair["0"]["x"] -= 1
+	row = next(row for row in range(len(blocks)) if 1 in blocks[row])
+	gripper = {"x": pair["0"]["x"] + blocks[row].index(1) + 0.5, "y": pair["0"]["y"] + row + 0.5}
+	client.get_received()
+	client.emit("load_state", {"objs": pair, "grippers": {"0": gripper}})
+	# the static objects are sent with a new state only
+	updates = [event["args"][0] for event in client.get_received() if event["name"] == "update_state"]
+	assert "2" in updates[-1]["static"] and "2" not in updates[-1]["objs"]
+	client.emit("grip", {"id": "0"})
+	assert model.get_gripped_obj("0") == "0"
+	updates = [event["args"][0] for event in client.get_received() if event["name"] == "update_state"]
+	assert updates and all("static" not in update for update in updates), \
+		"updates of regular actions should leave out the static objects"
+	x = model.get_obj_by_id("0").x
+	client.emit("move", {"id": "0", "dx": -1, "dy": 0, "step_size": 1})
+	assert model.get_obj_by_id("0").x == x, "static objects should block moves"
+	client.emit("move", {"id": "0", "dx": 1, "dy": 0, "step_size": 1})
+	assert model.get_obj_by_id("0").x == x + 1
+	model.set_state(test_state)
+	client.get_received()
+
+	# --- per-session configuration --- #
+	known_sessions = set(client_models.keys())
+	other = socketio.test_client(app, auth=AUTH)
+	other_model = client_models[(set(client_models.keys()) - known_sessions).pop()]
+	other.get_received()
+	move_step = config.move_step
+	client.emit("load_config", {"move_step": move_step * 2})
+	# only the changed setting is sent
+	updates = [event["args"][0] for event in client.get_received() if event["name"] == "update_config"]
+	assert updates == [{"move_step": move_step * 2}], updates
+	assert model.config.move_step == move_step * 2
+	# the other session and the shared configuration are unchanged
+	assert other_model.config.move_step == move_step and config.move_step == move_step
+	assert "update_config" not in _event_names(other)
+	client.emit("load_config", {"move_step": move_step})
+	other.disconnect()
+
+	# --- observers --- #
+	# observers need the admin token, have no model and can't act
+	refused = socketio.test_client(app, auth={"token": AUTH, "role": "observer"})
+	assert not refused.is_connected(), "observers should require the admin token"
+	observer = socketio.test_client(app, auth={"token": AUTH, "role": "observer", "admin": ADMIN_AUTH})
+	assert observer.is_connected()
+	observer.emit("move", {"id": "0", "dx": 1, "dy": 0})
+	assert observer.emit("observe", model.room, callback=True) is True
+	# participants can't observe other sessions
+	assert client.emit("observe", model.room, callback=True) is False
+	observer.disconnect()
+
+	# --- durable sessions --- #
+	store = SessionStore(os.path.join(tempfile.mkdtemp(), "sessions.db"), snapshot_every=5)
+	stored = Model(config, socketio, "selftest-stored")
+	# unknown keys are not created unless asked for
+	assert store.restore(stored, "selftest", create=False) is False and stored.journal is None
+	store.restore(stored, "selftest")
+	stored.set_state(test_state)
+	stored.set_config({"move_step": 0.3})
+	# snapshots after 5 and 10 entries, the last 2 are replayed from the journal
+	for i in range(12):
+		stored.move("0", (1, 0, -1)[i % 3], 1)
+	restored = Model(config, socketio, "selftest-restored")
+	assert store.restore(restored, "selftest", create=False)
+	assert restored.config.move_step == 0.3
+	assert restored.state.to_dict() == stored.state.to_dict(), "the restored state should equal the stored one"
+	# expiry removes the session with its journal
+	store.flush()
+	store.expire(0)
+	assert store.sessions() == []
+	store.close()
+
+	# --- disconnecting --- #
+	client.disconnect()
+	assert model not in client_models.values(), "the client's model should be removed"
+
+	# --- session classes --- #
+	# the unthrottled class requires the admin token
+	refused = socketio.test_client(app, auth={"token": AUTH, "session_class": "internal"})
+	assert not refused.is_connected(), "'internal' sessions should require the admin token"
+	internal = socketio.test_client(app, auth={"token": AUTH, "session_class": "internal", "admin": ADMIN_AUTH})
+	human = socketio.test_client(app, auth=AUTH)
+	for qos_client in (internal, human):
+		qos_client.emit("add_gripper", "0")
+		for i in range(50):
+			qos_client.emit("move", {"id": "0", "dx": 1 - 2*(i % 2), "dy": 0})
+	assert "throttled" not in _event_names(internal)
+	# a human's burst is 30 actions, the client is told about the rejected ones
+	assert "throttled" in _event_names(human)
+	internal.disconnect()
+	human.disconnect()
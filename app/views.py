@@ -1,5 +1,8 @@
-from app import app, socketio
-from flask import render_template, request, abort
+from app import app, socketio, is_admin
+from flask import render_template, request, abort, jsonify, Response
+from model.metrics import metrics
+from model.profiler import profiler
+from model.type_registry import type_registry
 import json
 from time import time_ns
 import os
@@ -21,17 +24,80 @@ def demo():
 def save_log():
 	if not request.data or not request.is_json:
 		abort(400)
-	json_data = request.json
+	write_log(app.config["DATA_COLLECTION"], request.json)
+	return "0", 200
+
+def write_log(savepath, json_data):
+	"""
+	Save collected log data as a new file.
+	@param savepath 	directory to save the file to, created if necessary
+	@param json_data 	JSON-serializable data
+	@return name of the created file
+	"""
 	# as a filename that 
 	# (1) can not be manipulated by a client
 	# (2) has a negligible chance of collision
 	# a simple timestamp is used
 	filename = str(time_ns()/100) + ".json"
 	# check if "data_collection" directory exists, create if necessary
-	savepath = app.config["DATA_COLLECTION"]
 	if not os.path.exists(savepath):
 		os.mkdir(savepath)
 	file = open(os.path.join(savepath, filename), encoding="utf-8", mode="w")
 	file.write(json.dumps(json_data, indent=2))
-	file.close
-	return "0", 200
+	file.close()
+	return filename
+
+@app.route("/types/<type_hash>", methods=["GET"])
+def types(type_hash):
+	"""
+	Type configuration (object types mapped to block matrices) with the given
+	content hash, as sent in 'update_config'. The content of a hash never
+	changes, so clients may cache the response indefinitely.
+	"""
+	table = type_registry.get(type_hash)
+	if not table:
+		abort(404)
+	response = Response(table.json, mimetype="application/json")
+	response.set_etag(table.hash)
+	response.cache_control.public = True
+	response.cache_control.max_age = 31536000
+	response.cache_control.immutable = True
+	return response.make_conditional(request)
+
+@app.route("/metrics", methods=["GET", "POST"])
+def metrics_endpoint():
+	"""
+	GET: current performance metrics as JSON, or in the Prometheus text format
+	if the query parameter 'format=prometheus' is given.
+	POST: switch recording on or off at runtime. Keys 'enabled' (bool) and 
+	'reset' (bool, discard recorded counters and histograms) are optional.
+	Requires the admin token in the header 'X-Admin-Token'.
+	"""
+	if request.method == "POST":
+		if not is_admin(request.headers.get("X-Admin-Token")):
+			abort(403)
+		if not request.is_json or type(request.json) != dict:
+			abort(400)
+		if "enabled" in request.json:
+			metrics.enabled = bool(request.json["enabled"])
+		if request.json.get("reset"):
+			metrics.reset()
+	if request.args.get("format") == "prometheus":
+		return Response(metrics.to_prometheus(), mimetype="text/plain")
+	return jsonify(metrics.to_dict())
+
+@app.route("/profile/<session_id>", methods=["GET", "POST", "DELETE"])
+def profile(session_id):
+	"""
+	POST: start sampling the model of session 'session_id'.
+	DELETE: stop sampling, the samples are kept.
+	GET: collected samples in the collapsed stack format for flame graphs.
+	All methods require the admin token in the header 'X-Admin-Token'.
+	"""
+	if not is_admin(request.headers.get("X-Admin-Token")):
+		abort(403)
+	if request.method == "POST":
+		profiler.start(session_id)
+	elif request.method == "DELETE":
+		profiler.stop(session_id)
+	return Response(profiler.collapsed(session_id), mimetype="text/plain")
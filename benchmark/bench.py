@@ -0,0 +1,282 @@
+import argparse, sys
+from benchmark.common import make_model, random_state, measure, save_results, load_results, compare
+
+# --- GOLMI's benchmark suite --- #
+# usage: python -m benchmark.bench [-h] [--sizes SIZES] [--objects OBJECTS] [--out OUT]
+#	[--compare COMPARE] [--threshold THRESHOLD] [--only ONLY] [--groups GROUPS]
+# Run from the repository root. Results are written as JSON, pass an older
+# result file to --compare to detect regressions between commits.
+
+def _grip_first_obj(model):
+	"""
+	Place gripper '0' on a block of object '0' and grip it.
+	"""
+	obj = model.get_obj_by_id("0")
+	for row, blocks in enumerate(obj.block_matrix):
+		for col, block in enumerate(blocks):
+			if block:
+				gr = model.get_gripper_by_id("0")
+				gr.x, gr.y = obj.x + col + 0.5, obj.y + row + 0.5
+				model.grip("0")
+				return
+
+def model_benchmarks(width, height, n_objs):
+	"""
+	@return dict mapping benchmark names to functions without arguments
+	"""
+	model = make_model(width, height, n_objs)
+	obj = model.get_obj_by_id("0")
+	state_json = random_state(model.config, n_objs)
+
+	gripping_model = make_model(width, height, n_objs)
+	_grip_first_obj(gripping_model)
+	direction = [1]
+	def rotate():
+		gripping_model.rotate("0", direction[0])
+		direction[0] *= -1
+
+	return {
+		"has_overlap": lambda: model._has_overlap("0", obj.x, obj.y, obj.block_matrix),
+		"get_grippable": lambda: model._get_grippable("0"),
+		"rotate": rotate,
+		"flip": lambda: gripping_model.flip("0"),
+		"state_to_dict": lambda: model.state.to_dict(),
+		"state_from_json": lambda: model._state_from_JSON(state_json)
+	}
+
+def socket_benchmarks(width, height, n_objs):
+	"""
+	Full event round-trips through the Flask-SocketIO test client:
+	emit an event, let the handler run and collect the emitted updates.
+	"""
+	from app import app, socketio, AUTH, ADMIN_AUTH
+	# the verbose socketio loggers would dominate the measurement
+	socketio.server.logger.disabled = True
+	socketio.server.eio.logger.disabled = True
+	# unthrottled, so every call is executed (see model/qos.py)
+	client = socketio.test_client(app, auth={"token": AUTH, "session_class": "internal", "admin": ADMIN_AUTH})
+	client.emit("load_config", {"width": width, "height": height})
+	state_json = random_state(make_model(width, height, 0).config, n_objs)
+	client.emit("load_state", state_json)
+	client.get_received()
+	direction = [1]
+	def move():
+		client.emit("move", {"id": "0", "dx": direction[0], "dy": 0})
+		direction[0] *= -1
+		client.get_received()
+	def load_state():
+		client.emit("load_state", state_json)
+		client.get_received()
+	# back and forth, ends where it started
+	actions = [{"action": "move", "id": "0", "dx": 1 - 2*(i % 2), "dy": 0} for i in range(8)]
+	def moves_individual():
+		for action in actions:
+			client.emit("move", action)
+		client.get_received()
+	def moves_batch():
+		client.emit("batch", {"actions": actions, "atomic": False})
+		client.get_received()
+	return {
+		"socket_move": move,
+		"socket_load_state": load_state,
+		"socket_moves_individual_8": moves_individual,
+		"socket_moves_batch_8": moves_batch
+	}
+
+def agent_benchmarks(width, height, n_objs, boards=64):
+	"""
+	Legal action masks: computed from scratch, served from the cache and
+	vectorized over many boards (requires numpy).
+	"""
+	from model.legal_actions import compute_legal_actions, batch_move_masks
+	model = make_model(width, height, n_objs)
+	_grip_first_obj(model)
+	models = [make_model(width, height, n_objs, seed=seed) for seed in range(boards)]
+	for board in models:
+		_grip_first_obj(board)
+	gr_ids = ["0"] * boards
+	return {
+		"legal_actions": lambda: compute_legal_actions(model, "0", 4, model.config.move_step),
+		"legal_actions_cached": lambda: model.get_legal_actions("0", 4),
+		"legal_actions_loop_{}".format(boards): lambda: [compute_legal_actions(board, "0", 4, board.config.move_step)
+			for board in models],
+		"legal_actions_batch_{}".format(boards): lambda: batch_move_masks(models, gr_ids, 4)
+	}
+
+def search_benchmarks(width, height, n_objs):
+	"""
+	Cost of maintaining the Zobrist hash: moves with and without an active hash,
+	computing the hash from scratch and transposition cache lookups.
+	"""
+	from model.zobrist import zobrist, TranspositionCache
+	hashed = make_model(width, height, n_objs)
+	hashed.state.get_hash()
+	unhashed = make_model(width, height, n_objs)
+	cache = TranspositionCache()
+	cache.put(hashed.state.get_hash(), True)
+	direction = [1]
+	def move_obj(model):
+		model.state.move_obj("0", direction[0], 0)
+		direction[0] *= -1
+	return {
+		"move_obj_hashed": lambda: move_obj(hashed),
+		"move_obj_unhashed": lambda: move_obj(unhashed),
+		"hash_state": lambda: zobrist.hash_state(hashed.state),
+		"cache_get": lambda: cache.get(hashed.state.get_hash())
+	}
+
+def store_benchmarks(width, height, n_objs, entries=500):
+	"""
+	Journaling overhead per action and the time to read a session's snapshot
+	and a journal tail of the given number of entries.
+	"""
+	import os, tempfile
+	from model.session_store import SessionStore
+	# no snapshots in between, the journal keeps all entries
+	store = SessionStore(os.path.join(tempfile.mkdtemp(), "sessions.db"), snapshot_every=10**9)
+	direction = [1]
+	def move(model):
+		model.move("0", direction[0], 0)
+		direction[0] *= -1
+	stored = make_model(width, height, n_objs)
+	store.restore(stored, "stored")
+	stored.set_state(stored.state.to_dict())
+	for _ in range(entries):
+		move(stored)
+	plain = make_model(width, height, n_objs)
+	journaled = make_model(width, height, n_objs)
+	store.restore(journaled, "journaled")
+	return {
+		"move_unjournaled": lambda: move(plain),
+		"move_journaled": lambda: move(journaled),
+		"load_{}_entries".format(entries): lambda: store.load("stored")
+	}
+
+def world_benchmarks(width, height, n_objs, viewport=20):
+	"""
+	Large boards: a move of a gripped object (overlap checks through the spatial index)
+	and the state sent to a client displaying a viewport around it, compared with the
+	whole board. Run with growing sizes and object counts at constant density.
+	"""
+	model = make_model(width, height, n_objs)
+	_grip_first_obj(model)
+	obj = model.get_obj_by_id("0")
+	model.set_viewport({"x": obj.x - viewport/2, "y": obj.y - viewport/2, "width": viewport, "height": viewport})
+	direction = [1]
+	def move():
+		model.move("0", direction[0], 0)
+		direction[0] *= -1
+	return {
+		"world_move_gripped": move,
+		"world_state_viewport_{}".format(viewport): model.get_state_dict,
+		"world_state_full": model.state.to_dict
+	}
+
+def static_benchmarks(width, height, n_objs):
+	"""
+	A board where all objects but the gripped one are obstacles: a move and the
+	state update sent afterwards, with the obstacles as regular objects compared
+	with static objects (collision mask, left out of updates).
+	"""
+	from model.model import Model
+	regular = make_model(width, height, n_objs)
+	for obj in regular.state.objs.values():
+		obj.x, obj.y = round(obj.x), round(obj.y)
+	state_json = regular.state.to_dict()
+	for obj_id, obj in state_json["objs"].items():
+		obj["static"] = obj_id != "0"
+	static = Model(regular.config, regular.socket, "static")
+	static.set_state(state_json)
+	regular.set_state(regular.state.to_dict())
+	moves = dict()
+	for name, model in (("regular", regular), ("static", static)):
+		_grip_first_obj(model)
+		direction = [1]
+		def move(model=model, direction=direction):
+			model.move("0", direction[0], 0)
+			direction[0] *= -1
+		moves[name] = move
+	return {
+		"static_move_regular": moves["regular"],
+		"static_move_static": moves["static"],
+		"static_update_regular": regular.state.to_dict,
+		"static_update_static": lambda: static.state.to_dict(include_static=False)
+	}
+
+def transport_benchmarks(width, height, n_objs):
+	"""
+	Compression of the payloads sent to a client: a full state (compressed, with and
+	without the preset dictionary) and a gripper update (below the threshold, only sized).
+	"""
+	from model.compression import PayloadCompressor
+	model = make_model(width, height, n_objs)
+	state = model.get_state_dict()
+	grippers = model.state.get_gripper_dict()
+	primed = PayloadCompressor()
+	unprimed = PayloadCompressor(zdict=b"")
+	return {
+		"transport_state_zdict": lambda: primed.encode("update_state", state),
+		"transport_state_plain_zlib": lambda: unprimed.encode("update_state", state),
+		"transport_grippers_skipped": lambda: primed.encode("update_grippers", grippers)
+	}
+
+# benchmark groups by name. Each maps (width, height, number of objects) to named functions
+GROUPS = {
+	"model": model_benchmarks,
+	"socket": socket_benchmarks,
+	"agents": agent_benchmarks,
+	"search": search_benchmarks,
+	"store": store_benchmarks,
+	"world": world_benchmarks,
+	"static": static_benchmarks,
+	"transport": transport_benchmarks
+}
+
+def run(sizes, object_counts, groups, only=None):
+	"""
+	@return dict mapping parameterized benchmark names to timing results
+	"""
+	results = dict()
+	for size in sizes:
+		for n_objs in object_counts:
+			for group in groups:
+				for name, fn in group(size, size, n_objs).items():
+					if only and only not in name:
+						continue
+					key = "{}[w={},h={},n={}]".format(name, size, size, n_objs)
+					results[key] = measure(fn)
+					print("{:<45} {:>12.2f} us".format(key, results[key]["min"]*1e6))
+	return results
+
+def _int_list(arg):
+	return [int(x) for x in arg.split(",")]
+
+parser = argparse.ArgumentParser(description="Run GOLMI's benchmarks.")
+parser.add_argument("--sizes", type=_int_list, default=[20, 50],
+	help="Comma-separated board sizes (width = height). Default: 20,50.")
+parser.add_argument("--objects", type=_int_list, default=[10, 50],
+	help="Comma-separated object counts. Default: 10,50.")
+parser.add_argument("--out", type=str, default="benchmark/results/latest.json",
+	help="File to write the results to.")
+parser.add_argument("--compare", type=str, default=None,
+	help="Result file of an earlier run. Exits with status 1 if a regression is found.")
+parser.add_argument("--threshold", type=float, default=1.2,
+	help="Slowdown factor counted as regression. Default: 1.2.")
+parser.add_argument("--only", type=str, default=None,
+	help="Only run benchmarks whose name contains this string.")
+parser.add_argument("--groups", type=lambda arg: arg.split(","), default=list(GROUPS),
+	help="Comma-separated benchmark groups to run. Default: all ({}).".format(",".join(GROUPS)))
+
+if __name__ == "__main__":
+	args = parser.parse_args()
+	groups = [GROUPS[name] for name in args.groups]
+	results = run(args.sizes, args.objects, groups, args.only)
+	save_results(args.out, results)
+	print("Results written to " + args.out)
+	if args.compare:
+		rows, regressions = compare(load_results(args.compare), {"results": results}, args.threshold)
+		for name, old_min, new_min, ratio in rows:
+			print("{:<45} {:>10.2f} -> {:>10.2f} us  x{:.2f}".format(name, old_min*1e6, new_min*1e6, ratio))
+		if regressions:
+			print("Regressions: " + ", ".join(regressions))
+			sys.exit(1)
@@ -0,0 +1,132 @@
+import json, os, platform, random, subprocess, time, timeit
+from model.config import Config
+from model.model import Model
+
+# --- Helpers shared by the benchmark scripts --- #
+# usage: run from the repository root, e.g. python -m benchmark.bench
+
+TYPE_CONFIG = "app/static/resources/config/pentomino_types.json"
+
+class NullSocket:
+	"""
+	Stand-in for the SocketIO instance a Model notifies. Emits are dropped, so
+	only the model's own work is measured.
+	"""
+	def __init__(self):
+		self.emitted = 0
+
+	def emit(self, event_name, data, room=None, **kwargs):
+		self.emitted += 1
+
+	def start_background_task(self, fn, *args, **kwargs):
+		return None
+
+def make_config(width, height, **kwargs):
+	return Config(TYPE_CONFIG, width=width, height=height, **kwargs)
+
+def random_state(config, n_objs, n_grippers=1, seed=0):
+	"""
+	Generate a state dictionary in the format accepted by Model.set_state.
+	Objects are placed at random block positions and may overlap.
+	@param config 	Config instance, defines board size and available types
+	@param n_objs 	number of objects to create
+	@param n_grippers 	number of grippers to create
+	@param seed 	seed for the random generator, benchmarks have to be reproducible
+	@return dict with keys 'objs' and 'grippers'
+	"""
+	rng = random.Random(seed)
+	types = sorted(config.get_types())
+	objs = dict()
+	for i in range(n_objs):
+		objs[str(i)] = {
+			"type": rng.choice(types),
+			"x": rng.randint(0, max(0, config.width-5)),
+			"y": rng.randint(0, max(0, config.height-5)),
+			"width": 5,
+			"height": 5,
+			"rotation": rng.choice([0, 90, 180, 270]),
+			"mirrored": rng.random() < 0.5,
+			"color": rng.choice(config.colors)
+		}
+	grippers = dict()
+	for i in range(n_grippers):
+		grippers[str(i)] = {
+			"x": rng.randint(0, config.width-1) + 0.5,
+			"y": rng.randint(0, config.height-1) + 0.5
+		}
+	return {"objs": objs, "grippers": grippers}
+
+def make_model(width, height, n_objs, seed=0, socket=None, **config_kwargs):
+	"""
+	@return a Model with a random state and a NullSocket (unless another socket is given)
+	"""
+	config = make_config(width, height, **config_kwargs)
+	model = Model(config, socket if socket else NullSocket(), "benchmark")
+	model.set_state(random_state(config, n_objs, seed=seed))
+	return model
+
+def measure(fn, repeat=5, min_time=0.05):
+	"""
+	Time a function. The number of calls per run is calibrated so that each run
+	takes at least min_time seconds.
+	@param fn 	function without arguments
+	@param repeat 	number of timed runs
+	@param min_time 	minimal duration of a run in seconds
+	@return dict with keys 'min', 'median' (seconds per call), 'calls' and 'ops_per_s'
+	"""
+	timer = timeit.Timer(fn)
+	number, _ = timer.autorange()
+	number = max(1, int(number * min_time / 0.2))
+	runs = sorted(t / number for t in timer.repeat(repeat=repeat, number=number))
+	return {
+		"min": runs[0],
+		"median": runs[len(runs)//2],
+		"calls": number * repeat,
+		"ops_per_s": 1/runs[0] if runs[0] > 0 else None
+	}
+
+def metadata():
+	"""
+	Describes the environment the benchmarks were run in.
+	"""
+	try:
+		commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True,
+			text=True, check=True).stdout.strip()
+	except (OSError, subprocess.CalledProcessError):
+		commit = None
+	return {
+		"commit": commit,
+		"timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+		"python": platform.python_version(),
+		"platform": platform.platform()
+	}
+
+def save_results(filename, results):
+	directory = os.path.dirname(filename)
+	if directory and not os.path.exists(directory):
+		os.makedirs(directory)
+	with open(filename, mode="w", encoding="utf-8") as file:
+		file.write(json.dumps({"meta": metadata(), "results": results}, indent=2))
+
+def load_results(filename):
+	with open(filename, mode="r", encoding="utf-8") as file:
+		return json.loads(file.read())
+
+def compare(old, new, threshold=1.2):
+	"""
+	Compare two result files (as loaded by load_results).
+	@param threshold 	a benchmark counts as regression if new min > threshold * old min
+	@return list of (name, old min, new min, ratio) for benchmarks present in both,
+		and list of names of regressions
+	"""
+	rows = list()
+	regressions = list()
+	for name, new_result in new["results"].items():
+		if name not in old["results"]:
+			continue
+		old_min = old["results"][name]["min"]
+		ratio = new_result["min"] / old_min if old_min > 0 else float("inf")
+		rows.append((name, old_min, new_result["min"], ratio))
+		if ratio > threshold:
+			regressions.append(name)
+	return rows, regressions
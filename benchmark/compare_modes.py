@@ -0,0 +1,65 @@
+import argparse, json, socket, subprocess, sys, time
+from benchmark.load_test import run_load_test
+
+# --- Server mode comparison --- #
+# usage: python -m benchmark.compare_modes [-h] [--clients CLIENTS] [--duration DURATION]
+#	[--think THINK] [--task TASK] [--out OUT]
+# Starts the server once per mode (Flask-SocketIO/eventlet and asyncio/ASGI) and
+# runs the same load test against each.
+
+MODES = {
+	"eventlet": [],
+	"asgi": ["--asgi"]
+}
+
+def _wait_for_port(port, timeout=20):
+	deadline = time.time() + timeout
+	while time.time() < deadline:
+		try:
+			with socket.create_connection(("127.0.0.1", port), timeout=0.5):
+				return
+		except OSError:
+			time.sleep(0.2)
+	raise RuntimeError("server on port {} did not start".format(port))
+
+def compare_modes(n_clients, duration, think_time, task, port=5100):
+	"""
+	@return dict mapping mode names to load test summaries
+	"""
+	results = dict()
+	for i, (mode, flags) in enumerate(MODES.items()):
+		server = subprocess.Popen([sys.executable, "run.py", "--port", str(port+i)] + flags,
+			stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+		try:
+			_wait_for_port(port+i)
+			results[mode] = run_load_test("http://127.0.0.1:{}".format(port+i),
+				n_clients, duration, think_time, task)
+		finally:
+			server.terminate()
+			server.wait()
+	return results
+
+parser = argparse.ArgumentParser(description="Compare the eventlet and asgi server modes under the same load.")
+parser.add_argument("--clients", type=int, default=50,
+	help="Number of simultaneous clients. Default: 50.")
+parser.add_argument("--duration", type=float, default=30,
+	help="Duration of each test in seconds. Default: 30.")
+parser.add_argument("--think", type=float, default=0.05,
+	help="Mean pause between key presses in seconds. Default: 0.05.")
+parser.add_argument("--task", type=str, default="app/static/resources/tasks/pento_test.json",
+	help="State file each client loads.")
+parser.add_argument("--out", type=str, default=None,
+	help="Optional file to write the results to as JSON.")
+
+if __name__ == "__main__":
+	args = parser.parse_args()
+	with open(args.task, mode="r", encoding="utf-8") as file:
+		task = json.loads(file.read())
+	results = compare_modes(args.clients, args.duration, args.think, task)
+	print("{:<10} {:>10} {:>10} {:>10} {:>10}".format("mode", "actions/s", "p50 ms", "p99 ms", "unanswered"))
+	for mode, summary in results.items():
+		print("{:<10} {:>10.1f} {:>10.2f} {:>10.2f} {:>10}".format(mode, summary["actions_per_s"],
+			summary["latency_ms"]["p50"] or 0, summary["latency_ms"]["p99"] or 0, summary["unanswered"]))
+	if args.out:
+		with open(args.out, mode="w", encoding="utf-8") as file:
+			file.write(json.dumps(results, indent=2))
@@ -0,0 +1,169 @@
+import argparse, heapq, itertools, json, random
+from benchmark.common import NullSocket, make_model
+from model.model import Model
+from model.session_store import _NoViews
+
+# --- Perceived latency with client-side prediction --- #
+# usage: python -m benchmark.latency [-h] [--rtts RTTS] [--presses PRESSES] [--interval INTERVAL]
+#	[--others] [--size SIZE] [--objects OBJECTS] [--out OUT]
+# Simulates a participant pressing arrow keys over a connection with the given round-trip
+# time. The server is a real Model handling numbered moves (Model.apply_sequenced); the
+# client follows the protocol of View.js: without prediction, a press is visible once an
+# update acknowledges it; with prediction, pending moves are applied locally on top of the
+# last received state with the model's rules. Time is simulated, so results are exact and
+# independent of the machine. With --others, a second gripper moves an object concurrently
+# on the server, which makes some predictions wrong: these count with the time until the
+# correcting update arrives.
+
+def _percentile(values, p):
+	values = sorted(values)
+	return values[min(len(values) - 1, int(p * len(values)))]
+
+def simulate(rtt, presses, interval, others, size, n_objs, seed=0):
+	"""
+	@param rtt 	round-trip time in seconds, split equally between both directions
+	@param presses 	number of key presses
+	@param interval 	seconds between key presses
+	@param others 	True to let a second gripper move an object on the server meanwhile
+	@return dict with the perceived latencies (seconds) with and without prediction
+		and the fraction of wrong predictions
+	"""
+	rng = random.Random(seed)
+	socket = NullSocket()
+	server = make_model(size, size, n_objs, seed=seed, socket=socket)
+	_remove_overlaps(server)
+	_place_and_grip(server, "0", "0")
+	if others:
+		server.add_gr("1")
+		_place_and_grip(server, "1", "1")
+	config = server.config
+	delay = rtt / 2
+	directions = [(1, 0), (-1, 0), (0, 1), (0, -1)]
+
+	# events: (time, order, kind, data), ordered by time and then creation
+	events = list()
+	order = itertools.count()
+	for i in range(presses):
+		heapq.heappush(events, (i * interval, next(order), "press", (i + 1, rng.choice(directions))))
+		if others:
+			heapq.heappush(events, (i * interval + interval / 2, next(order), "other", rng.choice(directions)))
+
+	confirmed = server.state.copy() # last state the client received
+	pending = list() # (seq, dx, dy) sent, not yet acknowledged
+	press_time = dict()
+	predicted = dict() # seq -> gripper position the prediction showed
+	server_result = dict() # seq -> gripper position after the server applied the move
+	shown_plain = dict() # seq -> time the acknowledging update arrived
+	while events:
+		t, _, kind, data = heapq.heappop(events)
+		if kind == "press":
+			seq, (dx, dy) = data
+			press_time[seq] = t
+			pending.append((seq, dx, dy))
+			predicted[seq] = _predict(config, confirmed, pending)
+			heapq.heappush(events, (t + delay, next(order), "arrive", (seq, dx, dy)))
+		elif kind in ("arrive", "other"):
+			emitted = socket.emitted
+			if kind == "arrive":
+				seq, dx, dy = data
+				server.apply_sequenced("0", seq, server.move, "0", dx, dy)
+				server_result[seq] = tuple(server.get_gripper_coords("0"))
+			else:
+				server.move("1", *data)
+			if socket.emitted > emitted:
+				last_seq = server.get_gripper_by_id("0").last_seq
+				heapq.heappush(events, (t + delay, next(order), "update", (server.state.copy(), last_seq)))
+		else:
+			confirmed, last_seq = data
+			if last_seq is not None:
+				for seq, _, _ in pending:
+					if seq <= last_seq:
+						shown_plain[seq] = t
+				pending = [move for move in pending if move[0] > last_seq]
+
+	plain = [shown_plain[seq] - press_time[seq] for seq in press_time]
+	# a correct prediction is shown at once, a wrong one when the correction arrives
+	wrong = [seq for seq in press_time if predicted[seq] != server_result[seq]]
+	predicted_latency = [shown_plain[seq] - press_time[seq] if seq in wrong else 0 for seq in press_time]
+	return {
+		"rtt_ms": rtt * 1000,
+		"no_prediction_ms": {"median": _percentile(plain, 0.5) * 1000, "p95": _percentile(plain, 0.95) * 1000},
+		"prediction_ms": {"median": _percentile(predicted_latency, 0.5) * 1000,
+			"p95": _percentile(predicted_latency, 0.95) * 1000},
+		"mispredicted": len(wrong) / presses
+	}
+
+def _predict(config, confirmed, pending):
+	"""
+	@return gripper position after applying the pending moves to the confirmed state
+	"""
+	local = Model(config, _NoViews(), "client")
+	local.state = confirmed.copy()
+	for _, dx, dy in pending:
+		local.move("0", dx, dy)
+	return tuple(local.get_gripper_coords("0"))
+
+def _remove_overlaps(model):
+	"""
+	Random states may contain overlapping objects, which could not move at all.
+	Objects are added back in the order of their ids, skipping those that overlap.
+	"""
+	objs = model.state.objs
+	model.state.objs = dict()
+	model.state.invalidate_index()
+	index = model.state.get_index()
+	for obj_id in sorted(objs, key=int):
+		obj = objs[obj_id]
+		model.state.objs[obj_id] = obj
+		index.update(obj_id, obj)
+		if model._has_overlap(obj_id, obj.x, obj.y, obj.block_matrix):
+			del model.state.objs[obj_id]
+			index.remove(obj_id)
+	model.state.invalidate_hash()
+
+def _place_and_grip(model, gr_id, obj_id):
+	"""
+	Place a gripper on a block of an object and grip it.
+	"""
+	obj = model.get_obj_by_id(obj_id)
+	for row, blocks in enumerate(obj.block_matrix):
+		for col, block in enumerate(blocks):
+			if block:
+				gripper = model.get_gripper_by_id(gr_id)
+				gripper.x, gripper.y = obj.x + col + 0.5, obj.y + row + 0.5
+				model.state.invalidate_hash()
+				model.grip(gr_id)
+				return
+
+def _float_list(arg):
+	return [float(x) for x in arg.split(",")]
+
+parser = argparse.ArgumentParser(description="Simulate perceived input latency with and without client-side prediction.")
+parser.add_argument("--rtts", type=_float_list, default=[0, 50, 100, 200, 400],
+	help="Comma-separated round-trip times in ms. Default: 0,50,100,200,400.")
+parser.add_argument("--presses", type=int, default=500,
+	help="Number of key presses. Default: 500.")
+parser.add_argument("--interval", type=float, default=100,
+	help="Time between key presses in ms. Default: 100.")
+parser.add_argument("--others", action="store_true",
+	help="Let a second gripper move an object at the same time.")
+parser.add_argument("--size", type=int, default=20,
+	help="Board width and height. Default: 20.")
+parser.add_argument("--objects", type=int, default=10,
+	help="Number of objects. Default: 10.")
+parser.add_argument("--out", type=str, default=None,
+	help="Optional file to write the results to as JSON.")
+
+if __name__ == "__main__":
+	args = parser.parse_args()
+	results = [simulate(rtt / 1000, args.presses, args.interval / 1000, args.others, args.size, args.objects)
+		for rtt in args.rtts]
+	print("{:>8} {:>14} {:>14} {:>14} {:>14} {:>12}".format("rtt ms", "plain median", "plain p95",
+		"predict median", "predict p95", "mispredicted"))
+	for result in results:
+		print("{:>8.0f} {:>14.1f} {:>14.1f} {:>14.1f} {:>14.1f} {:>12.3f}".format(result["rtt_ms"],
+			result["no_prediction_ms"]["median"], result["no_prediction_ms"]["p95"],
+			result["prediction_ms"]["median"], result["prediction_ms"]["p95"], result["mispredicted"]))
+	if args.out:
+		with open(args.out, mode="w", encoding="utf-8") as file:
+			file.write(json.dumps(results, indent=2))
@@ -0,0 +1,215 @@
+import argparse, json, random, threading, time
+import socketio
+
+# --- GOLMI's load generator --- #
+# usage: python -m benchmark.load_test [-h] [--url URL] [--clients CLIENTS] [--duration DURATION]
+#	[--think THINK] [--bots BOTS] [--bot-think BOT_THINK] [--task TASK] [--seed SEED] [--out OUT]
+# Simulates keyboard-driven participants against a running server (python run.py).
+# Each client has its own session, loads a task, adds a gripper and replays a
+# stream of actions mirroring the key assignment of LocalKeyController.js.
+# With --bots, automated agents (session class 'bot') act at a high rate alongside.
+
+AUTH = "GiveMeTheBigBluePasswordOnTheLeft"
+
+# relative frequency of the simulated keys
+ACTION_WEIGHTS = {
+	"move": 70,		# arrow keys, one-time action
+	"loop_move": 5,	# arrow key held down: looped move, stop_move on release
+	"rotate": 10,	# a / d
+	"flip": 5,		# s / w
+	"grip": 10		# space / enter
+}
+DIRECTIONS = [(-1, 0), (0, -1), (1, 0), (0, 1)]
+
+def percentile(values, q):
+	"""
+	@param values 	sorted list
+	@param q 	float in [0, 1]
+	"""
+	if not values:
+		return None
+	return values[min(len(values)-1, int(q * len(values)))]
+
+class SimulatedClient:
+	def __init__(self, url, task, think_time, seed, timeout=1.0, session_class="human"):
+		"""
+		A single participant or agent.
+		@param url 	server address, e.g. http://127.0.0.1:5000
+		@param task 	state dictionary sent with load_state
+		@param think_time 	mean pause between two key presses in seconds
+		@param seed 	seed for the action stream
+		@param timeout 	seconds to wait for an update before an action counts as unanswered
+		@param session_class 	'human' or 'bot'. Bots number their moves, so the server
+			acknowledges moves it throttled (see Model.apply_sequenced)
+		"""
+		self.url = url
+		self.task = task
+		self.think_time = think_time
+		self.rng = random.Random(seed)
+		self.timeout = timeout
+		self.session_class = session_class
+		self.seq = 0
+		self.gr_id = None
+		self.attached = threading.Event()
+		self.updated = threading.Event()
+		self.latencies = list()	# seconds from emitting an action to the update_grippers receipt
+		self.actions = 0
+		self.updates = 0
+		self.unanswered = 0
+		self.throttled = 0	# actions the server rejected because of the session's budget
+		self.sio = socketio.Client(reconnection=False)
+		self.sio.on("attach_gripper", self._on_attach)
+		self.sio.on("update_grippers", self._on_update)
+		self.sio.on("throttled", self._on_throttled)
+
+	def _on_attach(self, gr_id):
+		self.gr_id = gr_id
+		self.attached.set()
+
+	def _on_update(self, grippers):
+		self.updates += 1
+		self.updated.set()
+
+	def _on_throttled(self, params):
+		# answers the action, but doesn't count as an update
+		self.throttled += 1
+		self.updated.set()
+
+	def connect(self):
+		self.sio.connect(self.url, auth={"token": AUTH, "session_class": self.session_class},
+			transports=["websocket"])
+		self.sio.emit("load_state", self.task)
+		self.sio.emit("add_gripper")
+		if not self.attached.wait(self.timeout):
+			raise RuntimeError("no gripper was attached")
+
+	def disconnect(self):
+		self.sio.disconnect()
+
+	def _timed_emit(self, event, params):
+		"""
+		Emit an action and wait for the resulting gripper update.
+		"""
+		self.updated.clear()
+		throttled = self.throttled
+		start = time.perf_counter()
+		self.sio.emit(event, params)
+		self.actions += 1
+		if self.updated.wait(self.timeout):
+			# rejections are fast, they would distort the latencies
+			if self.throttled == throttled:
+				self.latencies.append(time.perf_counter() - start)
+		else:
+			self.unanswered += 1
+
+	def step(self):
+		"""
+		Simulate a single key press (and release for held keys).
+		"""
+		action = self.rng.choices(list(ACTION_WEIGHTS), weights=list(ACTION_WEIGHTS.values()))[0]
+		dx, dy = self.rng.choice(DIRECTIONS)
+		if action == "move":
+			params = {"id": self.gr_id, "dx": dx, "dy": dy, "loop": False}
+			if self.session_class == "bot":
+				self.seq += 1
+				params["seq"] = self.seq
+			self._timed_emit("move", params)
+		elif action == "loop_move":
+			self._timed_emit("move", {"id": self.gr_id, "dx": dx, "dy": dy, "loop": True})
+			# hold the key for a moment, then release it
+			time.sleep(self.rng.uniform(0.2, 1.0))
+			self.sio.emit("stop_move", {"id": self.gr_id})
+			self.actions += 1
+		elif action == "rotate":
+			# only answered if an object is gripped, don't wait for an update
+			self.sio.emit("rotate", {"id": self.gr_id, "direction": self.rng.choice([-1, 1]), "loop": False})
+			self.actions += 1
+		elif action == "flip":
+			self.sio.emit("flip", {"id": self.gr_id, "loop": False})
+			self.actions += 1
+		else:
+			# only answered if there is an object below the gripper
+			self.sio.emit("grip", {"id": self.gr_id, "loop": False})
+			self.actions += 1
+
+	def run(self, until):
+		while time.time() < until:
+			self.step()
+			time.sleep(self.rng.expovariate(1/self.think_time) if self.think_time > 0 else 0)
+
+def _summarize(clients, elapsed):
+	latencies = sorted(l for client in clients for l in client.latencies)
+	actions = sum(client.actions for client in clients)
+	return {
+		"clients": len(clients),
+		"duration": elapsed,
+		"actions": actions,
+		"actions_per_s": actions / elapsed,
+		"updates_per_s": sum(client.updates for client in clients) / elapsed,
+		"unanswered": sum(client.unanswered for client in clients),
+		"throttled": sum(client.throttled for client in clients),
+		"latency_ms": {
+			"p50": percentile(latencies, 0.5) * 1000 if latencies else None,
+			"p90": percentile(latencies, 0.9) * 1000 if latencies else None,
+			"p99": percentile(latencies, 0.99) * 1000 if latencies else None,
+			"max": latencies[-1] * 1000 if latencies else None
+		}
+	}
+
+def run_load_test(url, n_clients, duration, think_time, task, seed=0, n_bots=0, bot_think=0.0):
+	"""
+	Connect n_clients simulated participants (and n_bots agents) and let them act for duration seconds.
+	@return dict summarizing throughput and latency of the participants, with the key 'bots'
+		holding the same summary for the agents if there are any
+	"""
+	humans = [SimulatedClient(url, task, think_time, seed + i) for i in range(n_clients)]
+	bots = [SimulatedClient(url, task, bot_think, seed + n_clients + i, session_class="bot")
+		for i in range(n_bots)]
+	clients = humans + bots
+	for client in clients:
+		client.connect()
+	start = time.time()
+	threads = [threading.Thread(target=client.run, args=(start + duration,)) for client in clients]
+	for thread in threads:
+		thread.start()
+	for thread in threads:
+		thread.join()
+	elapsed = time.time() - start
+	for client in clients:
+		client.disconnect()
+
+	summary = _summarize(humans, elapsed)
+	if bots:
+		summary["bots"] = _summarize(bots, elapsed)
+	return summary
+
+parser = argparse.ArgumentParser(description="Simulate concurrent participants against a GOLMI server.")
+parser.add_argument("--url", type=str, default="http://127.0.0.1:5000",
+	help="Server address. Default: http://127.0.0.1:5000.")
+parser.add_argument("--clients", type=int, default=10,
+	help="Number of simultaneous clients. Default: 10.")
+parser.add_argument("--duration", type=float, default=30,
+	help="Duration of the test in seconds. Default: 30.")
+parser.add_argument("--think", type=float, default=0.1,
+	help="Mean pause between key presses in seconds. Default: 0.1.")
+parser.add_argument("--bots", type=int, default=0,
+	help="Number of additional agents connecting with the session class 'bot'. Default: 0.")
+parser.add_argument("--bot-think", type=float, default=0.0,
+	help="Mean pause between the actions of an agent in seconds. Default: 0.")
+parser.add_argument("--task", type=str, default="app/static/resources/tasks/pento_test.json",
+	help="State file each client loads.")
+parser.add_argument("--seed", type=int, default=0,
+	help="Seed for the action streams. Default: 0.")
+parser.add_argument("--out", type=str, default=None,
+	help="Optional file to write the summary to as JSON.")
+
+if __name__ == "__main__":
+	args = parser.parse_args()
+	with open(args.task, mode="r", encoding="utf-8") as file:
+		task = json.loads(file.read())
+	summary = run_load_test(args.url, args.clients, args.duration, args.think, task, args.seed,
+		args.bots, args.bot_think)
+	print(json.dumps(summary, indent=2))
+	if args.out:
+		with open(args.out, mode="w", encoding="utf-8") as file:
+			file.write(json.dumps(summary, indent=2))
@@ -0,0 +1,97 @@
+import argparse, json, random, time
+from benchmark.common import make_model
+from benchmark.bench import _grip_first_obj
+from model.legal_actions import MOVE_DIRECTIONS, ROTATE_DIRECTIONS
+from model.zobrist import TranspositionCache
+
+# --- Transposition cache rollouts --- #
+# usage: python -m benchmark.rollouts [-h] [--size SIZE] [--objects OBJECTS] [--rollouts ROLLOUTS]
+#	[--length LENGTH] [--cache-sizes CACHE_SIZES] [--out OUT]
+# Random walks over legal actions from a common start state, as a search algorithm
+# would generate them. Reports how often the transposition cache recognizes a state
+# and what maintaining the hash costs per action.
+
+def _random_action(model, rng):
+	"""
+	Execute a random legal action of gripper '0'.
+	"""
+	legal = model.get_legal_actions("0")
+	actions = [("move", direction) for direction, steps in zip(MOVE_DIRECTIONS, legal["move"]) if steps[0]]
+	actions += [("rotate", direction) for direction, allowed in zip(ROTATE_DIRECTIONS, legal["rotate"]) if allowed]
+	if legal["flip"]: actions.append(("flip", None))
+	if legal["grip"]: actions.append(("grip", None))
+	if not actions:
+		return
+	action, arg = rng.choice(actions)
+	if action == "move":
+		model.move("0", *arg)
+	elif action == "rotate":
+		model.rotate("0", arg)
+	elif action == "flip":
+		model.flip("0")
+	else:
+		model.grip("0")
+
+def _rollouts(size, n_objs, n_rollouts, length, cache, seed, hashed):
+	"""
+	@return number of executed actions and the time spent in them
+	"""
+	rng = random.Random(seed)
+	actions = 0
+	elapsed = 0
+	for _ in range(n_rollouts):
+		# every rollout starts from the same state
+		model = make_model(size, size, n_objs, seed=seed)
+		_grip_first_obj(model)
+		for _ in range(length):
+			t = time.perf_counter()
+			_random_action(model, rng)
+			state_hash = model.state.get_hash() if hashed else None
+			elapsed += time.perf_counter() - t
+			actions += 1
+			if hashed and cache.get(state_hash) is None:
+				cache.put(state_hash, True)
+	return actions, elapsed
+
+def run_rollouts(size, n_objs, n_rollouts, length, cache_sizes, seed=0):
+	"""
+	@return dict with the time per action with and without hashing and the
+		cache statistics for each cache size
+	"""
+	actions, plain = _rollouts(size, n_objs, n_rollouts, length, None, seed, hashed=False)
+	results = {"actions": actions, "us_per_action_unhashed": plain / actions * 1e6, "caches": dict()}
+	for max_size in cache_sizes:
+		cache = TranspositionCache(max_size)
+		actions, hashed = _rollouts(size, n_objs, n_rollouts, length, cache, seed, hashed=True)
+		results["us_per_action_hashed"] = hashed / actions * 1e6
+		results["caches"][max_size] = cache.stats()
+	return results
+
+def _int_list(arg):
+	return [int(x) for x in arg.split(",")]
+
+parser = argparse.ArgumentParser(description="Measure transposition cache hit rates on random rollouts.")
+parser.add_argument("--size", type=int, default=20,
+	help="Board width and height. Default: 20.")
+parser.add_argument("--objects", type=int, default=10,
+	help="Number of objects. Default: 10.")
+parser.add_argument("--rollouts", type=int, default=200,
+	help="Number of rollouts from the start state. Default: 200.")
+parser.add_argument("--length", type=int, default=50,
+	help="Actions per rollout. Default: 50.")
+parser.add_argument("--cache-sizes", type=_int_list, default=[100, 1000, 100000],
+	help="Comma-separated cache sizes to compare. Default: 100,1000,100000.")
+parser.add_argument("--out", type=str, default=None,
+	help="Optional file to write the results to as JSON.")
+
+if __name__ == "__main__":
+	args = parser.parse_args()
+	results = run_rollouts(args.size, args.objects, args.rollouts, args.length, args.cache_sizes)
+	print("{} actions, {:.2f} us/action unhashed, {:.2f} us/action hashed".format(results["actions"],
+		results["us_per_action_unhashed"], results["us_per_action_hashed"]))
+	print("{:>10} {:>10} {:>10} {:>10}".format("cache", "hit rate", "entries", "evictions"))
+	for max_size, stats in results["caches"].items():
+		print("{:>10} {:>10.3f} {:>10} {:>10}".format(max_size, stats["hit_rate"], stats["size"], stats["evictions"]))
+	if args.out:
+		with open(args.out, mode="w", encoding="utf-8") as file:
+			file.write(json.dumps(results, indent=2))
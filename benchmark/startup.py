@@ -0,0 +1,123 @@
+import argparse, gc, json, os, subprocess, sys, time
+
+# --- Startup time and worker memory --- #
+# usage: python -m benchmark.startup [-h] [--runs RUNS] [--workers WORKERS] [--out OUT]
+# Measures the cold start of the server (interpreter start, imports and preload)
+# and the memory of forked workers with and without preloading, as a process
+# manager forking workers from a preloaded master would produce them. Linux only
+# (reads /proc/self/smaps_rollup).
+
+COLD_START = "import time; t = time.perf_counter(); import app; app.preload(); print(time.perf_counter() - t)"
+
+def cold_start(runs):
+	"""
+	@return dict with the wall time of complete processes and the time spent in
+		importing the app and preloading, each the minimum and median over runs in seconds
+	"""
+	wall, in_process = list(), list()
+	for _ in range(runs):
+		start = time.perf_counter()
+		output = subprocess.run([sys.executable, "-c", COLD_START], capture_output=True,
+			text=True, check=True).stdout
+		wall.append(time.perf_counter() - start)
+		in_process.append(float(output.strip().splitlines()[-1]))
+	return {
+		"process_s": {"min": min(wall), "median": sorted(wall)[runs//2]},
+		"import_and_preload_s": {"min": min(in_process), "median": sorted(in_process)[runs//2]}
+	}
+
+def _memory():
+	"""
+	@return dict of the rollup memory counters of this process in kB
+	"""
+	memory = dict()
+	with open("/proc/self/smaps_rollup", mode="r") as file:
+		for line in file:
+			parts = line.split()
+			if len(parts) == 3 and parts[2] == "kB":
+				memory[parts[0].rstrip(":")] = int(parts[1])
+	return memory
+
+def _work():
+	"""
+	A worker's typical load: a session playing a task.
+	"""
+	from app import config, task_templates
+	from model.model import Model
+	from model.tasks import load_task_templates
+	from benchmark.common import NullSocket
+	model = Model(config, NullSocket(), "worker")
+	templates = task_templates or load_task_templates("app/static/resources/tasks", config)
+	for name in templates:
+		model.set_state(templates[name].copy())
+		model.add_gr("w")
+		for i in range(100):
+			model.move("w", 1 if i % 2 else -1, 0)
+	gc.collect()
+
+def probe_workers(n_workers, preload, freeze):
+	"""
+	Import the app (and preload if requested), then fork workers doing some work.
+	Runs in a fresh interpreter, see --probe.
+	@return list of the memory counters of each worker in kB
+	"""
+	import app
+	if preload:
+		app.preload(freeze=freeze)
+	results = list()
+	for _ in range(n_workers):
+		read_end, write_end = os.pipe()
+		pid = os.fork()
+		if pid == 0:
+			os.close(read_end)
+			_work()
+			os.write(write_end, json.dumps(_memory()).encode("utf-8"))
+			os._exit(0)
+		os.close(write_end)
+		with os.fdopen(read_end, mode="r") as pipe:
+			results.append(json.loads(pipe.read()))
+		os.waitpid(pid, 0)
+	return results
+
+def worker_memory(n_workers):
+	"""
+	@return dict mapping the variants (no preload, preload, preload + gc.freeze) to the
+		mean Rss, Pss (Rss with shared pages divided by the number of sharing processes)
+		and private memory of a worker in kB
+	"""
+	variants = {"no_preload": (0, 0), "preload": (1, 0), "preload_freeze": (1, 1)}
+	results = dict()
+	for name, (preload, freeze) in variants.items():
+		output = subprocess.run([sys.executable, "-m", "benchmark.startup", "--probe",
+			str(n_workers), str(preload), str(freeze)], capture_output=True, text=True, check=True).stdout
+		workers = json.loads(output.strip().splitlines()[-1])
+		results[name] = {key: sum(worker.get(key, 0) for worker in workers) / len(workers)
+			for key in ("Rss", "Pss", "Private_Clean", "Private_Dirty")}
+	return results
+
+parser = argparse.ArgumentParser(description="Measure server startup time and worker memory.")
+parser.add_argument("--runs", type=int, default=5,
+	help="Number of cold starts to time. Default: 5.")
+parser.add_argument("--workers", type=int, default=4,
+	help="Number of workers to fork per variant. Default: 4.")
+parser.add_argument("--out", type=str, default=None,
+	help="Optional file to write the results to as JSON.")
+parser.add_argument("--probe", type=int, nargs=3, default=None, help=argparse.SUPPRESS)
+
+if __name__ == "__main__":
+	args = parser.parse_args()
+	if args.probe:
+		n_workers, preload, freeze = args.probe
+		print(json.dumps(probe_workers(n_workers, bool(preload), bool(freeze))))
+		sys.exit(0)
+	results = {"cold_start": cold_start(args.runs), "worker_memory_kb": worker_memory(args.workers)}
+	start = results["cold_start"]
+	print("cold start: {:.3f} s process, {:.3f} s import + preload (min of {})".format(
+		start["process_s"]["min"], start["import_and_preload_s"]["min"], args.runs))
+	print("{:<16} {:>10} {:>10} {:>10}".format("worker kB", "Rss", "Pss", "private"))
+	for name, memory in results["worker_memory_kb"].items():
+		print("{:<16} {:>10.0f} {:>10.0f} {:>10.0f}".format(name, memory["Rss"], memory["Pss"],
+			memory["Private_Clean"] + memory["Private_Dirty"]))
+	if args.out:
+		with open(args.out, mode="w", encoding="utf-8") as file:
+			file.write(json.dumps(results, indent=2))
@@ -0,0 +1,120 @@
+import argparse, json, time
+from model.config import Config
+from model.solver import orientations, region_cells, tilings
+
+# --- Tiling solver benchmark --- #
+# usage: python -m benchmark.tiling [-h] [--boards BOARDS] [--limit LIMIT] [--types TYPES] [--out OUT]
+# Enumerates tilings of rectangles with all pentominoes, each used once, with the exact
+# cover solver (model/solver.py), with and without using the board's symmetries, and
+# with plain backtracking. Reports the time to the first solution and solutions per second.
+
+def naive_tilings(region, pieces, type_table, limit=None):
+	"""
+	Plain backtracking: fill the first empty cell with each unused piece in each orientation
+	that fits, without choosing the most constrained cell. Cells are filled along the shorter
+	side of the region first, which keeps the frontier of empty cells short.
+	@return generator of solutions like model.solver.tilings
+	"""
+	cells = region_cells(region)
+	shapes = {type_name: orientations(type_table, type_name) for type_name in pieces}
+	if sum(len(shapes[type_name][0][2]) for type_name in pieces) != len(cells):
+		return
+	width = max(x for x, _ in cells) - min(x for x, _ in cells)
+	height = max(y for _, y in cells) - min(y for _, y in cells)
+	def position(cell):
+		return (cell[0], cell[1]) if width > height else (cell[1], cell[0])
+	order = sorted(cells, key=position)
+	empty = set(cells)
+	chosen = list()
+
+	def search(start):
+		while start < len(order) and order[start] not in empty:
+			start += 1
+		if start == len(order):
+			yield list(chosen)
+			return
+		x, y = order[start]
+		used = {option[0] for option in chosen}
+		for type_name in pieces:
+			if type_name in used:
+				continue
+			for rotation, mirrored, shape, (offset_x, offset_y) in shapes[type_name]:
+				# the shape's first cell in filling order lands on (x, y)
+				first_x, first_y = min(shape, key=position)
+				covered = [(x + dx - first_x, y + dy - first_y) for dx, dy in shape]
+				if all(cell in empty for cell in covered):
+					empty.difference_update(covered)
+					chosen.append((type_name, rotation, mirrored, x - first_x - offset_x,
+						y - first_y - offset_y, covered))
+					yield from search(start + 1)
+					chosen.pop()
+					empty.update(covered)
+
+	found = 0
+	for solution in search(0):
+		yield solution
+		found += 1
+		if limit is not None and found >= limit:
+			return
+
+def _time(solutions):
+	"""
+	@return dict with the number of solutions, the seconds to the first one and in total
+	"""
+	start = time.perf_counter()
+	first = None
+	count = 0
+	for _ in solutions:
+		if first is None:
+			first = time.perf_counter() - start
+		count += 1
+	total = time.perf_counter() - start
+	return {"solutions": count, "first_s": first, "total_s": total, "per_s": count / total}
+
+SOLVERS = {
+	"exact_cover": lambda region, pieces, table, limit: tilings(region, pieces, table, limit),
+	"exact_cover_no_symmetry": lambda region, pieces, table, limit:
+		tilings(region, pieces, table, limit, use_symmetry=False),
+	"naive": naive_tilings
+}
+
+def run(boards, limit, type_file):
+	"""
+	@param boards 	list of (width, height)
+	@param limit 	number of solutions to enumerate per board and solver, None for all
+	@return dict mapping board names to dicts mapping solvers to timings
+	"""
+	table = Config(type_file).get_type_table()
+	pieces = list(table.types)
+	results = dict()
+	for width, height in boards:
+		region = [[1] * width for _ in range(height)]
+		results["{}x{}".format(width, height)] = {name: _time(solver(region, pieces, table, limit))
+			for name, solver in SOLVERS.items()}
+	return results
+
+def _boards(arg):
+	return [tuple(int(n) for n in board.split("x")) for board in arg.split(",")]
+
+parser = argparse.ArgumentParser(description="Compare the exact cover tiling solver with plain backtracking.")
+parser.add_argument("--boards", type=_boards, default=[(20, 3), (15, 4), (12, 5), (10, 6)],
+	help="Comma-separated boards as WIDTHxHEIGHT. Default: 20x3,15x4,12x5,10x6.")
+parser.add_argument("--limit", type=int, default=200,
+	help="Solutions to enumerate per board and solver, 0 for all. Default: 200.")
+parser.add_argument("--types", type=str, default="app/static/resources/config/pentomino_types.json",
+	help="Type configuration. Default: the pentomino types.")
+parser.add_argument("--out", type=str, default=None,
+	help="Optional file to write the results to as JSON.")
+
+if __name__ == "__main__":
+	args = parser.parse_args()
+	results = run(args.boards, args.limit or None, args.types)
+	print("{:<8} {:<24} {:>10} {:>10} {:>10} {:>10}".format("board", "solver", "solutions", "first s",
+		"total s", "per s"))
+	for board, timings in results.items():
+		for name, timing in timings.items():
+			print("{:<8} {:<24} {:>10} {:>10.3f} {:>10.2f} {:>10.0f}".format(board, name, timing["solutions"],
+				timing["first_s"] or 0, timing["total_s"], timing["per_s"]))
+	if args.out:
+		with open(args.out, mode="w", encoding="utf-8") as file:
+			file.write(json.dumps(results, indent=2))
@@ -0,0 +1,41 @@
+import asyncio
+from model.model import Model
+from model.metrics import metrics
+
+class AsyncModel(Model):
+	"""
+	Model for an asyncio server (socketio.AsyncServer). The actions themselves are
+	short and CPU-bound, so they stay synchronous; everything that waits is
+	non-blocking: notifications are scheduled as tasks instead of being sent in
+	place and looped actions run as coroutines sleeping on the event loop.
+	"""
+
+	def _emit(self, event_name, data):
+		# AsyncServer.emit is a coroutine, schedule it instead of waiting for the transport
+		self.socket.start_background_task(self.socket.emit, event_name, data, room=self.room)
+
+	async def _flush_later(self, delay):
+		await asyncio.sleep(delay)
+		self._flush()
+
+	def _new_stop_event(self):
+		return asyncio.Event()
+
+	async def _setInterval(self, interval, stop_event, fn, *args, **kwargs):
+		loop = asyncio.get_running_loop()
+		metrics.add_gauge("live_loops", 1)
+		try:
+			# immediately execute once. Ticks exceeding the session's budget are skipped
+			if self.admit(source="loop"):
+				fn(*args, **kwargs)
+			next_time = loop.time() + interval
+			while not stop_event.is_set():
+				try:
+					# wait for interval to pass or stop event
+					await asyncio.wait_for(stop_event.wait(), max(0, next_time - loop.time()))
+				except asyncio.TimeoutError:
+					next_time += interval
+					if self.admit(source="loop"):
+						fn(*args, **kwargs)
+		finally:
+			metrics.add_gauge("live_loops", -1)
@@ -0,0 +1,83 @@
+import json, time, zlib
+from model.metrics import metrics
+
+# JSON fragments frequent in state and config payloads. zlib is primed with them
+# (preset dictionary), so even their first occurrence in a payload is a short back
+# reference. Later fragments are closer to the data and cheaper to reference, so
+# the most frequent ones come last.
+ZDICT_FRAGMENTS = (
+	'{"width":', ',"height":', ',"actions":["move","rotate"],"rotation_step":', ',"move_step":',
+	',"prevent_overlap":', ',"type_hash":"', '"colors":["red","orange","yellow","green","blue","purple","saddlebrown","grey"]}',
+	'"last_seq":', '{"grippers":{', '},"static":{', '"color":"red"', '"color":"orange"', '"color":"yellow"',
+	'"color":"purple"', '"color":"saddlebrown"', '"color":"grey"', '"color":"green"', '"color":"blue"',
+	',"gripped":null}', ',"gripped":{', ',"gripped":false}', '},"objs":{"', ',"width":5.0,"height":5.0,"rotation":',
+	'.0,"mirrored":false', '.0,"mirrored":true', ',"block_matrix":[[0,0,0,0,0],[0,', '],[0,0,0,0,0]]',
+	'{"type":"', '","x":', '.5,"y":', '.0,"y":', '[0,0,1,0,0]', '[0,1,1,0,0]', '[0,0,1,1,0]', '[0,1,1,1,0]',
+)
+ZDICT = "".join(ZDICT_FRAGMENTS).encode("utf-8")
+# payloads whose JSON is shorter are sent as they are
+DEFAULT_THRESHOLD = 1024
+# events whose payloads grow with the board. Others, e.g. the frequent update_grippers,
+# are sent as they are without even measuring them
+COMPRESSIBLE_EVENTS = frozenset(("update_state", "update_config", "update_objs"))
+
+class PayloadCompressor:
+	def __init__(self, threshold=DEFAULT_THRESHOLD, level=6, zdict=ZDICT, events=COMPRESSIBLE_EVENTS):
+		"""
+		Size-aware compression of the payloads sent to a client. Payloads of the given
+		events above the threshold are replaced by {"zlib": <bytes>}, the zlib stream
+		(with the preset dictionary zdict) of their compact JSON. Smaller payloads and
+		other events, e.g. the frequent update_grippers, are sent unchanged. While
+		metrics are enabled, the bytes before and after compression are counted and
+		the time spent is recorded per event type.
+		@param threshold 	minimal size of the JSON in bytes to compress a payload
+		@param level 	zlib compression level (1: fastest to 9: smallest)
+		@param zdict 	preset dictionary, the client has to inflate with the same one
+		@param events 	names of the events whose payloads may be compressed
+		"""
+		self.threshold = threshold
+		self.level = level
+		self.zdict = zdict
+		self.events = events
+
+	def encode(self, event_name, data, payload=None):
+		"""
+		@param event_name 	event the payload is sent with
+		@param data 	JSON-serializable payload
+		@param payload 	optional compact JSON of data (json.dumps with separators (",", ":")),
+			if the caller serialized it already
+		@return data or, if the event is one of events and its JSON is at least threshold
+			bytes long, {"zlib": <bytes>}
+		"""
+		if event_name not in self.events:
+			return data
+		if payload is None:
+			payload = json.dumps(data, separators=(",", ":"))
+		payload = payload.encode("utf-8")
+		if len(payload) < self.threshold:
+			metrics.inc("compression.skipped." + event_name)
+			return data
+		start = time.perf_counter()
+		compressor = zlib.compressobj(self.level, zdict=self.zdict)
+		compressed = compressor.compress(payload) + compressor.flush()
+		if metrics.enabled:
+			metrics.observe("compression." + event_name, time.perf_counter() - start)
+			metrics.inc("compression.bytes_in." + event_name, len(payload))
+			metrics.inc("compression.bytes_out." + event_name, len(compressed))
+		return {"zlib": compressed}
+
+	def decode(self, data):
+		"""
+		Inverse of encode, e.g. for tests and Python clients.
+		@return the original payload
+		"""
+		if type(data) != dict or set(data) != {"zlib"}:
+			return data
+		decompressor = zlib.decompressobj(zdict=self.zdict)
+		return json.loads(decompressor.decompress(data["zlib"]) + decompressor.flush())
+
+	def to_dict(self):
+		"""
+		Settings the client needs to decode payloads, sent with the event 'compression'.
+		"""
+		return {"threshold": self.threshold, "zdict": self.zdict.decode("utf-8")}
@@ -1,9 +1,11 @@
 import json
+from model.type_registry import type_registry
 
 #Class to store settings such as board width, allowable actions, etc.
 class Config:
 	def __init__(self, type_config, width=20, height=20, snap_to_grid=False, prevent_overlap=True,
-	             actions=["move", "rotate"], move_step=0.5, rotation_step=90, action_interval=0.5):
+	             actions=["move", "rotate"], move_step=0.5, rotation_step=90, action_interval=0.5,
+	             frame_interval=0):
 		"""
 		Constructor.
 		@param type_config	json file or object mapping types to 0/1 matrices indicating type shapes
@@ -15,6 +17,8 @@ class Config:
 	 	@param move_step	step size for object movement. default:0.2[blocks]
 		@param rotation_step	applied angle when object is rotated. Limitations might exist for View implementations. default:90
 	 	@param action_interval	frequency of repeating looped actions in seconds. default: 0.5
+	 	@param frame_interval	minimal time between two updates sent to a client in seconds, 
+	 		changes in between are merged. 0 to send every change right away. default: 0
 	 	"""
 		self.width				= width
 		self.height 			= height
@@ -24,6 +28,7 @@ class Config:
 		self.move_step			= move_step
 		self.rotation_step		= rotation_step
 		self.action_interval	= action_interval
+		self.frame_interval		= frame_interval
 
 		if type(type_config) == str:
 			self.type_config = self._types_from_JSON(type_config)
@@ -42,9 +47,34 @@ class Config:
 						]
 	
 
+	def __setattr__(self, name, value):
+		if self.__dict__.get("_frozen"):
+			raise AttributeError("Config is frozen, use derive() to change settings for a session")
+		object.__setattr__(self, name, value)
+
+	def freeze(self):
+		"""
+		Make this instance immutable, e.g. because it is shared by all sessions.
+		Sessions change settings in an overlay created by derive().
+		"""
+		self._frozen = True
+
+	def derive(self, overrides=None):
+		"""
+		@param overrides 	optional dict of settings that differ from this instance
+		@return ConfigOverlay using this instance as base
+		"""
+		return ConfigOverlay(self, overrides)
+
 	def get_types(self): 
 		return self.type_config.keys()
 
+	def get_type_table(self):
+		"""
+		@return TypeTable of the current type configuration, see model/type_registry.py
+		"""
+		return type_registry.register(self.type_config)
+
 	def _types_from_JSON(self, filename):
 		"""
 		Parses a JSON file containing type matrices.
@@ -59,13 +89,52 @@ class Config:
 
 	def to_dict(self):
 		"""
-		Constructs a dictionary from this instance.
+		Constructs a dictionary from this instance. The type configuration is
+		represented by its hash, the table itself is served by the /types route.
 		"""
 		return {
 			"width": self.width,
 			"height": self.height,
 			"actions": self.actions,
 			"rotation_step": self.rotation_step,
-			"type_config": self.type_config,
+			"move_step": self.move_step,
+			"prevent_overlap": self.prevent_overlap,
+			"type_hash": self.get_type_table().hash,
 			"colors": self.colors
 			}
+
+
+class ConfigOverlay(Config):
+	def __init__(self, base, overrides=None):
+		"""
+		Per-session view on a shared configuration. Only overridden settings are
+		stored, everything else (including the type config) is taken from the base.
+		Values read from the base are cached in the instance, so after the first
+		access a lookup costs the same as for a plain Config. This requires the
+		base not to change anymore, see Config.freeze().
+		@param base 	Config (usually frozen) to fall back on
+		@param overrides 	optional dict of settings that differ from base
+		"""
+		object.__setattr__(self, "_base", base)
+		object.__setattr__(self, "_overridden", set())
+		if overrides:
+			for attr_key, attr_value in overrides.items():
+				setattr(self, attr_key, attr_value)
+
+	def __getattr__(self, name):
+		# only called if name is not in the instance dict yet
+		if name in ("_base", "_overridden") or name.startswith("__"):
+			raise AttributeError(name)
+		value = getattr(self._base, name)
+		object.__setattr__(self, name, value)
+		return value
+
+	def __setattr__(self, name, value):
+		self._overridden.add(name)
+		object.__setattr__(self, name, value)
+
+	def get_overrides(self):
+		"""
+		@return dict of the settings that differ from the base
+		"""
+		return {attr_key: self.__dict__[attr_key] for attr_key in self._overridden}
@@ -7,14 +7,19 @@ class Gripper(Obj):
 		# instance that is currently gripped
 		Obj.__init__(self, "gripper", x, y, width, height, [[1]], 
 			rotation=0, mirrored=False, color=color, gripped=gripped)
+		# sequence number of the last action a client sent for this gripper, see Model.apply_sequenced
+		self.last_seq = None
 
 	def to_dict(self):
 		"""
 		Constructs a JSON-friendly dictionary representation of this instance.
 		@return dictionary containing all important properties
 		"""
-		return {
+		gr_dict = {
 			"x": self.x,
 			"y": self.y,
 			"color": self.color
-			}
\ No newline at end of file
+			}
+		if self.last_seq is not None:
+			gr_dict["last_seq"] = self.last_seq
+		return gr_dict
\ No newline at end of file
@@ -0,0 +1,250 @@
+from math import floor
+
+# order of the move directions in the masks: left, up, right, down (as in LocalKeyController.js)
+MOVE_DIRECTIONS = ((-1, 0), (0, -1), (1, 0), (0, 1))
+# lattice resolutions tried by batch_move_masks, see _move_mask_chunk
+LATTICE_RESOLUTIONS = (1, 2, 4, 8)
+# order of the rotation directions in the masks: leftwards, rightwards
+ROTATE_DIRECTIONS = (-1, 1)
+
+class OccupancyGrid:
+	def __init__(self, objs, exclude=None):
+		"""
+		Index of object blocks by grid cell, built in a single pass over the objects.
+		Two blocks overlap if their origins are less than 1 apart in both dimensions
+		(the same rule Model._has_overlap applies).
+		@param objs 	iterable of (object id, Obj) pairs
+		@param exclude 	optional id of an object to leave out, e.g. the one to be moved
+		"""
+		# (floor(x), floor(y)) mapped to the blocks in this cell: object position and block offset
+		self.cells = dict()
+		for obj_id, obj in objs:
+			if obj_id == exclude:
+				continue
+			for row, blocks in enumerate(obj.block_matrix):
+				for col, block in enumerate(blocks):
+					if block:
+						self.cells.setdefault((floor(obj.x + col), floor(obj.y + row)), list()).append(
+							(obj.x, obj.y, col, row))
+
+	def blocked(self, x, y, col=0, row=0):
+		"""
+		@return True if block (col, row) of an object placed at (x, y) would overlap an indexed block
+		"""
+		cell_x = floor(x + col)
+		cell_y = floor(y + row)
+		for grid_x in (cell_x-1, cell_x, cell_x+1):
+			for grid_y in (cell_y-1, cell_y, cell_y+1):
+				for other_x, other_y, other_col, other_row in self.cells.get((grid_x, grid_y), ()):
+					# computed as in Model._has_overlap, so fractional positions round the same way
+					block_x = col + (x - other_x)
+					block_y = row + (y - other_y)
+					if other_col - 1 < block_x < other_col + 1 and other_row - 1 < block_y < other_row + 1:
+						return True
+		return False
+
+	def collides(self, x, y, block_matrix):
+		"""
+		@return True if an object with the given block matrix placed at (x, y) would overlap an indexed block
+		"""
+		for row, blocks in enumerate(block_matrix):
+			for col, block in enumerate(blocks):
+				if block and self.blocked(x, y, col, row):
+					return True
+		return False
+
+def compute_legal_actions(model, gr_id, max_steps, step_size):
+	"""
+	Determine which actions a gripper could execute successfully, applying the same
+	rules as Model.move, rotate, flip and grip. The occupancy of the other objects
+	is computed once for all candidate actions.
+	@param model 	Model instance
+	@param gr_id 	id of an existing gripper
+	@param max_steps 	moves of 1 to max_steps steps are checked in each direction
+	@param step_size 	size of a step in blocks
+	@return dict, see Model.get_legal_actions
+	"""
+	gr_x, gr_y = model.get_gripper_coords(gr_id)
+	obj_id = model.get_gripped_obj(gr_id)
+	obj = model.get_obj_by_id(obj_id) if obj_id else None
+	occupancy = None
+	if obj and model.config.prevent_overlap:
+		occupancy = OccupancyGrid(model.state.objs.items(), exclude=obj_id)
+
+	def collides(x, y, block_matrix):
+		# static objects are checked against their precompiled mask
+		return occupancy is not None and (occupancy.collides(x, y, block_matrix) or
+			model.state.blocked_by_static(x, y, block_matrix))
+
+	move = list()
+	for dir_x, dir_y in MOVE_DIRECTIONS:
+		legal = list()
+		for steps in range(1, max_steps+1):
+			dx = dir_x*steps*step_size
+			dy = dir_y*steps*step_size
+			allowed = model._is_in_limits(gr_x+dx, gr_y+dy)
+			if allowed and obj:
+				allowed = model._is_in_limits(obj.get_center_x()+dx, obj.get_center_y()+dy) and \
+					not collides(obj.x+dx, obj.y+dy, obj.block_matrix)
+			legal.append(allowed)
+		move.append(legal)
+
+	if obj:
+		rotate = [not collides(obj.x, obj.y,
+			model.state.rotate_block_matrix(obj.block_matrix, direction*model.config.rotation_step))
+			for direction in ROTATE_DIRECTIONS]
+		flip = not collides(obj.x, obj.y, model.state.flip_block_matrix(obj.block_matrix))
+		# ungripping is always possible
+		grip = True
+	else:
+		rotate = [False] * len(ROTATE_DIRECTIONS)
+		flip = False
+		grip = model._get_grippable(gr_id) is not None
+	return {"move": move, "rotate": rotate, "flip": flip, "grip": grip}
+
+def batch_move_masks(models, gr_ids, max_steps=1, chunk_size=64):
+	"""
+	Vectorized move legality for many boards at once (requires numpy). Applies the
+	same rules as compute_legal_actions, using each model's move_step as step size.
+	Boards whose positions and step sizes are multiples of 1/8 (as produced by the
+	usual configurations) are rasterized, others fall back to comparing all pairs
+	of blocks.
+	@param models 	list of Model instances
+	@param gr_ids 	list of gripper ids, one per model
+	@param max_steps 	moves of 1 to max_steps steps are checked in each direction
+	@param chunk_size 	number of boards processed per array operation, limits memory use
+	@return numpy bool array of shape (boards, directions, max_steps),
+		directions ordered as in MOVE_DIRECTIONS
+	"""
+	# numpy is only imported when needed, it is the slowest import of the server
+	import numpy as np
+	masks = [_move_mask_chunk(models[i:i+chunk_size], gr_ids[i:i+chunk_size], max_steps)
+		for i in range(0, len(models), chunk_size)]
+	return np.concatenate(masks) if masks else np.zeros((0, len(MOVE_DIRECTIONS), max_steps), dtype=bool)
+
+def _block_offsets(obj):
+	return [(col, row) for row, blocks in enumerate(obj.block_matrix)
+		for col, block in enumerate(blocks) if block]
+
+def _other_blocks(obj):
+	# (origin, offset) per block, so the pairwise path can round like Model._has_overlap
+	return [(obj.x, obj.y, col, row) for col, row in _block_offsets(obj)]
+
+def _static_blocks(obj):
+	# static blocks are cells of State.static_mask, compared like State.blocked_by_static
+	return [(0, 0, obj.x + col, obj.y + row) for col, row in _block_offsets(obj)]
+
+def _move_mask_chunk(models, gr_ids, max_steps):
+	import numpy as np
+	boards = len(models)
+	# unpack the boards into padded arrays
+	grippers = np.zeros((boards, 2))
+	origins = np.zeros((boards, 2))
+	centers = np.zeros((boards, 2))
+	limits = np.zeros((boards, 2))
+	step_sizes = np.zeros(boards)
+	has_obj = np.zeros(boards, dtype=bool)
+	check_overlap = np.zeros(boards, dtype=bool)
+	own_blocks = list()
+	other_blocks = list()
+	for b, (model, gr_id) in enumerate(zip(models, gr_ids)):
+		grippers[b] = model.get_gripper_coords(gr_id)
+		limits[b] = (model.get_width(), model.get_height())
+		step_sizes[b] = model.config.move_step
+		obj_id = model.get_gripped_obj(gr_id)
+		own, others = list(), list()
+		if obj_id:
+			obj = model.get_obj_by_id(obj_id)
+			has_obj[b] = True
+			centers[b] = (obj.get_center_x(), obj.get_center_y())
+			origins[b] = (obj.x, obj.y)
+			own = _block_offsets(obj)
+			if model.config.prevent_overlap:
+				check_overlap[b] = True
+				# only objects within reach of the candidate moves can overlap
+				reach = max_steps*model.config.move_step + 1
+				for other_id, other in model.state.objs.items():
+					if other_id != obj_id and \
+						other.get_right_edge() > obj.get_left_edge() - reach and \
+						other.get_left_edge() < obj.get_right_edge() + reach and \
+						other.get_bottom_edge() > obj.get_top_edge() - reach and \
+						other.get_top_edge() < obj.get_bottom_edge() + reach:
+						others.extend(_other_blocks(other))
+				# static objects are few near any object, the index finds them directly
+				for static_id in model.state.static_index.query(obj.get_left_edge() - reach,
+					obj.get_top_edge() - reach, obj.get_right_edge() + reach, obj.get_bottom_edge() + reach):
+					others.extend(_static_blocks(model.state.static[static_id]))
+		own_blocks.append(own)
+		other_blocks.append(others)
+	n_own = max([len(blocks) for blocks in own_blocks] + [1])
+	n_other = max([len(blocks) for blocks in other_blocks] + [1])
+	# padding: own blocks are masked, other blocks are placed far away
+	own_offsets = np.zeros((boards, n_own, 2))
+	own_valid = np.zeros((boards, n_own), dtype=bool)
+	other_origins = np.zeros((boards, n_other, 2))
+	other_offsets = np.full((boards, n_other, 2), np.inf)
+	for b in range(boards):
+		if own_blocks[b]:
+			own_offsets[b, :len(own_blocks[b])] = own_blocks[b]
+			own_valid[b, :len(own_blocks[b])] = True
+		if other_blocks[b]:
+			blocks = np.array(other_blocks[b], dtype=float)
+			other_origins[b, :len(blocks)] = blocks[:, :2]
+			other_offsets[b, :len(blocks)] = blocks[:, 2:]
+	own = origins[:, None, :] + own_offsets
+	other = other_origins + other_offsets
+
+	# offsets of all candidate moves: (boards, directions, steps, 2)
+	directions = np.array(MOVE_DIRECTIONS, dtype=float)
+	steps = np.arange(1, max_steps+1, dtype=float)
+	offsets = directions[None, :, None, :] * steps[None, None, :, None] * step_sizes[:, None, None, None]
+
+	def in_limits(points):
+		return ((points >= 0) & (points <= limits[:, None, None, :])).all(axis=-1)
+	gripper_ok = in_limits(grippers[:, None, None, :] + offsets)
+	center_ok = in_limits(centers[:, None, None, :] + offsets)
+	# candidate object origins: (boards, directions, steps, 2)
+	moved = origins[:, None, None, :] + offsets
+	overlap = np.zeros(gripper_ok.shape, dtype=bool)
+	finite = np.isfinite(other).all(axis=-1)
+	# On boards where all positions and steps lie on a lattice with unit 1/q, two blocks
+	# overlap iff their lattice coordinates differ by less than q in both dimensions. These
+	# boards are rasterized: occupied lattice points are spread to their neighbourhood once,
+	# then each candidate block is a single lookup.
+	def on_lattice(q):
+		return check_overlap & (step_sizes*q % 1 == 0) & (own*q % 1 == 0).all(axis=(1, 2)) & \
+			(np.where(finite[:, :, None], other, 0)*q % 1 == 0).all(axis=(1, 2))
+	q = next((q for q in LATTICE_RESOLUTIONS if (on_lattice(q) == check_overlap).all()), LATTICE_RESOLUTIONS[-1])
+	aligned = on_lattice(q)
+	if aligned.any():
+		# candidate block origins: (boards, directions, steps, own blocks, 2)
+		candidates = moved[aligned][:, :, :, None, :] + own_offsets[aligned][:, None, None, :, :]
+		cells = np.rint(candidates*q).astype(int)
+		board_idx, block_idx = np.nonzero(finite[aligned])
+		occupied = np.rint(other[aligned][board_idx, block_idx]*q).astype(int)
+		low = np.minimum(cells.reshape(-1, 2).min(axis=0), occupied.min(axis=0, initial=0)) - q
+		high = np.maximum(cells.reshape(-1, 2).max(axis=0), occupied.max(axis=0, initial=0)) + q
+		points = np.zeros((aligned.sum(), high[1]-low[1]+1, high[0]-low[0]+1), dtype=bool)
+		points[board_idx, occupied[:, 1]-low[1], occupied[:, 0]-low[0]] = True
+		grid = np.zeros_like(points)
+		rows, cols = points.shape[1:]
+		for dy in range(-q+1, q):
+			for dx in range(-q+1, q):
+				grid[:, max(dy, 0):rows+min(dy, 0), max(dx, 0):cols+min(dx, 0)] |= \
+					points[:, max(-dy, 0):rows+min(-dy, 0), max(-dx, 0):cols+min(-dx, 0)]
+		boards_of_cells = np.arange(len(grid))[:, None, None, None]
+		hits = grid[boards_of_cells, cells[..., 1]-low[1], cells[..., 0]-low[0]]
+		overlap[aligned] = (hits & own_valid[aligned][:, None, None, :]).any(axis=-1)
+	# other boards: compare all pairs of blocks. The operations are those of Model._has_overlap:
+	# the block offset plus the shift between the objects must be within 1 of the other block's
+	# offset, so positions that are not multiples of a power of 2 round the same way.
+	pairwise = check_overlap & ~aligned
+	if pairwise.any():
+		# (boards, directions, steps, own blocks, other blocks, 2)
+		shift = moved[pairwise][:, :, :, None, None, :] - other_origins[pairwise][:, None, None, None, :, :]
+		position = own_offsets[pairwise][:, None, None, :, None, :] + shift
+		target = other_offsets[pairwise][:, None, None, None, :, :]
+		close = ((position > target - 1) & (position < target + 1)).all(axis=-1)
+		overlap[pairwise] = (close & own_valid[pairwise][:, None, None, :, None]).any(axis=(-1, -2))
+	obj_ok = center_ok & ~overlap
+	return gripper_ok & (~has_obj[:, None, None] | obj_ok)
@@ -0,0 +1,167 @@
+import asyncio, time, threading
+from bisect import bisect_left
+from functools import wraps
+
+# upper bounds (in seconds) of the latency histogram buckets. Anything slower lands in +Inf
+LATENCY_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+class Histogram:
+	def __init__(self, buckets=LATENCY_BUCKETS):
+		"""
+		Cumulative-free histogram with fixed bucket bounds.
+		@param buckets 	sorted tuple of upper bucket bounds
+		"""
+		self.buckets = buckets
+		self.counts = [0] * (len(buckets)+1) # last field is the +Inf bucket
+		self.count = 0
+		self.sum = 0.0
+
+	def observe(self, value):
+		self.counts[bisect_left(self.buckets, value)] += 1
+		self.count += 1
+		self.sum += value
+
+	def quantile(self, q):
+		"""
+		Estimate a quantile from the bucket counts (upper bound of the matching bucket).
+		@param q 	float in [0, 1]
+		@return upper bucket bound or None if nothing was observed
+		"""
+		if self.count == 0:
+			return None
+		rank = q * self.count
+		seen = 0
+		for i, n in enumerate(self.counts):
+			seen += n
+			if seen >= rank and n > 0:
+				return self.buckets[i] if i < len(self.buckets) else float("inf")
+		return float("inf")
+
+	def to_dict(self):
+		"""
+		Constructs a JSON-friendly dictionary representation of this instance.
+		"""
+		return {
+			"count": self.count,
+			"sum": self.sum,
+			"buckets": {str(bound): n for bound, n in zip(self.buckets, self.counts)},
+			"inf": self.counts[-1],
+			"p50": self.quantile(0.5),
+			"p99": self.quantile(0.99)
+			}
+
+class Metrics:
+	def __init__(self, enabled=False):
+		"""
+		Collects counters, gauges and latency histograms. Counters and histograms
+		are only recorded while enabled, so instrumented code paths cost a single
+		attribute check otherwise. Gauges are always maintained since they describe
+		absolute values (e.g. open sessions) that would be wrong after re-enabling.
+		@param enabled 	True to start recording immediately. Can be changed at runtime.
+		"""
+		self.enabled = enabled
+		self.counters = dict()
+		self.gauges = dict()
+		self.histograms = dict()
+		self.lock = threading.Lock()
+
+	def inc(self, name, value=1):
+		if self.enabled:
+			with self.lock:
+				self.counters[name] = self.counters.get(name, 0) + value
+
+	def set_gauge(self, name, value):
+		self.gauges[name] = value
+
+	def add_gauge(self, name, delta):
+		with self.lock:
+			self.gauges[name] = self.gauges.get(name, 0) + delta
+
+	def observe(self, name, value):
+		"""
+		Add a measurement (e.g. a latency in seconds) to the histogram 'name'.
+		"""
+		if self.enabled:
+			with self.lock:
+				if name not in self.histograms:
+					self.histograms[name] = Histogram()
+				self.histograms[name].observe(value)
+
+	def timed(self, name):
+		"""
+		Decorator recording the latency and call count of the decorated function
+		in the histogram 'name'. Coroutine functions are supported.
+		"""
+		def decorator(fn):
+			if asyncio.iscoroutinefunction(fn):
+				@wraps(fn)
+				async def async_wrapper(*args, **kwargs):
+					if not self.enabled:
+						return await fn(*args, **kwargs)
+					start = time.perf_counter()
+					try:
+						return await fn(*args, **kwargs)
+					finally:
+						self.observe(name, time.perf_counter() - start)
+				return async_wrapper
+
+			@wraps(fn)
+			def wrapper(*args, **kwargs):
+				if not self.enabled:
+					return fn(*args, **kwargs)
+				start = time.perf_counter()
+				try:
+					return fn(*args, **kwargs)
+				finally:
+					self.observe(name, time.perf_counter() - start)
+			return wrapper
+		return decorator
+
+	def reset(self):
+		"""
+		Delete all counters and histograms. Gauges are kept.
+		"""
+		with self.lock:
+			self.counters = dict()
+			self.histograms = dict()
+
+	def to_dict(self):
+		"""
+		Constructs a JSON-friendly dictionary representation of this instance.
+		"""
+		with self.lock:
+			return {
+				"enabled": self.enabled,
+				"counters": dict(self.counters),
+				"gauges": dict(self.gauges),
+				"histograms": {name: h.to_dict() for name, h in self.histograms.items()}
+				}
+
+	def to_prometheus(self):
+		"""
+		Render all values in the Prometheus text exposition format.
+		@return str
+		"""
+		lines = list()
+		with self.lock:
+			for name, value in sorted(self.counters.items()):
+				lines.append("{} {}".format(self._prom_name(name, "total"), value))
+			for name, value in sorted(self.gauges.items()):
+				lines.append("{} {}".format(self._prom_name(name), value))
+			for name, h in sorted(self.histograms.items()):
+				base = self._prom_name(name, "seconds")
+				cumulative = 0
+				for bound, n in zip(h.buckets, h.counts):
+					cumulative += n
+					lines.append('{}_bucket{{le="{}"}} {}'.format(base, bound, cumulative))
+				lines.append('{}_bucket{{le="+Inf"}} {}'.format(base, h.count))
+				lines.append("{}_sum {}".format(base, h.sum))
+				lines.append("{}_count {}".format(base, h.count))
+		return "\n".join(lines) + "\n"
+
+	def _prom_name(self, name, suffix=None):
+		name = "golmi_" + name.replace(".", "_").replace("-", "_")
+		return name + "_" + suffix if suffix else name
+
+# shared instance used by the model and the app
+metrics = Metrics()
@@ -1,20 +1,59 @@
 from model.state import State
 from model.gripper import Gripper
 from model.obj import Obj
-from math import floor, ceil 
-import time, threading
+from model.config import ConfigOverlay
+from model.type_registry import type_registry
+from model.legal_actions import compute_legal_actions
+from model.metrics import metrics
+from model.profiler import profiler
+from model.session_store import journaled
+from math import floor
+from collections import OrderedDict
+import json, time, threading
+
+# actions that can be combined with Model.apply_batch, mapped to their obligatory parameters
+BATCH_ACTIONS = {"move": ("dx", "dy"), "rotate": ("direction",), "flip": (), "grip": ()}
+# largest max_steps accepted by get_legal_actions from clients
+MAX_LEGAL_STEPS = 16
+# number of legal action masks kept per model, the least recently used one is dropped first
+LEGAL_CACHE_SIZE = 32
+# largest width and height of a viewport in blocks, see Model.set_viewport
+MAX_VIEWPORT_SIZE = 200
 
 class Model:
-	def __init__(self, config, socket, room):
+	def __init__(self, config, socket, room, observers=None):
 		self.socket = socket # to communicate with subscribed views
 		self.room = room
+		self.observers = observers # optional ObserverHub for read-only subscribers of the room
+		self.journal = None # optional SessionJournal recording the applied actions, see SessionStore.restore
 		self.state = State()
 		self.config = config
 
+		# output stage: components ("grippers", "objs") with changes not yet sent to the views
+		self.dirty = set()
+		self.flush_scheduled = False
+		self.last_flush = 0
+		self.output_lock = threading.Lock()
+		# while a batch is applied, changed components are collected here instead
+		self.batch_dirty = None
+
+		# legal action masks, valid as long as the state is not changed
+		self.legal_cache = OrderedDict()
+		self.legal_cache_version = None
+
 		# handles for loops will be saved in here to start / stop periodic actions
 		# the nested dicts map gripper ids to the loop handles
 		self.stop_events = {"move": dict(), "grip": dict(), "flip": dict(), "rotate": dict()}
 
+		# area (x0, y0, x1, y1) of the board the client displays, None for the whole board.
+		# Updates only contain the grippers and objects in this area, see set_viewport
+		self.viewport = None
+		# optional PayloadCompressor for large updates, if the client supports it (see model/compression.py).
+		# Observers receive the updates uncompressed
+		self.compressor = None
+		# optional SessionBudget limiting the rate of the client's actions, see model/qos.py
+		self.budget = None
+
 	# --- getter --- #
 
 	def get_obj_dict(self):
@@ -47,6 +86,41 @@ class Model:
 		"""
 		return self.state.get_gripper_coords(id)
 
+	def get_legal_actions(self, gr_id, max_steps=1, step_size=None):
+		"""
+		Determine which actions a gripper could currently execute successfully.
+		Results are cached until the state changes.
+		@param gr_id 	gripper id
+		@param max_steps 	Optional: check moves of 1 to max_steps steps in each direction. Default: 1
+		@param step_size 	Optional: size of step unit in blocks. Default: use move_step of config
+		@return None if the gripper does not exist, otherwise a dict with keys
+			'move': per direction left, up, right, down a list of max_steps Booleans, 
+			'rotate': Booleans for leftwards and rightwards rotation,
+			'flip' and 'grip': Booleans
+		"""
+		if gr_id not in self.state.grippers:
+			return None
+		if not step_size: step_size = self.config.move_step
+		version = (self.state, self.state.version)
+		if self.legal_cache_version != version:
+			self.legal_cache = OrderedDict()
+			self.legal_cache_version = version
+		key = (gr_id, max_steps, step_size)
+		if key in self.legal_cache:
+			self.legal_cache.move_to_end(key)
+		else:
+			if len(self.legal_cache) >= LEGAL_CACHE_SIZE:
+				self.legal_cache.popitem(last=False)
+			self.legal_cache[key] = compute_legal_actions(self, gr_id, max_steps, step_size)
+		return self.legal_cache[key]
+
+	def get_state_dict(self):
+		"""
+		@return the state as sent to the views: only the viewport's content if one is set.
+			Includes the static objects, so use it for the initial state of a view.
+		"""
+		return self.state.to_dict(self.viewport)
+
 	def get_config(self):
 		return self.config.to_dict()
 
@@ -61,16 +135,117 @@ class Model:
 
 	# --- Communicating with views --- # 
 
+	@metrics.timed("model.notify_views")
 	def _notify_views(self, event_name, data):
 		"""
 		Notify all listening views of model events (usually data updates)
 		@param event_name 	str: event type, e.g. "update_grippers"
 		@param data 	serializable data to send to listeners
 		"""
+		# serialized at most once, for the metrics, compression and observers
+		payload = None
+		if metrics.enabled:
+			payload = json.dumps(data, separators=(",", ":"))
+			metrics.inc("emit_count." + event_name)
+			metrics.inc("emit_bytes." + event_name, len(payload))
+		observed = self.observers and self.observers.has_observers(self.room)
+		if payload is None and (observed or self.compressor and event_name in self.compressor.events):
+			payload = json.dumps(data, separators=(",", ":"))
+		self._emit(event_name, self.encode(event_name, data, payload))
+		if observed:
+			self.observers.publish(self.room, event_name, data, payload)
+
+	def admit(self, cost=1, source="action"):
+		"""
+		@param cost 	number of actions
+		@param source 	"action" for actions sent by the client, "loop" for ticks of looped actions
+		@return True if the session's budget allows executing the actions now. Otherwise,
+			the client is sent the event 'throttled' with the keys 'cost' and 'retry_after'
+			(seconds until the actions could be admitted), except for skipped loop ticks
+		"""
+		if self.budget is None or self.budget.admit(cost, source):
+			return True
+		if source == "action":
+			self.send("throttled", {"cost": cost, "retry_after": self.budget.retry_after})
+		return False
+
+	def encode(self, event_name, data, payload=None):
+		"""
+		@param payload 	optional compact JSON of data, see PayloadCompressor.encode
+		@return the payload as sent to the client: compressed if it is large and
+			the client accepts compressed payloads
+		"""
+		return self.compressor.encode(event_name, data, payload) if self.compressor else data
+
+	def _mark_dirty(self, *components):
+		"""
+		Register changes to send to the views. They are sent right away unless the last
+		update left less than config.frame_interval seconds ago. In that case, all changes
+		until the interval has passed are collected and sent as a single update.
+		@param components 	"grippers" and/or "objs"
+		"""
+		if self.batch_dirty is not None:
+			# sent once the batch is complete
+			self.batch_dirty.update(components)
+			return
+		metrics.inc("frames.requested")
+		with self.output_lock:
+			self.dirty.update(components)
+			if self.flush_scheduled:
+				metrics.inc("frames.coalesced")
+				return
+			wait = self.last_flush + self.config.frame_interval - time.time()
+			self.flush_scheduled = wait > 0
+		if wait > 0:
+			metrics.inc("frames.deferred")
+			self._schedule_flush(wait)
+		else:
+			self._flush()
+
+	def _schedule_flush(self, delay):
+		self.socket.start_background_task(self._flush_later, delay)
+
+	def _flush_later(self, delay):
+		self.socket.sleep(delay)
+		self._flush()
+
+	def _flush(self):
+		"""
+		Send all collected changes. If both objects and grippers changed, one
+		update_state event is sent instead of two separate updates.
+		"""
+		with self.output_lock:
+			dirty = self.dirty
+			self.dirty = set()
+			self.flush_scheduled = False
+			self.last_flush = time.time()
+		if "grippers" in dirty and "objs" in dirty:
+			# static objects were sent with the initial state
+			self._notify_views("update_state", self.state.to_dict(self.viewport, include_static=False))
+		elif "grippers" in dirty:
+			self._notify_views("update_grippers", self.state.get_gripper_dict(self.viewport))
+		elif "objs" in dirty:
+			self._notify_views("update_objs", self.state.get_obj_dict(self.viewport))
+		if dirty:
+			metrics.inc("frames.sent")
+
+	def send(self, event_name, data):
+		"""
+		Send an event to the model's client only: not compressed, not counted in the
+		metrics and not passed on to observers, e.g. a reply to a request.
+		"""
+		self._emit(event_name, data)
+
+	def _emit(self, event_name, data):
+		"""
+		Send an event to the model's room. Subclasses for other server types override this.
+		"""
 		self.socket.emit(event_name, data, room=self.room)
 
 	# --- Set up and configuration --- #
 
+	@journaled(snapshot=True)
+	@profiler.attributed
 	def set_state(self, state):
 		"""
 		Initialize the model's (game) state.
@@ -82,28 +257,60 @@ class Model:
 		# state is a State instance
 		else:
 			self.state = state
-		self._notify_views("update_state", self.state.to_dict())
+		self._notify_views("update_state", self.get_state_dict())
 
+	@journaled(snapshot=True)
+	@profiler.attributed
 	def set_config(self, config):
 		"""
 		Change the model's configuration. Overwrites any attributes
 		passed in config and leaves the rest as before. New keys simply added.
+		Views are only sent the settings that changed.
 		@param config	Config object or dict or JSON string
 		"""
 		# config is a JSON string or parsed JSON dictionary
+		# limits or step sizes might change
+		self.legal_cache = OrderedDict()
 		if type(config) == str or type(config) == dict:
+			old_config = self.config.to_dict()
 			self._config_from_JSON(config)
+			changes = {key: value for key, value in self.config.to_dict().items() 
+				if key not in old_config or old_config[key] != value}
+			if changes:
+				self._notify_views("update_config", changes)
 		# config is a Config instance
 		else:
 			self.config = config
-		self._notify_views("update_config", self.config.to_dict())
+			self._notify_views("update_config", self.config.to_dict())
 
+	@journaled(snapshot=True)
 	def reset(self):
 		"""
 		Reset the current state.
 		"""
 		self.state = State()
-		self._notify_views("update_state", self.state.to_dict())
+		self._notify_views("update_state", self.get_state_dict())
+
+	def set_viewport(self, viewport):
+		"""
+		Restrict the updates sent to the views to an area of the board, e.g. the part a
+		client displays on a large board. Grippers and objects entering the area are
+		included in the next update, those that left it are missing. The views are sent
+		the content of the new area right away.
+		@param viewport 	dict with the keys 'x', 'y' (top left corner), 'width' and 'height'
+			in blocks (finite numbers), or None to send the whole board. The area is clipped
+			to the board and to MAX_VIEWPORT_SIZE blocks per side
+		"""
+		if viewport is None:
+			self.viewport = None
+		else:
+			x, y = float(viewport["x"]), float(viewport["y"])
+			x0 = min(max(x, 0), self.get_width())
+			y0 = min(max(y, 0), self.get_height())
+			x1 = min(max(x + float(viewport["width"]), x0), self.get_width(), x0 + MAX_VIEWPORT_SIZE)
+			y1 = min(max(y + float(viewport["height"]), y0), self.get_height(), y0 + MAX_VIEWPORT_SIZE)
+			self.viewport = (x0, y0, x1, y1)
+		self._notify_views("update_state", self.get_state_dict())
 
 	# TODO: make sure pieces are on the board! (at least emit warning)
 	def _state_from_JSON(self, json_data):
@@ -121,37 +328,63 @@ class Model:
 						float(json_data["grippers"][gr]["x"]),
 						float(json_data["grippers"][gr]["y"]))
 					# process optional info
-					if "gripped" in json_data["grippers"][gr]:
+					gripped = json_data["grippers"][gr].get("gripped")
+					if gripped is not None:
+						# State.to_dict maps the gripped object's id to its details
+						if type(gripped) == dict:
+							gripped = next(iter(gripped))
 						# cast object name to str, too
-						self.state.grippers[gr].gripped = str(json_data["grippers"][gr]["gripped"])
+						self.state.grippers[gr].gripped = str(gripped)
 					if "width" in json_data["grippers"][gr]:
 						self.state.grippers[gr].width = json_data["grippers"][gr]["width"]
-					elif "height" in json_data["grippers"][gr]:
+					if "height" in json_data["grippers"][gr]:
 						self.state.grippers[gr].height = json_data["grippers"][gr]["height"]
-					elif "color" in json_data["grippers"][gr]:
+					if "color" in json_data["grippers"][gr]:
 						self.state.grippers[gr].color = json_data["grippers"][gr]["color"]
 			
-			# construct objects
-			if "objs" in json_data and type(json_data["objs"]) == dict:
-				for obj_name in json_data["objs"]:
+			# construct objects. Objects marked with "static": true, and those under the
+			# key "static" (as produced by State.to_dict), can't be gripped
+			static = dict()
+			# precomputed block matrices of all orientations
+			type_table = self.config.get_type_table()
+			for key in ("objs", "static"):
+				if key not in json_data or type(json_data[key]) != dict:
+					continue
+				for obj_name in json_data[key]:
+					obj_data = json_data[key][obj_name]
 					obj = str(obj_name) # use string identifiers only for consistency
-					self.state.objs[obj] = Obj(
-						json_data["objs"][obj]["type"],
-						float(json_data["objs"][obj]["x"]),
-						float(json_data["objs"][obj]["y"]),
-						float(json_data["objs"][obj]["width"]),
-						float(json_data["objs"][obj]["height"]),
-						self.get_type_config()[json_data["objs"][obj]["type"]] # block matrix for given type
+					obj_type = obj_data["type"]
+					# unrotated objects keep the default rotation 0
+					rotation = float(obj_data.get("rotation", 0)) % 360 or 0
+					mirrored = bool(obj_data.get("mirrored", False))
+					if "block_matrix" in obj_data:
+						# the current shape is given (e.g. by State.to_dict)
+						block_matrix = obj_data["block_matrix"]
+					else:
+						# type rotated first, then mirrored
+						block_matrix = type_table.get_orientation(obj_type, rotation, mirrored)
+					new_obj = Obj(
+						obj_type,
+						float(obj_data["x"]),
+						float(obj_data["y"]),
+						float(obj_data["width"]),
+						float(obj_data["height"]),
+						block_matrix,
+						rotation=rotation,
+						mirrored=mirrored
 					)
 					# process optional info
-					if "rotation" in json_data["objs"][obj]:
-						# rotate the object
-						self.state.rotate_obj(obj, float(json_data["objs"][obj]["rotation"]))
-					if "mirrored" in json_data["objs"][obj] and json_data["objs"][obj]["mirrored"]:
-						# flip the object if "mirrored" is true in the JSON
-						self.state.flip_obj(obj)
-					if "color" in json_data["objs"][obj]:
-						self.state.objs[obj].color = json_data["objs"][obj]["color"]
+					if "color" in obj_data:
+						new_obj.color = obj_data["color"]
+					if key == "static" or obj_data.get("static"):
+						static[obj] = new_obj
+					else:
+						self.state.objs[obj] = new_obj
+			self.state.set_static(static)
+			# mark gripped objects
+			for gripper in self.state.grippers.values():
+				if gripper.gripped in self.state.objs:
+					self.state.objs[gripper.gripped].gripped = True
 		except: 
 			raise SyntaxError("Error during state initialization: JSON data does not have the right format.\n" + \
 				"Please refer to the documentation.")
@@ -161,13 +394,130 @@ class Model:
 			# a JSON string
 			json_data = json.loads(json_data)
 		# otherwise assume json_data is a dict 
+		# the configuration might be shared with other sessions: 
+		# store this session's settings in an overlay
+		if not isinstance(self.config, ConfigOverlay):
+			self.config = self.config.derive()
 		# overwrite any setting given in the data, leave the rest as before.
 		# new keys are also allowed
 		for attr_key, attr_value in json_data.items():
-			setattr(self.config, attr_key, attr_value)
+			# a registered type configuration can be selected by its hash
+			if attr_key == "type_hash":
+				table = type_registry.get(attr_value)
+				if table:
+					self.config.type_config = table.types
+				else:
+					print("Error at _config_from_JSON(): unknown type_hash " + str(attr_value))
+			elif attr_key == "type_config":
+				# share the registered table with all sessions using the same types
+				self.config.type_config = type_registry.register(attr_value).types
+			else:
+				setattr(self.config, attr_key, attr_value)
 
 	# --- Gripper manipulation --- #
 
+	def apply_sequenced(self, gr_id, seq, fn, *args):
+		"""
+		Apply an action a client numbered to predict its outcome. The gripper's last_seq
+		is set first, so the update caused by the action acknowledges it. An action without
+		effect causes a gripper update as well: the client learns that its prediction failed.
+		Actions exceeding the session's budget (see admit) are not executed and treated as
+		actions without effect.
+		@param gr_id 	id of the gripper the action is for
+		@param seq 	client sequence number (int) or None for unnumbered actions
+		@param fn 	Model method to call, e.g. self.move
+		@param args 	arguments for fn
+		"""
+		gripper = self.get_gripper_by_id(gr_id)
+		numbered = gripper is not None and type(seq) == int
+		if numbered:
+			gripper.last_seq = seq
+		if not self.admit():
+			if numbered:
+				self._mark_dirty("grippers")
+			return None
+		if not numbered:
+			return fn(*args)
+		state, version = self.state, self.state.version
+		result = fn(*args)
+		if self.state is state and self.state.version == version:
+			self._mark_dirty("grippers")
+		return result
+
+	@journaled()
+	@profiler.attributed
+	@metrics.timed("model.apply_batch")
+	def apply_batch(self, actions, atomic=True):
+		"""
+		Apply a list of gripper actions in the given order. Each action is checked against
+		the state left by the previous ones. Views are notified once, after the last action.
+		@param actions 	list of dicts with the keys 'action' (one of 'move', 'rotate', 'flip', 'grip'),
+			'id' (gripper id) and the parameters of the single action: 'dx', 'dy' and optionally
+			'step_size' for move, 'direction' and optionally 'step_size' for rotate.
+			Example: [{'action': 'move', 'id': '0', 'dx': 1, 'dy': 0}, {'action': 'grip', 'id': '0'}]
+		@param atomic 	True: all or nothing. The batch stops at the first action that fails
+			(invalid or without effect, e.g. a move blocked by another object) and its changes are discarded.
+			False: best effort. Failing actions are skipped, the others are applied.
+		@return dict with the keys 'committed' (False if the changes were discarded) and 'results',
+			a list with a Boolean per action signifying success, None for actions not attempted
+		"""
+		state = self.state
+		if atomic:
+			# record the changes to undo them unless all actions succeed
+			state.begin_undo()
+		# the batch is journaled as a whole
+		journal, self.journal = self.journal, None
+		self.batch_dirty = set()
+		results = [None] * len(actions)
+		try:
+			for i, action in enumerate(actions):
+				results[i] = self._apply_action(action)
+				if atomic and not results[i]:
+					break
+		except:
+			if atomic:
+				state.rollback()
+			raise
+		finally:
+			self.journal = journal
+			dirty, self.batch_dirty = self.batch_dirty, None
+		committed = not atomic or all(results)
+		if atomic and committed:
+			state.end_undo()
+		elif atomic:
+			state.rollback()
+		if committed and dirty:
+			self._mark_dirty(*dirty)
+		return {"committed": committed, "results": results}
+
+	def _apply_action(self, action):
+		"""
+		Apply a single action of a batch.
+		@return True if the action is valid and changed the state
+		"""
+		if type(action) != dict or action.get("action") not in BATCH_ACTIONS or "id" not in action or \
+			any(param not in action for param in BATCH_ACTIONS[action["action"]]):
+			return False
+		gr_id = str(action["id"])
+		if gr_id not in self.state.grippers:
+			return False
+		version = self.state.version
+		try:
+			if action["action"] == "move":
+				self.move(gr_id, action["dx"], action["dy"], action.get("step_size"))
+			elif action["action"] == "rotate":
+				self.rotate(gr_id, action["direction"], action.get("step_size"))
+			elif action["action"] == "flip":
+				self.flip(gr_id)
+			else:
+				self.grip(gr_id)
+		except (TypeError, ValueError):
+			# parameters of the wrong type
+			return False
+		return self.state.version != version
+
+	@journaled()
+	@profiler.attributed
 	def add_gr(self, gr_id):
 		"""
 		Add a new gripper to the internal state. The start position is the center. Notifies listeners.
@@ -177,17 +527,19 @@ class Model:
 		start_y = self.get_height()/2
 		# if a new gripper was created, notify listeners
 		if gr_id not in self.state.grippers:
-			self.state.grippers[gr_id] = Gripper(start_x, start_y)
-			self._notify_views("update_grippers", self.get_gripper_dict())
+			self.state.add_gr(gr_id, Gripper(start_x, start_y))
+			self._mark_dirty("grippers")
 
+	@journaled()
+	@profiler.attributed
 	def remove_gr(self, gr_id):
 		"""
 		Delete a gripper from the internal state and notify listeners.
 		@param gr_id 	identifier of the gripper to remove
 		"""
 		if gr_id in self.state.grippers:
-			self.state.grippers.pop(gr_id)
-			self._notify_views("update_grippers", self.get_gripper_dict())
+			self.state.remove_gr(gr_id)
+			self._mark_dirty("grippers")
 
 	def start_gripping(self, id):
 		"""
@@ -205,6 +557,9 @@ class Model:
 		"""
 		self.stop_loop("grip", id)
 
+	@journaled()
+	@profiler.attributed
+	@metrics.timed("model.grip")
 	def grip(self, id):
 		"""
 		Attempt a grip / ungrip.
@@ -216,8 +571,7 @@ class Model:
 			# state takes care of detaching object and gripper
 			self.state.ungrip(id)
 			# notify view of object and gripper change
-			self._notify_views("update_objs", self.get_obj_dict())
-			self._notify_views("update_grippers", self.get_gripper_dict())
+			self._mark_dirty("objs", "grippers")
 		else: 
 			# Check if gripper hovers over some object
 			new_gripped = self._get_grippable(id)
@@ -225,8 +579,7 @@ class Model:
 			if new_gripped: 
 				self.state.grip(id, new_gripped)
 				# notify view of object and gripper change
-				self._notify_views("update_objs", self.get_obj_dict())
-				self._notify_views("update_grippers", self.get_gripper_dict())
+				self._mark_dirty("objs", "grippers")
 
 	def start_moving(self, id, x_steps, y_steps, step_size=None):
 		"""
@@ -247,6 +600,9 @@ class Model:
 		"""
 		self.stop_loop("move", id)
 
+	@journaled()
+	@profiler.attributed
+	@metrics.timed("model.move")
 	def move(self, id, x_steps, y_steps, step_size=None):
 		"""
 		If allowed, move the gripper x_steps steps in x direction and y_steps steps in y direction.
@@ -275,13 +631,13 @@ class Model:
 				self.state.move_gr(id, dx, dy)
 				self.state.move_obj(self.get_gripped_obj(id), dx, dy)
 				# notify the views. A gripped object is implicitly redrawn. 
-				self._notify_views("update_grippers", self.get_gripper_dict())
+				self._mark_dirty("grippers")
 
 		# if no object is gripped, only move the gripper
 		elif self._is_in_limits(gripper_x + dx, gripper_y + dy):
 			self.state.move_gr(id, dx, dy)
 			# notify the views. A gripped object is implicitly redrawn. 
-			self._notify_views("update_grippers", self.get_gripper_dict())
+			self._mark_dirty("grippers")
 
 	def start_rotating(self, id, direction, step_size=None):
 		"""
@@ -301,6 +657,9 @@ class Model:
 		"""
 		self.stop_loop("rotate", id)
 
+	@journaled()
+	@profiler.attributed
+	@metrics.timed("model.rotate")
 	def rotate(self, id, direction, step_size=None):
 		"""
 		If the gripper 'id' currently grips some object, rotate this object one step.
@@ -321,7 +680,7 @@ class Model:
 			if not (self.config.prevent_overlap and self._has_overlap(gr_obj_id, gr_obj.x, gr_obj.y, rotated_matrix)):
 				self.state.rotate_obj(gr_obj_id, d_angle, rotated_matrix)
 				# notify the views. The gripped object is implicitly redrawn. 
-				self._notify_views("update_grippers", self.get_gripper_dict())
+				self._mark_dirty("grippers")
 
 	def start_flipping(self, id):
 		"""
@@ -339,6 +698,9 @@ class Model:
 		"""
 		self.stop_loop("flip", id)
 
+	@journaled()
+	@profiler.attributed
+	@metrics.timed("model.flip")
 	def flip(self, id):
 		"""
 		Mirror the object currently gripped by some gripper.
@@ -353,8 +715,9 @@ class Model:
 			if not (self.config.prevent_overlap and self._has_overlap(gr_obj_id, gr_obj.x, gr_obj.y, flipped_matrix)):
 				self.state.flip_obj(gr_obj_id, flipped_matrix)
 				# notify the views. The gripped object is implicitly redrawn. 
-				self._notify_views("update_grippers", self.get_gripper_dict())
+				self._mark_dirty("grippers")
 		
+	@metrics.timed("model.get_grippable")
 	def _get_grippable(self, gr_id):
 		"""
 		Find an object that is in the range of the gripper.
@@ -363,7 +726,8 @@ class Model:
 		"""
 		# Gripper position. It is just a point.
 		x, y = self.get_gripper_coords(gr_id)
-		for obj_id in self.get_object_ids(): 
+		# only objects in the chunk under the gripper can be hit
+		for obj_id in self.state.get_index().query(x, y, x, y):
 			obj = self.get_obj_by_id(obj_id)
 			# (gridX, gridY) is the position on the type grid the gripper would be on
 			grid_x = floor(x-obj.x)
@@ -404,6 +768,7 @@ class Model:
 		return (y >= 0 and y <= self.get_height())
 
 	# this function is extremely unelegant. feel free to change for a better implementation!
+	@metrics.timed("model.has_overlap")
 	def _has_overlap(self, obj_id, x, y, block_matrix):
 		"""
 		Check whether an object would have an overlap with another object if it were placed at (x,y).
@@ -418,8 +783,12 @@ class Model:
 			print("Error at _has_overlap(): empty block_matrix passed!")
 			return False
 		this_width = len(block_matrix[0])
+		# static objects are compiled into a mask: constant time per block
+		if self.state.blocked_by_static(x, y, block_matrix):
+			return True
 		# iterate through the objects:
-		for other_id in self.get_object_ids():
+		# objects in the chunks the area touches, instead of all objects
+		for other_id in self.state.get_index().query(x, y, x + this_width, y + this_height):
 			if other_id != obj_id:
 				
 				other_obj = self.get_obj_by_id(other_id)
@@ -429,38 +798,41 @@ class Model:
 				# check whether block matrices overlap, otherwise we can skip all the for-loops
 				if x_offset < other_obj.width and x_offset > (-this_width) and \
 					y_offset < other_obj.height and y_offset > (-this_height):
+					other_matrix = other_obj.block_matrix
+					other_height = len(other_matrix)
+					other_width = len(other_matrix[0])
 					# check whether blocks overlap
 					for row in range(this_height):
 						other_row = row + y_offset # the row we need to check for blocks in other_obj (is a float!)
-						if other_row >= 0 and other_row < other_obj.height:
-							for col in range(this_width):
-								# check whether this object has a block here
-								if not block_matrix[row][col]: 
-									continue
-								other_col = col + x_offset # the column we need to check for blocks in other_obj (is a float!)
-								
-								# check whether other object overlaps here and has a block:
-								# this requires a lot of conditions since blocks may not be positioned on grid borders
-								# if x and y offsets are not whole numbers, we have to check a total of 4 blocks of other_obj
-								if ceil(other_col) >= 0 and other_col < other_obj.width:
-									if other_obj.block_matrix[floor(other_row)][floor(other_col)]:
-										return True
-									elif ceil(other_row) < other_obj.height and \
-										other_obj.block_matrix[ceil(other_row)][floor(other_col)]:
-										return True
-									elif ceil(other_col) < other_obj.width and \
-										other_obj.block_matrix[floor(other_row)][ceil(other_col)]:
-										return True 
-									elif ceil(other_row) < other_obj.height and ceil(other_col) < other_obj.width and \
-										other_obj.block_matrix[ceil(other_row)][ceil(other_col)]:
-										return True
+						# if the offset is not a whole number, blocks span two rows of other_obj
+						low_row = floor(other_row)
+						high_row = low_row if low_row == other_row else low_row + 1
+						if high_row < 0 or low_row >= other_height:
+							continue
+						# rows of other_obj to compare with, None if outside of the matrix
+						other_rows = (other_matrix[low_row] if low_row >= 0 else None, 
+							other_matrix[high_row] if high_row < other_height and high_row != low_row else None)
+						for col in range(this_width):
+							# check whether this object has a block here
+							if not block_matrix[row][col]: 
+								continue
+							other_col = col + x_offset # the column we need to check for blocks in other_obj (is a float!)
+							low_col = floor(other_col)
+							high_col = low_col if low_col == other_col else low_col + 1
+							if high_col < 0 or low_col >= other_width:
+								continue
+							# check whether other object has a block in any of the (up to 4) covered cells
+							for other_blocks in other_rows:
+								if other_blocks and ((low_col >= 0 and other_blocks[low_col]) or \
+									(high_col < other_width and other_blocks[high_col])):
+									return True
 		return False
 
 	# --- Loop functionality ---
 
 	def start_loop(self, action_type, gripper, fn, *args, **kwargs):
 		# 
-		self.stop_events[action_type][gripper] = threading.Event()
+		self.stop_events[action_type][gripper] = self._new_stop_event()
 		self.socket.start_background_task(
 			self._setInterval, self.config.action_interval, self.stop_events[action_type][gripper],
 			fn, *args, **kwargs)
@@ -471,16 +843,36 @@ class Model:
 			
 			self.stop_events[action_type][gripper].set()
 
+	def stop_all_loops(self):
+		"""
+		Stop any looped action of any gripper, e.g. when the client disconnects.
+		"""
+		for action_type in self.stop_events:
+			for gripper in list(self.stop_events[action_type]):
+				self.stop_loop(action_type, gripper)
+
+	def _new_stop_event(self):
+		"""
+		@return event object signalling a loop to stop, must provide set() and is_set()
+		"""
+		return threading.Event()
+
 	def _setInterval(self, interval, stop_event, fn, *args, **kwargs):
-		# immediately execute once
-		fn(*args, **kwargs)
-		next_time = time.time() + interval
-		# wait for interval to pass or stop event
-		#TODO: This is currently blocking. Need to find gevent-friendly threading option.
-		# monkey-patching?
-		while not stop_event.wait(next_time - time.time()) :
-		    next_time += interval
-		    fn(*args, **kwargs)
+		metrics.add_gauge("live_loops", 1)
+		try:
+			# immediately execute once. Ticks exceeding the session's budget are skipped
+			if self.admit(source="loop"):
+				fn(*args, **kwargs)
+			next_time = time.time() + interval
+			# wait for interval to pass or stop event
+			#TODO: This is currently blocking. Need to find gevent-friendly threading option.
+			# monkey-patching?
+			while not stop_event.wait(next_time - time.time()) :
+			    next_time += interval
+			    if self.admit(source="loop"):
+			        fn(*args, **kwargs)
+		finally:
+			metrics.add_gauge("live_loops", -1)
 
 if __name__ == "__main__":
 	# Unit tests
@@ -0,0 +1,147 @@
+import json, threading, time
+from model.metrics import metrics
+
+class Observer:
+	def __init__(self, sid):
+		"""
+		Delivery state of a single read-only subscriber.
+		@param sid 	session id of the observing client
+		"""
+		self.sid = sid
+		self.pending = dict()	# event names mapped to the latest encoded payload not yet sent
+		self.awaiting_ack = False
+		self.sent_at = 0
+		self.subscribed = True
+
+class ObserverHub:
+	def __init__(self, socket, drop_after=10.0):
+		"""
+		Fans out the updates of a room to read-only observers. Each update is
+		serialized once and the resulting JSON string is sent to all observers
+		of the room. An observer only gets the next update once it acknowledged
+		the last one; until then, newer updates replace older pending updates of
+		the same event (downsampling), except for update_config, whose changes are
+		merged into the pending one. This way, a slow observer never delays the
+		participant's session. Observers that do not acknowledge for drop_after
+		seconds are unsubscribed.
+		@param socket 	server to send events with, needs emit(event, data, to=sid, callback=fn)
+		@param drop_after 	seconds without acknowledgement before an observer is dropped
+		"""
+		self.socket = socket
+		self.drop_after = drop_after
+		self.rooms = dict()	# rooms mapped to dicts of observer sids to Observer instances
+		self.lock = threading.Lock()
+
+	def subscribe(self, room, sid, initial=None):
+		"""
+		@param room 	room (session id of the observed participant) to receive updates of
+		@param sid 	session id of the observer
+		@param initial 	optional list of (event name, data) pairs to send first, e.g. the current state
+		"""
+		observer = Observer(sid)
+		with self.lock:
+			self.rooms.setdefault(room, dict())[sid] = observer
+		metrics.add_gauge("observers", 1)
+		for event_name, data in initial or list():
+			self._offer(observer, event_name, self._encode(data))
+
+	def unsubscribe(self, sid, room=None):
+		"""
+		Remove an observer from a single room or from all rooms.
+		"""
+		with self.lock:
+			for observed_room in [room] if room is not None else list(self.rooms):
+				if sid in self.rooms.get(observed_room, dict()):
+					self.rooms[observed_room].pop(sid).subscribed = False
+					metrics.add_gauge("observers", -1)
+					if not self.rooms[observed_room]:
+						self.rooms.pop(observed_room)
+
+	def close(self, room):
+		"""
+		Unsubscribe all observers of a room, e.g. because the observed session ended.
+		"""
+		for sid in list(self.rooms.get(room, dict())):
+			self.unsubscribe(sid, room)
+			self._emit("observe_dropped", room, sid)
+
+	def has_observers(self, room):
+		return room in self.rooms
+
+	def publish(self, room, event_name, data, payload=None):
+		"""
+		Send an update to all observers of a room.
+		@param payload 	optional compact JSON of data, if the caller serialized it already
+		"""
+		observers = self.rooms.get(room)
+		if not observers:
+			return
+		if payload is None:
+			payload = self._encode(data)
+		for observer in list(observers.values()):
+			self._offer(observer, event_name, payload, room)
+
+	def _encode(self, data):
+		return json.dumps(data, separators=(",", ":"))
+
+	def _offer(self, observer, event_name, payload, room=None):
+		with self.lock:
+			if event_name == "update_config" and event_name in observer.pending:
+				# config updates only hold the changed settings, so pending ones are merged
+				merged = json.loads(observer.pending.pop(event_name))
+				merged.update(json.loads(payload))
+				payload = self._encode(merged)
+			elif event_name in observer.pending:
+				metrics.inc("observers.downsampled")
+				observer.pending.pop(event_name)
+			# a new state replaces any pending partial update
+			if event_name == "update_state":
+				for partial in ("update_grippers", "update_objs"):
+					if partial in observer.pending:
+						metrics.inc("observers.downsampled")
+						observer.pending.pop(partial)
+			observer.pending[event_name] = payload
+			if observer.awaiting_ack:
+				stalled = time.time() - observer.sent_at > self.drop_after
+				if not stalled:
+					return
+		if observer.awaiting_ack:
+			metrics.inc("observers.dropped")
+			self.unsubscribe(observer.sid, room)
+			self._emit("observe_dropped", room, observer.sid)
+		else:
+			self._send(observer)
+
+	def _send(self, observer):
+		with self.lock:
+			if observer.awaiting_ack or not observer.pending or not observer.subscribed:
+				return
+			events = list(observer.pending.items())
+			observer.pending = dict()
+			observer.awaiting_ack = True
+			observer.sent_at = time.time()
+		for i, (event_name, payload) in enumerate(events):
+			metrics.inc("observers.sent")
+			if i == len(events)-1:
+				# wait for the acknowledgement of the last event before sending more
+				self._emit(event_name, payload, observer.sid,
+					callback=lambda *args: self._acknowledged(observer))
+			else:
+				self._emit(event_name, payload, observer.sid)
+
+	def _emit(self, event_name, data, sid, callback=None):
+		self.socket.emit(event_name, data, to=sid, callback=callback)
+
+	def _acknowledged(self, observer):
+		with self.lock:
+			observer.awaiting_ack = False
+		self._send(observer)
+
+class AsyncObserverHub(ObserverHub):
+	"""
+	ObserverHub for an asyncio server (socketio.AsyncServer): events are scheduled
+	as tasks instead of being sent in place, like AsyncModel._emit.
+	"""
+
+	def _emit(self, event_name, data, sid, callback=None):
+		self.socket.start_background_task(self.socket.emit, event_name, data, to=sid, callback=callback)
@@ -0,0 +1,97 @@
+import os, sys, threading, time
+from collections import Counter
+from functools import wraps
+
+class SamplingProfiler:
+	def __init__(self, interval=0.005, max_depth=64):
+		"""
+		Statistical profiler attributing samples to sessions. Model code running for a
+		profiled session marks its thread while it executes (see attributed()); a
+		sampler thread periodically records the call stacks of marked threads.
+		For sessions that are not profiled, the only cost is a dictionary lookup.
+		@param interval 	seconds between two samples. default: 0.005
+		@param max_depth 	number of innermost frames kept per sample. default: 64
+		"""
+		self.interval = interval
+		self.max_depth = max_depth
+		self.sessions = dict()	# profiled session ids mapped to Counters of collapsed stacks
+		self.stopped = dict()	# results of sessions that are no longer profiled
+		self.active = dict()	# thread identifiers mapped to the session currently executing
+		self.lock = threading.Lock()
+		self._sampler = None
+
+	def start(self, session_id):
+		"""
+		Start collecting samples for a session. Earlier results are discarded.
+		@param session_id 	room / session id of the Model to profile
+		"""
+		with self.lock:
+			self.stopped.pop(session_id, None)
+			self.sessions[session_id] = Counter()
+			if self._sampler is None or not self._sampler.is_alive():
+				self._sampler = threading.Thread(target=self._sample, daemon=True)
+				self._sampler.start()
+
+	def stop(self, session_id):
+		"""
+		Stop collecting samples for a session. The samples are kept until the next start.
+		"""
+		with self.lock:
+			if session_id in self.sessions:
+				self.stopped[session_id] = self.sessions.pop(session_id)
+
+	def is_profiled(self, session_id):
+		return session_id in self.sessions
+
+	def attributed(self, fn):
+		"""
+		Decorator for Model methods: while the method runs, samples of the current
+		thread are attributed to the model's room (its session id).
+		"""
+		@wraps(fn)
+		def wrapper(model, *args, **kwargs):
+			if model.room not in self.sessions:
+				return fn(model, *args, **kwargs)
+			ident = threading.get_ident()
+			previous = self.active.get(ident)
+			self.active[ident] = model.room
+			try:
+				return fn(model, *args, **kwargs)
+			finally:
+				if previous is None:
+					self.active.pop(ident, None)
+				else:
+					self.active[ident] = previous
+		return wrapper
+
+	def collapsed(self, session_id):
+		"""
+		Export the samples of a session in the collapsed stack format
+		('outer;inner;innermost count' per line) read by flamegraph.pl or speedscope.
+		@return str, empty if the session was never profiled
+		"""
+		with self.lock:
+			samples = self.sessions.get(session_id, self.stopped.get(session_id, Counter()))
+			return "".join("{} {}\n".format(stack, count) for stack, count in samples.most_common())
+
+	def _sample(self):
+		while self.sessions:
+			frames = sys._current_frames()
+			with self.lock:
+				for ident, session_id in list(self.active.items()):
+					if ident in frames and session_id in self.sessions:
+						self.sessions[session_id][self._collapse(frames[ident])] += 1
+			del frames
+			time.sleep(self.interval)
+
+	def _collapse(self, frame):
+		stack = list()
+		while frame is not None and len(stack) < self.max_depth:
+			code = frame.f_code
+			stack.append("{}:{}".format(os.path.basename(code.co_filename), code.co_name))
+			frame = frame.f_back
+		stack.reverse()
+		return ";".join(stack)
+
+# shared instance used by the model and the app
+profiler = SamplingProfiler()
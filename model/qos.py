@@ -0,0 +1,168 @@
+import threading, time
+from model.metrics import metrics
+
+class SessionClass:
+	def __init__(self, name, priority, rate=None, burst=None, admin_only=False):
+		"""
+		Scheduling class of a session, e.g. human participants or automated agents.
+		@param name 	class name, clients pass it with the connection option 'session_class'
+		@param priority 	0 is the highest. The lower the priority, the larger the share of
+			the server capacity a session of this class can't use, see QoSScheduler
+		@param rate 	actions per second a session may execute on average, None for no limit
+		@param burst 	actions a session may execute at once after a pause. Default: rate
+		@param admin_only 	True if clients need the admin token to connect with this class
+		"""
+		self.name = name
+		self.priority = priority
+		self.rate = rate
+		self.burst = burst if burst is not None else rate
+		self.admin_only = admin_only
+
+# humans press keys at a few actions per second (held keys repeat every action_interval),
+# agents are throttled to leave the server to them. Benchmarks and tests use the
+# unthrottled class 'internal', which requires the admin token
+DEFAULT_CLASSES = {
+	"human": SessionClass("human", priority=0, rate=30, burst=30),
+	"bot": SessionClass("bot", priority=1, rate=20, burst=20),
+	"internal": SessionClass("internal", priority=0, admin_only=True)
+}
+
+class TokenBucket:
+	def __init__(self, rate, burst, clock=time.monotonic):
+		"""
+		Rate limiter: holds up to burst tokens, refilled at rate tokens per second.
+		Not thread-safe, QoSScheduler synchronizes the access.
+		@param rate 	tokens per second
+		@param burst 	capacity of the bucket, it starts full
+		@param clock 	function returning the current time in seconds
+		"""
+		self.rate = rate
+		self.burst = burst
+		self.clock = clock
+		self.tokens = burst
+		self.last = clock()
+
+	def _refill(self):
+		now = self.clock()
+		self.tokens = min(self.burst, self.tokens + (now - self.last) * self.rate)
+		self.last = now
+
+	def take(self, cost=1, reserve=0):
+		"""
+		Requests costing more than the bucket can hold above the reserve need a full bucket
+		and leave it in debt, so on average no more than rate tokens are taken per second.
+		@param cost 	number of tokens to take
+		@param reserve 	tokens that have to remain in the bucket
+		@return True if the tokens were taken, False if there are not enough
+		"""
+		self._refill()
+		if self.tokens < reserve + min(cost, self.burst - reserve):
+			return False
+		self.tokens -= cost
+		return True
+
+	def spend(self, cost=1):
+		"""
+		Take tokens even if there are not enough, never fails. The bucket may go into debt.
+		"""
+		self._refill()
+		self.tokens -= cost
+
+	def give_back(self, cost=1):
+		self.tokens = min(self.burst, self.tokens + cost)
+
+	def wait_time(self, cost=1, reserve=0):
+		"""
+		@return seconds until take(cost, reserve) can succeed, 0 if it can now
+		"""
+		self._refill()
+		return max(0, (reserve + min(cost, self.burst - reserve) - self.tokens) / self.rate)
+
+class SessionBudget:
+	def __init__(self, scheduler, session_class):
+		"""
+		Action budget of a single session, see QoSScheduler.register.
+		"""
+		self.scheduler = scheduler
+		self.session_class = session_class
+		self.bucket = TokenBucket(session_class.rate, session_class.burst, scheduler.clock) \
+			if session_class.rate is not None else None
+		# seconds until the last throttled request could be admitted
+		self.retry_after = 0
+
+	def admit(self, cost=1, source="action"):
+		"""
+		@param cost 	number of actions, e.g. the length of a batch
+		@param source 	"action" for actions sent by the client, "loop" for ticks of looped actions
+		@return True if the session may execute the actions now
+		"""
+		return self.scheduler.admit(self, cost, source)
+
+class QoSScheduler:
+	def __init__(self, capacity=None, reserve_step=0.25, classes=DEFAULT_CLASSES, clock=time.monotonic):
+		"""
+		Admission control for the actions of all sessions of a server. Each session has a
+		budget (token bucket) of its class. Additionally, all actions draw from a shared
+		bucket holding the server capacity: sessions of priority p are only admitted while
+		more than p * reserve_step of it is left. The highest priority (0) is always admitted
+		within its budget and uses up the shared capacity first, so lower priorities absorb
+		the load while the higher ones keep their latency.
+		Requests costing more than a bucket holds (e.g. a large batch) are admitted once it
+		is full and charged in full, leaving the bucket in debt: the session then waits
+		until its average rate is back within its budget.
+		Decisions are counted in the metrics as qos.admitted.<class>.<source> and
+		qos.throttled.<class>.<source>; the gauge qos.capacity_left holds the shared tokens.
+		@param capacity 	actions per second the server should execute at most, None to only
+			enforce the budgets of the sessions
+		@param reserve_step 	fraction of the capacity reserved per priority level
+		@param classes 	dict mapping class names to SessionClass instances
+		@param clock 	function returning the current time in seconds
+		"""
+		self.classes = classes
+		self.clock = clock
+		self.reserve_step = reserve_step
+		self.shared = TokenBucket(capacity, capacity, clock) if capacity else None
+		self.sessions = dict()
+		self.lock = threading.Lock()
+
+	def register(self, session_id, class_name):
+		"""
+		@param session_id 	id of the session, e.g. the socket session id
+		@param class_name 	name of one of the classes
+		@return SessionBudget, raises KeyError if the class is unknown
+		"""
+		budget = SessionBudget(self, self.classes[class_name])
+		with self.lock:
+			self.sessions[session_id] = budget
+		metrics.add_gauge("qos.sessions." + class_name, 1)
+		return budget
+
+	def unregister(self, session_id):
+		with self.lock:
+			budget = self.sessions.pop(session_id, None)
+		if budget is not None:
+			metrics.add_gauge("qos.sessions." + budget.session_class.name, -1)
+
+	def admit(self, budget, cost=1, source="action"):
+		"""
+		See SessionBudget.admit.
+		"""
+		session_class = budget.session_class
+		with self.lock:
+			admitted = budget.bucket is None or budget.bucket.take(cost)
+			if not admitted:
+				budget.retry_after = budget.bucket.wait_time(cost)
+			elif self.shared is not None:
+				reserve = session_class.priority * self.reserve_step * self.shared.burst
+				if session_class.priority == 0:
+					self.shared.spend(cost)
+				elif not self.shared.take(cost, reserve):
+					# the session keeps its budget for later
+					if budget.bucket is not None:
+						budget.bucket.give_back(cost)
+					budget.retry_after = self.shared.wait_time(cost, reserve)
+					admitted = False
+			if self.shared is not None:
+				metrics.set_gauge("qos.capacity_left", self.shared.tokens)
+		metrics.inc("qos.{}.{}.{}".format("admitted" if admitted else "throttled", session_class.name, source), cost)
+		return admitted
@@ -0,0 +1,285 @@
+import json, queue, sqlite3, threading, time
+from functools import wraps
+from model.config import ConfigOverlay
+from model.metrics import metrics
+
+# seconds between two deletions of expired sessions, see SessionStore max_age
+EXPIRE_INTERVAL = 60
+
+class SessionStore:
+	def __init__(self, path, snapshot_every=200, flush_interval=0.05, max_batch=1000, max_age=None):
+		"""
+		Durable storage of sessions in SQLite: every applied action is appended to a
+		journal, and every snapshot_every actions the state is saved as a snapshot that
+		replaces the journal so far. A session is restored by loading its snapshot and
+		replaying the journal entries after it. Writes are queued and done in batches by
+		a background thread, so recording an action does not wait for the disk.
+		@param path 	SQLite database file, created if it does not exist
+		@param snapshot_every 	number of journal entries after which a snapshot is taken
+		@param flush_interval 	seconds to collect further writes before a batch is committed
+		@param max_batch 	maximal number of writes per transaction
+		@param max_age 	Optional: sessions without writes for this many seconds are deleted
+			by the background thread, checked every EXPIRE_INTERVAL seconds. Default: keep all
+		"""
+		self.path = path
+		self.snapshot_every = snapshot_every
+		self.flush_interval = flush_interval
+		self.max_batch = max_batch
+		self.max_age = max_age
+		self.next_expiry = time.time()
+		connection = sqlite3.connect(path)
+		with connection:
+			connection.execute("PRAGMA journal_mode=WAL")
+			connection.execute("CREATE TABLE IF NOT EXISTS snapshots "
+				"(session TEXT PRIMARY KEY, seq INTEGER, config TEXT, state TEXT, updated REAL)")
+			connection.execute("CREATE TABLE IF NOT EXISTS journal "
+				"(session TEXT, seq INTEGER, action TEXT, args TEXT, PRIMARY KEY (session, seq))")
+		connection.close()
+		self.queue = queue.Queue()
+		self.writer = threading.Thread(target=self._write_loop, daemon=True)
+		self.writer.start()
+
+	# --- writing --- #
+
+	def record(self, session, seq, action, args, kwargs):
+		"""
+		Queue a journal entry.
+		@param session 	session key
+		@param seq 	sequence number of the entry within the session
+		@param action 	name of the Model method that was applied
+		@param args 	JSON-serializable positional arguments of the call
+		@param kwargs 	JSON-serializable keyword arguments of the call
+		"""
+		# serialized by the writer thread
+		self.queue.put(("journal", session, seq, action, {"args": args, "kwargs": kwargs}))
+
+	def snapshot(self, session, seq, model):
+		"""
+		Queue a snapshot of a model's configuration and state. Journal entries up to
+		seq are deleted once the snapshot is written.
+		"""
+		# copied here, serialized by the writer thread
+		self.queue.put(("snapshot", session, seq, dict(_config_overrides(model.config)), model.state.copy()))
+
+	def delete(self, session):
+		"""
+		Queue the removal of all data of a session.
+		"""
+		self.queue.put(("delete", session))
+
+	def expire(self, max_age):
+		"""
+		Queue the removal of all sessions without writes for max_age seconds.
+		"""
+		self.queue.put(("expire", time.time() - max_age))
+
+	def flush(self):
+		"""
+		Block until all queued writes are committed.
+		"""
+		self.queue.join()
+
+	def close(self):
+		self.queue.put(None)
+		self.writer.join()
+
+	def _write_loop(self):
+		connection = sqlite3.connect(self.path)
+		connection.execute("PRAGMA synchronous=NORMAL")
+		running = True
+		while running:
+			batch = [self.queue.get()]
+			# collect what arrives within flush_interval into the same transaction
+			deadline = time.time() + self.flush_interval
+			while len(batch) < self.max_batch and batch[-1] is not None:
+				try:
+					batch.append(self.queue.get(timeout=max(0, deadline - time.time())))
+				except queue.Empty:
+					break
+			running = batch[-1] is not None
+			writes = [item for item in batch if item is not None]
+			# stale sessions are deleted along with the writes, at most every EXPIRE_INTERVAL seconds
+			if self.max_age is not None and time.time() >= self.next_expiry:
+				writes.append(("expire", time.time() - self.max_age))
+				self.next_expiry = time.time() + EXPIRE_INTERVAL
+			try:
+				self._write_batch(connection, writes)
+			except sqlite3.Error as e:
+				print("Error at SessionStore: could not write {} entries: {}".format(len(batch), e))
+			for _ in batch:
+				self.queue.task_done()
+		connection.close()
+
+	@metrics.timed("store.write_batch")
+	def _write_batch(self, connection, batch):
+		# sessions with new journal entries, their last write time is updated once per batch
+		active = set()
+		with connection:
+			for item in batch:
+				if item[0] == "journal":
+					_, session, seq, action, args = item
+					connection.execute("INSERT OR REPLACE INTO journal VALUES (?, ?, ?, ?)",
+						(session, seq, action, json.dumps(args)))
+					active.add(session)
+				elif item[0] == "snapshot":
+					_, session, seq, config, state = item
+					connection.execute("INSERT OR REPLACE INTO snapshots VALUES (?, ?, ?, ?, ?)",
+						(session, seq, json.dumps(config), json.dumps(state.to_dict()), time.time()))
+					connection.execute("DELETE FROM journal WHERE session = ? AND seq <= ?", (session, seq))
+				elif item[0] == "delete":
+					connection.execute("DELETE FROM snapshots WHERE session = ?", item[1:])
+					connection.execute("DELETE FROM journal WHERE session = ?", item[1:])
+				elif item[0] == "expire":
+					now = time.time()
+					connection.executemany("UPDATE snapshots SET updated = ? WHERE session = ?",
+						[(now, session) for session in active])
+					active = set()
+					# journal entries without a snapshot are left over from deleted sessions
+					connection.execute("DELETE FROM snapshots WHERE updated < ?", item[1:])
+					connection.execute("DELETE FROM journal WHERE session NOT IN (SELECT session FROM snapshots)")
+			connection.executemany("UPDATE snapshots SET updated = ? WHERE session = ?",
+				[(time.time(), session) for session in active])
+		metrics.inc("store.writes", len(batch))
+
+	# --- reading --- #
+
+	def sessions(self):
+		"""
+		@return list of the keys of all stored sessions
+		"""
+		self.flush()
+		connection = sqlite3.connect(self.path)
+		try:
+			return [row[0] for row in connection.execute(
+				"SELECT session FROM snapshots UNION SELECT session FROM journal")]
+		finally:
+			connection.close()
+
+	def load(self, session):
+		"""
+		@return None if nothing is stored for the session, otherwise a tuple of the
+			sequence number of the snapshot, the config overrides and state of the
+			snapshot (both None if there is no snapshot) and the list of (seq, action,
+			arguments) journal entries after the snapshot
+		"""
+		self.flush()
+		connection = sqlite3.connect(self.path)
+		try:
+			snapshot = connection.execute("SELECT seq, config, state FROM snapshots WHERE session = ?",
+				(session,)).fetchone()
+			snapshot_seq = snapshot[0] if snapshot else 0
+			entries = connection.execute("SELECT seq, action, args FROM journal "
+				"WHERE session = ? AND seq > ? ORDER BY seq", (session, snapshot_seq)).fetchall()
+		finally:
+			connection.close()
+		if not snapshot and not entries:
+			return None
+		config = json.loads(snapshot[1]) if snapshot else None
+		state = json.loads(snapshot[2]) if snapshot else None
+		return snapshot_seq, config, state, [(seq, action, json.loads(args)) for seq, action, args in entries]
+
+	@metrics.timed("store.restore")
+	def restore(self, model, session, create=True):
+		"""
+		Rebuild a session in the given model and start journaling its actions.
+		The actions are replayed on a separate model without views, so the
+		model's clients only receive the final state.
+		@param model 	Model instance, e.g. just created for a reconnecting client
+		@param session 	session key
+		@param create 	Optional: if the session is not stored, start it with the model's
+			state (a snapshot is stored right away). Otherwise, the model is left unchanged.
+			Default: True
+		@return True if the session was found, False if it starts empty or was not found
+		"""
+		stored = self.load(session)
+		if not stored and not create:
+			return False
+		seq = 0
+		if stored:
+			seq, config, state, entries = stored
+			replay = model.__class__(model.config, _NoViews(), session)
+			if config:
+				replay.set_config(config)
+			if state:
+				replay.set_state(state)
+			for seq, action, args in entries:
+				getattr(replay, action)(*args["args"], **args["kwargs"])
+			metrics.inc("store.replayed", len(entries))
+			model.config = replay.config
+			model.state = replay.state
+		model.journal = SessionJournal(self, session, seq)
+		if not stored or stored[3]:
+			# a new session is stored at once, replayed entries are folded into a new snapshot
+			model.journal.snapshot(model)
+		return stored is not None
+
+class SessionJournal:
+	def __init__(self, store, session, seq=0):
+		"""
+		Records the actions of a single model, see the journaled decorator.
+		@param store 	SessionStore to write to
+		@param session 	session key
+		@param seq 	sequence number of the last stored entry
+		"""
+		self.store = store
+		self.session = session
+		self.seq = seq
+		self.since_snapshot = 0
+		self.lock = threading.Lock()
+
+	def record(self, model, action, args, kwargs):
+		with self.lock:
+			self.seq += 1
+			self.since_snapshot += 1
+			self.store.record(self.session, self.seq, action, args, kwargs)
+			if self.since_snapshot >= self.store.snapshot_every:
+				self._snapshot(model)
+
+	def snapshot(self, model):
+		with self.lock:
+			self._snapshot(model)
+
+	def _snapshot(self, model):
+		self.store.snapshot(self.session, self.seq, model)
+		self.since_snapshot = 0
+
+def journaled(snapshot=False):
+	"""
+	Decorator for Model methods that change the state. If the model has a journal,
+	calls that changed the state are recorded. Use snapshot=True for methods that
+	replace the state or configuration: a snapshot is recorded instead.
+	"""
+	def decorator(fn):
+		@wraps(fn)
+		def wrapper(model, *args, **kwargs):
+			journal = getattr(model, "journal", None)
+			if journal is None:
+				return fn(model, *args, **kwargs)
+			state, version = model.state, model.state.version
+			result = fn(model, *args, **kwargs)
+			if snapshot:
+				journal.snapshot(model)
+			elif model.state is not state or model.state.version != version:
+				journal.record(model, fn.__name__, list(args), kwargs)
+			return result
+		return wrapper
+	return decorator
+
+def _config_overrides(config):
+	"""
+	@return the settings a session changed, or all settings for a stand-alone Config
+	"""
+	if isinstance(config, ConfigOverlay):
+		return config.get_overrides()
+	return {key: value for key, value in vars(config).items() if not key.startswith("_")}
+
+class _NoViews:
+	# socket replacement for replaying actions without notifying anyone
+	def emit(self, *args, **kwargs):
+		pass
+
+	def start_background_task(self, *args, **kwargs):
+		pass
+
+	def sleep(self, seconds):
+		pass
@@ -0,0 +1,300 @@
+import argparse, json
+
+# --- Exact cover solver for tiling tasks --- #
+# usage: python -m model.solver [-h] [--width WIDTH] [--height HEIGHT] [--types TYPES]
+#	[--pieces PIECES] [--limit LIMIT] [--out OUT]
+# Tiles a region of the board with a fixed set of object types, each used once in
+# any of its 8 orientations, e.g. to check that a target region can be filled or
+# to generate goal states. Writes the solutions as states (see solution_to_state).
+
+# transformations of cells: (x, y) mapped to one of the 8 rotations and reflections
+TRANSFORMS = (
+	lambda x, y: (x, y), lambda x, y: (-y, x), lambda x, y: (-x, -y), lambda x, y: (y, -x),
+	lambda x, y: (-x, y), lambda x, y: (y, x), lambda x, y: (x, -y), lambda x, y: (-y, -x)
+)
+
+class ExactCover:
+	def __init__(self, n_primary, rows, n_secondary=0):
+		"""
+		Exact cover problem: find sets of rows that cover each primary column exactly once
+		and each secondary column at most once. Solved by Knuth's Algorithm X, which is usually
+		implemented with dancing links (doubly linked nodes unlinked and relinked in place).
+		In Python, updating thousands of nodes per step dominates, so the rows of each column
+		are kept as a bitset (int) instead: covering the column of a chosen row is a single
+		AND with the precomputed set of rows conflicting with it, which runs in C.
+		@param n_primary 	number of primary columns, indices 0 to n_primary-1
+		@param rows 	list of rows, each a list of the column indices it covers
+		@param n_secondary 	number of secondary columns, indices n_primary to n_primary+n_secondary-1
+		"""
+		self.n_primary = n_primary
+		self.n_rows = len(rows)
+		# rows of each column
+		self.column_rows = [0] * (n_primary + n_secondary)
+		for row, columns in enumerate(rows):
+			for column in columns:
+				self.column_rows[column] |= 1 << row
+		# rows sharing a column with each row (including the row itself)
+		self.conflicts = list()
+		# primary columns of each row
+		self.row_columns = list()
+		for columns in rows:
+			conflicts = 0
+			primary = 0
+			for column in columns:
+				conflicts |= self.column_rows[column]
+				if column < n_primary:
+					primary |= 1 << column
+			self.conflicts.append(conflicts)
+			self.row_columns.append(primary)
+
+	def solve(self, limit=None):
+		"""
+		Enumerate the solutions. The search branches on the uncovered primary column with
+		the fewest remaining rows and backtracks as soon as a column has none left.
+		@param limit 	maximum number of solutions, None for all
+		@return generator of solutions, each a list of row indices in the order they were chosen
+		"""
+		if limit is not None and limit <= 0:
+			return
+		found = 0
+		for solution in self._search((1 << self.n_rows) - 1, 0, list()):
+			yield solution
+			found += 1
+			if limit is not None and found >= limit:
+				return
+
+	def _search(self, alive, covered, chosen):
+		column_rows = self.column_rows
+		best, best_count = None, self.n_rows + 1
+		uncovered = ~covered & ((1 << self.n_primary) - 1)
+		while uncovered:
+			lowest = uncovered & -uncovered
+			uncovered ^= lowest
+			column = lowest.bit_length() - 1
+			# bin().count instead of int.bit_count, which needs Python 3.10
+			count = bin(column_rows[column] & alive).count("1")
+			if count < best_count:
+				best, best_count = column, count
+				if count <= 1:
+					break
+		if best is None:
+			yield list(chosen)
+			return
+		candidates = column_rows[best] & alive
+		while candidates:
+			lowest = candidates & -candidates
+			candidates ^= lowest
+			row = lowest.bit_length() - 1
+			chosen.append(row)
+			yield from self._search(alive & ~self.conflicts[row], covered | self.row_columns[row], chosen)
+			chosen.pop()
+
+def orientations(type_table, type_name):
+	"""
+	Distinct shapes of a type in the 8 orientations (4 rotations, each mirrored or not).
+	@param type_table 	TypeTable, see Config.get_type_table
+	@param type_name 	name of a type
+	@return list of (rotation, mirrored, cells, offset): cells is a sorted tuple of (x, y)
+		shifted to start at (0, 0), offset the position of this origin in the block matrix
+	"""
+	shapes = list()
+	seen = set()
+	for mirrored in (False, True):
+		for rotation in (0, 90, 180, 270):
+			matrix = type_table.get_orientation(type_name, rotation, mirrored)
+			blocks = [(x, y) for y, row in enumerate(matrix) for x, block in enumerate(row) if block]
+			cells, offset = _normalize(blocks)
+			if cells not in seen:
+				seen.add(cells)
+				shapes.append((rotation, mirrored, cells, offset))
+	return shapes
+
+def _normalize(cells):
+	"""
+	@return sorted tuple of the cells shifted to start at (0, 0) and the (x, y) shift
+	"""
+	min_x = min(x for x, _ in cells)
+	min_y = min(y for _, y in cells)
+	return tuple(sorted((x - min_x, y - min_y) for x, y in cells)), (min_x, min_y)
+
+def region_cells(region):
+	"""
+	@param region 	0/1 matrix (list of rows) or iterable of (x, y) cells
+	@return sorted list of the (x, y) cells in the region
+	"""
+	region = list(region)
+	if region and type(region[0]) == list:
+		return sorted((x, y) for y, row in enumerate(region) for x, cell in enumerate(row) if cell)
+	return sorted((int(x), int(y)) for x, y in region)
+
+def symmetries(cells):
+	"""
+	@param cells 	list of (x, y) cells
+	@return functions mapping cells of the region to cells of the region: the rotations and
+		reflections that map the region onto itself, including the identity
+	"""
+	shape, _ = _normalize(cells)
+	result = list()
+	for transform in TRANSFORMS:
+		image = [transform(x, y) for x, y in cells]
+		image_shape, shift = _normalize(image)
+		if image_shape == shape:
+			dx, dy = shift[0] - min(x for x, _ in cells), shift[1] - min(y for _, y in cells)
+			result.append(lambda x, y, transform=transform, dx=dx, dy=dy:
+				(transform(x, y)[0] - dx, transform(x, y)[1] - dy))
+	return result
+
+def placements(region, pieces, type_table):
+	"""
+	All positions of the pieces in the region.
+	@param region 	see region_cells
+	@param pieces 	list of distinct type names
+	@param type_table 	TypeTable of the types
+	@return list of (type name, rotation, mirrored, x, y, cells): x and y are the
+		position of the type's block matrix, cells the sorted region cells covered
+	"""
+	cells = region_cells(region)
+	cell_set = set(cells)
+	result = list()
+	for type_name in pieces:
+		for rotation, mirrored, shape, (offset_x, offset_y) in orientations(type_table, type_name):
+			# the shape's first cell is put on each cell of the region
+			first_x, first_y = shape[0]
+			for x, y in cells:
+				covered = [(x + dx - first_x, y + dy - first_y) for dx, dy in shape]
+				if all(cell in cell_set for cell in covered):
+					result.append((type_name, rotation, mirrored, x - first_x - offset_x,
+						y - first_y - offset_y, covered))
+	return result
+
+def tilings(region, pieces, type_table, limit=None, use_symmetry=True):
+	"""
+	Enumerate the ways to tile the region exactly with the pieces, each used once.
+	Solutions differing by a symmetry of the region (e.g. a mirrored board) are distinct.
+	@param region 	see region_cells
+	@param pieces 	list of distinct type names
+	@param type_table 	TypeTable of the types
+	@param limit 	maximum number of solutions, None for all
+	@param use_symmetry 	True to search only solutions with one of the pieces in a canonical
+		position and derive the others by rotating and mirroring them, if the region is symmetric.
+		Finds the same solutions (in another order), up to 4 (rectangles) or 8 (squares) times faster.
+	@return generator of solutions, each a list of placements (see placements) in the order of pieces
+	"""
+	if len(set(pieces)) != len(pieces):
+		raise ValueError("pieces must be distinct types")
+	cells = region_cells(region)
+	shapes = {type_name: orientations(type_table, type_name) for type_name in pieces}
+	# the pieces have to fill the region exactly
+	if sum(len(shapes[type_name][0][2]) for type_name in pieces) != len(cells):
+		return
+	cell_index = {cell: i for i, cell in enumerate(cells)}
+	piece_index = {type_name: len(cells) + i for i, type_name in enumerate(pieces)}
+	options = placements(cells, pieces, type_table)
+	group = symmetries(cells) if use_symmetry else [lambda x, y: (x, y)]
+	if len(group) > 1:
+		options = _canonical_options(options, group)
+	problem = ExactCover(len(cells) + len(pieces),
+		[[piece_index[option[0]]] + [cell_index[cell] for cell in option[5]] for option in options])
+	solutions = problem.solve()
+	if len(group) > 1:
+		solutions = _expand(solutions, options, group, shapes)
+	else:
+		solutions = ([options[row] for row in rows] for rows in solutions)
+	found = 0
+	for solution in solutions:
+		yield sorted(solution, key=lambda option: piece_index[option[0]])
+		found += 1
+		if limit is not None and found >= limit:
+			return
+
+def is_tileable(region, pieces, type_table):
+	"""
+	@return True if the region can be tiled exactly with the pieces, each used once
+	"""
+	return next(tilings(region, pieces, type_table, limit=1, use_symmetry=False), None) is not None
+
+def _canonical_options(options, group):
+	"""
+	Restrict the piece with the fewest canonical placements to those that are the smallest
+	of their images under the symmetries: every solution is an image of a remaining one.
+	@return the reduced list of placements
+	"""
+	canonical = dict()
+	for option in options:
+		images = [tuple(sorted(transform(x, y) for x, y in option[5])) for transform in group]
+		if tuple(option[5]) == min(images):
+			canonical.setdefault(option[0], list()).append(option)
+	counts = {type_name: sum(1 for option in options if option[0] == type_name) for type_name in canonical}
+	restricted = min(canonical, key=lambda type_name: len(canonical[type_name]) / counts[type_name])
+	return [option for option in options if option[0] != restricted] + canonical[restricted]
+
+def _expand(solutions, options, group, shapes):
+	"""
+	@return generator of the distinct images of the solutions under the symmetries, as lists of placements
+	"""
+	# normalized shape of each piece orientation mapped to its rotation, mirroring and offset
+	lookup = {(type_name, shape): (rotation, mirrored, offset)
+		for type_name in shapes for rotation, mirrored, shape, offset in shapes[type_name]}
+	seen = set()
+	for rows in solutions:
+		for transform in group:
+			solution = list()
+			for row in rows:
+				type_name = options[row][0]
+				covered = sorted(transform(x, y) for x, y in options[row][5])
+				shape, (x, y) = _normalize(covered)
+				rotation, mirrored, (offset_x, offset_y) = lookup[(type_name, shape)]
+				solution.append((type_name, rotation, mirrored, x - offset_x, y - offset_y, covered))
+			key = frozenset((option[0], tuple(option[5])) for option in solution)
+			if key not in seen:
+				seen.add(key)
+				yield solution
+
+def solution_to_state(solution, type_table, colors=None):
+	"""
+	@param solution 	list of placements, see tilings
+	@param type_table 	TypeTable of the types
+	@param colors 	optional list of colors, assigned to the pieces in turn
+	@return state dictionary, e.g. for Model.set_state
+	"""
+	objs = dict()
+	for i, (type_name, rotation, mirrored, x, y, _) in enumerate(solution):
+		matrix = type_table.get_orientation(type_name, rotation, mirrored)
+		objs[str(i)] = {
+			"type": type_name,
+			"x": x,
+			"y": y,
+			"width": len(matrix[0]),
+			"height": len(matrix),
+			"rotation": rotation,
+			"mirrored": mirrored,
+			"color": colors[i % len(colors)] if colors else "grey"
+		}
+	return {"grippers": dict(), "objs": objs}
+
+parser = argparse.ArgumentParser(description="Tile a rectangle with object types, each used once.")
+parser.add_argument("--width", type=int, default=10,
+	help="Width of the region. Default: 10.")
+parser.add_argument("--height", type=int, default=6,
+	help="Height of the region. Default: 6.")
+parser.add_argument("--types", type=str, default="app/static/resources/config/pentomino_types.json",
+	help="Type configuration. Default: the pentomino types.")
+parser.add_argument("--pieces", type=lambda arg: arg.split(","), default=None,
+	help="Comma-separated type names to use. Default: all types.")
+parser.add_argument("--limit", type=int, default=None,
+	help="Stop after this many solutions. Default: enumerate all.")
+parser.add_argument("--out", type=str, default=None,
+	help="Optional file to write the solutions to as a JSON list of states.")
+
+if __name__ == "__main__":
+	from model.config import Config
+	args = parser.parse_args()
+	config = Config(args.types)
+	table = config.get_type_table()
+	pieces = args.pieces or list(table.types)
+	region = [[1] * args.width for _ in range(args.height)]
+	solutions = list(tilings(region, pieces, table, args.limit))
+	print("{} solutions".format(len(solutions)))
+	if args.out:
+		with open(args.out, mode="w", encoding="utf-8") as file:
+			file.write(json.dumps([solution_to_state(solution, table, config.colors) for solution in solutions]))
@@ -0,0 +1,74 @@
+from math import ceil, floor
+
+class ChunkIndex:
+	def __init__(self, chunk_size=16):
+		"""
+		Sparse spatial index of objects: the board is divided into square chunks and
+		each chunk lists the objects whose bounding box overlaps it. Only chunks with
+		objects exist, so memory and lookups depend on the number of objects near the
+		queried area, not on the board size.
+		@param chunk_size 	chunk width and height in blocks
+		"""
+		self.chunk_size = chunk_size
+		self.chunks = dict() # (chunk x, chunk y) -> set of object ids
+		self.where = dict() # object id -> range of chunks (x0, y0, x1, y1), inclusive
+		# object id -> insertion number, so query results can be returned in insertion order
+		self.order = dict()
+		self.inserted = 0
+
+	def _range(self, x0, y0, x1, y1):
+		size = self.chunk_size
+		return (floor(x0 / size), floor(y0 / size), floor(x1 / size), floor(y1 / size))
+
+	def update(self, obj_id, obj):
+		"""
+		Add an object or register its new position.
+		@param obj_id 	object id
+		@param obj 	Obj instance
+		"""
+		size = self.chunk_size
+		# the far edges are exclusive: an object ending at a chunk border is not in the next chunk
+		new_range = (floor(obj.x / size), floor(obj.y / size),
+			ceil((obj.x + obj.width) / size) - 1, ceil((obj.y + obj.height) / size) - 1)
+		old_range = self.where.get(obj_id)
+		if old_range == new_range:
+			return
+		if old_range is not None:
+			self._discard(obj_id, old_range)
+		else:
+			self.order[obj_id] = self.inserted
+			self.inserted += 1
+		cx0, cy0, cx1, cy1 = new_range
+		for cx in range(cx0, cx1 + 1):
+			for cy in range(cy0, cy1 + 1):
+				self.chunks.setdefault((cx, cy), set()).add(obj_id)
+		self.where[obj_id] = new_range
+
+	def remove(self, obj_id):
+		old_range = self.where.pop(obj_id, None)
+		if old_range is not None:
+			self._discard(obj_id, old_range)
+			del self.order[obj_id]
+
+	def _discard(self, obj_id, chunk_range):
+		cx0, cy0, cx1, cy1 = chunk_range
+		for cx in range(cx0, cx1 + 1):
+			for cy in range(cy0, cy1 + 1):
+				chunk = self.chunks[(cx, cy)]
+				chunk.discard(obj_id)
+				if not chunk:
+					del self.chunks[(cx, cy)]
+
+	def query(self, x0, y0, x1, y1):
+		"""
+		@return list of the ids of objects in the chunks overlapping the area, in insertion
+			order. Candidates only: the objects' bounding boxes might not overlap the area itself.
+		"""
+		cx0, cy0, cx1, cy1 = self._range(x0, y0, x1, y1)
+		found = set()
+		for cx in range(cx0, cx1 + 1):
+			for cy in range(cy0, cy1 + 1):
+				chunk = self.chunks.get((cx, cy))
+				if chunk:
+					found |= chunk
+		return sorted(found, key=self.order.__getitem__)
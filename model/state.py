@@ -1,15 +1,143 @@
-from copy import deepcopy
+from copy import copy, deepcopy
+from math import floor
+from model.metrics import metrics
+from model.zobrist import zobrist
+from model.spatial import ChunkIndex
 
 class State:
 	def __init__(self):
 		self.objs = dict() # maps ids to Objs
 		self.grippers = dict()
+		# incremented at every change, e.g. to invalidate data derived from the state
+		self.version = 0
+		# Zobrist hash, computed on first use and then updated incrementally
+		self.hash = None
+		# ChunkIndex of the object positions, built on first use and then updated incrementally
+		self.index = None
+		# static objects (e.g. walls) can't be gripped or moved. They are kept apart from
+		# objs, see set_static
+		self.static = dict()
+		self.static_mask = frozenset()
+		self.static_index = ChunkIndex()
+		# changed objects and grippers to restore on rollback, see begin_undo
+		self.undo_log = None
 		
-	def get_obj_dict(self):
+	@metrics.timed("state.get_obj_dict")
+	def get_obj_dict(self, area=None):
 		"""
+		@param area 	optional (x0, y0, x1, y1): only include objects overlapping this rectangle
 		@return Dictionary mapping object ids to object dictionaries
 		"""
-		return {obj_id: obj.to_dict() for obj_id, obj in self.objs.items()}
+		if area is None:
+			return {obj_id: obj.to_dict() for obj_id, obj in self.objs.items()}
+		return {obj_id: self.objs[obj_id].to_dict() for obj_id in self.get_objs_in_area(*area)}
+
+	def get_objs_in_area(self, x0, y0, x1, y1):
+		"""
+		Uses the spatial index, so the cost depends on the objects near the area only.
+		@return list of the ids of objects whose bounding box overlaps the rectangle
+		"""
+		return [obj_id for obj_id in self.get_index().query(x0, y0, x1, y1)
+			if self._overlaps_area(self.objs[obj_id], x0, y0, x1, y1)]
+
+	def _overlaps_area(self, obj, x0, y0, x1, y1):
+		return obj.x < x1 and obj.x + obj.width > x0 and obj.y < y1 and obj.y + obj.height > y0
+
+	def get_hash(self):
+		"""
+		64-bit hash of the objects' quantized positions and orientations, the grippers'
+		positions and the gripped objects (see model/zobrist.py). After the first call,
+		all changes made through the State methods update the hash incrementally.
+		Call invalidate_hash() after changing objects or grippers directly.
+		@return int
+		"""
+		if self.hash is None:
+			self.hash = zobrist.hash_state(self)
+		return self.hash
+
+	def invalidate_hash(self):
+		self.hash = None
+
+	def get_index(self):
+		"""
+		Spatial index of the objects (see model/spatial.py). After the first call, moves
+		made through the State methods update it. Call invalidate_index() after adding,
+		removing or moving objects directly.
+		@return ChunkIndex
+		"""
+		if self.index is None:
+			index = ChunkIndex()
+			for obj_id, obj in self.objs.items():
+				index.update(obj_id, obj)
+			self.index = index
+		return self.index
+
+	def invalidate_index(self):
+		self.index = None
+
+	def _toggle_obj(self, id):
+		# XOR the object's features in or out of the hash
+		if self.hash is not None:
+			self.hash ^= zobrist.obj_key(id, self.objs[id])
+
+	def _toggle_gr(self, id):
+		# XOR the gripper's features in or out of the hash
+		if self.hash is not None:
+			self.hash ^= zobrist.gripper_key(id, self.grippers[id])
+
+	def begin_undo(self):
+		"""
+		Record the changes made through the State methods from now on, so they can be
+		undone with rollback(), e.g. for atomic batches. Unlike working on a copy(), the
+		cost depends on the changed objects only and the spatial index is kept.
+		"""
+		self.undo_log = {"hash": self.hash, "version": self.version, "objs": dict(), "grippers": dict()}
+
+	def end_undo(self):
+		"""
+		Keep the changes since begin_undo().
+		"""
+		self.undo_log = None
+
+	def rollback(self):
+		"""
+		Undo the changes since begin_undo(), including the version.
+		"""
+		log, self.undo_log = self.undo_log, None
+		for obj_id, (obj, saved) in log["objs"].items():
+			vars(obj).update(saved)
+			if self.index is not None:
+				self.index.update(obj_id, obj)
+		for gripper, saved in log["grippers"].values():
+			vars(gripper).update(saved)
+		self.hash = log["hash"]
+		self.version = log["version"]
+
+	def _save_obj(self, id):
+		# keep the attributes of an object before its first change, see begin_undo
+		if self.undo_log is not None and id not in self.undo_log["objs"]:
+			self.undo_log["objs"][id] = (self.objs[id], vars(self.objs[id]).copy())
+
+	def _save_gr(self, id):
+		if self.undo_log is not None and id not in self.undo_log["grippers"]:
+			self.undo_log["grippers"][id] = (self.grippers[id], vars(self.grippers[id]).copy())
+
+	def copy(self):
+		"""
+		Copy of this state that can be changed independently, e.g. a fresh board
+		from a task template. Block matrices are shared: State methods replace
+		them instead of changing them in place.
+		@return State instance
+		"""
+		state = State()
+		state.objs = {obj_id: copy(obj) for obj_id, obj in self.objs.items()}
+		state.grippers = {gr_id: copy(gripper) for gr_id, gripper in self.grippers.items()}
+		state.hash = self.hash
+		# static objects never change
+		state.static = self.static
+		state.static_mask = self.static_mask
+		state.static_index = self.static_index
+		return state
 
 	def get_object_ids(self): 
 		return self.objs.keys()
@@ -23,14 +151,20 @@ class State:
 		else:
 			return None
 
-	def get_gripper_dict(self):
+	@metrics.timed("state.get_gripper_dict")
+	def get_gripper_dict(self, area=None):
 		"""
 		In contrast to get_obj_dict, each gripper dict has the entry "gripped", which itself
 		is None or a dictionary mapping the gripped object to an object dictionary.
+		@param area 	optional (x0, y0, x1, y1): only include grippers inside this rectangle
+			or holding an object that overlaps it
 		@return Dictionary mapping gripper ids to gripper dictionaries.
 		"""
 		gr_dict = dict()
 		for gr_id, gr in self.grippers.items():
+			if area is not None and not (area[0] <= gr.x <= area[2] and area[1] <= gr.y <= area[3]) and \
+				not (gr.gripped and self._overlaps_area(self.objs[gr.gripped], *area)):
+				continue
 			gr_dict[gr_id] = gr.to_dict()
 			# if some object is gripped, add all the info on that object too
 			if gr.gripped:
@@ -39,6 +173,62 @@ class State:
 				gr_dict[gr_id]["gripped"] = None
 		return gr_dict
 
+	def get_static_dict(self, area=None):
+		"""
+		@param area 	optional (x0, y0, x1, y1): only include objects overlapping this rectangle
+		@return Dictionary mapping the ids of static objects to object dictionaries
+		"""
+		if area is None:
+			return {obj_id: obj.to_dict() for obj_id, obj in self.static.items()}
+		return {obj_id: self.static[obj_id].to_dict() for obj_id in self.static_index.query(*area)
+			if self._overlaps_area(self.static[obj_id], *area)}
+
+	def set_static(self, static):
+		"""
+		Set the static objects. They are snapped to whole blocks and their blocks are
+		compiled into a set of occupied cells, so checking a block against all static
+		objects takes constant time (see blocked_by_static). Static objects are not part
+		of the hash: they are the same in all states of a task.
+		@param static 	dict mapping ids to Obj instances, must not be changed afterwards
+		"""
+		cells = set()
+		index = ChunkIndex()
+		for obj_id, obj in static.items():
+			obj.x, obj.y = round(obj.x), round(obj.y)
+			for row, blocks in enumerate(obj.block_matrix):
+				for col, block in enumerate(blocks):
+					if block:
+						cells.add((obj.x + col, obj.y + row))
+			index.update(obj_id, obj)
+		self.static = static
+		self.static_mask = frozenset(cells)
+		self.static_index = index
+
+	def blocked_by_static(self, x, y, block_matrix):
+		"""
+		Check whether an object placed at (x, y) would overlap a static object.
+		A block at a fractional position covers up to 2x2 cells of the mask.
+		@return True if some block would overlap
+		"""
+		if not self.static_mask:
+			return False
+		mask = self.static_mask
+		for row, blocks in enumerate(block_matrix):
+			block_y = y + row
+			low_y = floor(block_y)
+			rows = (low_y,) if low_y == block_y else (low_y, low_y + 1)
+			for col, block in enumerate(blocks):
+				if not block:
+					continue
+				block_x = x + col
+				low_x = floor(block_x)
+				cols = (low_x,) if low_x == block_x else (low_x, low_x + 1)
+				for cell_y in rows:
+					for cell_x in cols:
+						if (cell_x, cell_y) in mask:
+							return True
+		return False
+
 	def get_gripper_ids(self):
 		return self.grippers.keys()
 
@@ -67,6 +257,26 @@ class State:
 		else:
 			return None
 	
+	def add_gr(self, id, gripper):
+		"""
+		@param id 	id of the new gripper
+		@param gripper 	Gripper instance
+		"""
+		if id in self.grippers:
+			self._toggle_gr(id)
+		self.grippers[id] = gripper
+		self._toggle_gr(id)
+		self.version += 1
+
+	def remove_gr(self, id):
+		"""
+		@param id 	id of the gripper to remove
+		@return the removed Gripper instance
+		"""
+		self._toggle_gr(id)
+		self.version += 1
+		return self.grippers.pop(id)
+
 	def move_gr(self, id, dx, dy):
 		"""
 		Change gripper position by moving in direction (dx, dy).
@@ -74,8 +284,12 @@ class State:
 	 	@param dx 	x direction
 		@param dy 	y direction 
 		"""
+		self._save_gr(id)
+		self._toggle_gr(id)
 		self.grippers[id].x += dx
 		self.grippers[id].y += dy
+		self._toggle_gr(id)
+		self.version += 1
 	
 	def move_obj(self, id, dx, dy):
 		"""
@@ -84,8 +298,14 @@ class State:
 	 	@param dx 	x direction
 	 	@param dy 	y direction
 		"""
+		self._save_obj(id)
+		self._toggle_obj(id)
 		self.get_obj_by_id(id).x += dx
 		self.get_obj_by_id(id).y += dy
+		self._toggle_obj(id)
+		if self.index is not None:
+			self.index.update(id, self.objs[id])
+		self.version += 1
 
 	def rotate_obj(self, id, d_angle, rotated_matrix=None):
 		"""
@@ -96,12 +316,16 @@ class State:
 		"""
 		if d_angle != 0:
 			obj = self.get_obj_by_id(id)
+			self._save_obj(id)
+			self._toggle_obj(id)
 			obj.rotation = (obj.rotation + d_angle) % 360
 			# update block matrix
 			if rotated_matrix:
 				obj.block_matrix = rotated_matrix
 			else:
 				obj.block_matrix = self.rotate_block_matrix(obj.block_matrix, d_angle)
+			self._toggle_obj(id)
+			self.version += 1
 
 	def flip_obj(self, id, flipped_matrix=None):
 		"""
@@ -111,12 +335,16 @@ class State:
 		"""
 		# change 'mirrored' attribute
 		obj = self.get_obj_by_id(id)
+		self._save_obj(id)
+		self._toggle_obj(id)
 		obj.mirrored = not obj.mirrored
 		# update the block matrix
 		if flipped_matrix:
 			obj.block_matrix = flipped_matrix
 		else:
 			obj.block_matrix = self.flip_block_matrix(obj.block_matrix)
+		self._toggle_obj(id)
+		self.version += 1
 	
 	def grip(self, gr_id, obj_id):
 		"""
@@ -124,16 +352,26 @@ class State:
 		@param gr_id 	id of the gripper that grips obj_id
 		@param obj_id 	id of object to grip, must be in objects
 	 	"""
+		self._save_gr(gr_id)
+		self._save_obj(obj_id)
+		self._toggle_gr(gr_id)
 		self.objs[obj_id].gripped = True
 		self.grippers[gr_id].gripped = obj_id
+		self._toggle_gr(gr_id)
+		self.version += 1
 	
 	def ungrip(self, id):
 		"""
 		Detach the currently gripped object from the gripper.
 		@param id 	id of the gripper that ungrips
 		"""
+		self._save_gr(id)
+		self._save_obj(self.grippers[id].gripped)
+		self._toggle_gr(id)
 		self.objs[self.grippers[id].gripped].gripped = False
 		self.grippers[id].gripped = None
+		self._toggle_gr(id)
+		self.version += 1
 
 	def rotate_block_matrix(self, old_matrix, d_angle):
 		"""
@@ -181,12 +419,19 @@ class State:
 		new_matrix.reverse()
 		return new_matrix
 
-	def to_dict(self):
+	@metrics.timed("state.to_dict")
+	def to_dict(self, area=None, include_static=True):
 		"""
 		Create a JSON-friendly representation of the current state
-		@return dict containing current grippers and objects
+		@param area 	optional (x0, y0, x1, y1): only include grippers and objects in this
+			rectangle, see get_gripper_dict and get_obj_dict
+		@param include_static 	False to leave out the static objects, e.g. for views that
+			already received them
+		@return dict containing current grippers and objects and, optionally, static objects
 		"""
 		state_dict = dict()
-		state_dict["grippers"] = self.get_gripper_dict()
-		state_dict["objs"] = self.get_obj_dict()
+		state_dict["grippers"] = self.get_gripper_dict(area)
+		state_dict["objs"] = self.get_obj_dict(area)
+		if include_static:
+			state_dict["static"] = self.get_static_dict(area)
 		return state_dict
\ No newline at end of file
@@ -0,0 +1,23 @@
+import os
+from model.model import Model
+
+def load_task_templates(directory, config):
+	"""
+	Parse all task files of a directory once. Task files contain a state in the
+	format accepted by Model.set_state, the file name without the extension .json
+	is used as task name.
+	@param directory 	path to the task files
+	@param config 	Config defining the types used by the tasks
+	@return dict mapping task names to State instances, use State.copy() to get a board to play on
+	"""
+	templates = dict()
+	if not os.path.isdir(directory):
+		return templates
+	# only used to parse the files, doesn't notify anyone
+	parser = Model(config, None, None)
+	for filename in sorted(os.listdir(directory)):
+		if filename.endswith(".json"):
+			with open(os.path.join(directory, filename), mode="r", encoding="utf-8") as file:
+				parser._state_from_JSON(file.read())
+			templates[filename[:-len(".json")]] = parser.state
+	return templates
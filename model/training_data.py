@@ -0,0 +1,303 @@
+import argparse, json, os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+import numpy as np
+from model.config import Config
+from model.legal_actions import MOVE_DIRECTIONS, ROTATE_DIRECTIONS
+from model.model import Model
+from model.session_store import _NoViews
+
+# --- Training data from collected sessions --- #
+# usage: python -m model.training_data [-h] [--out OUT] [--types TYPES] [--width WIDTH] [--height HEIGHT]
+#	[--resolution RESOLUTION] [--shard-size SHARD_SIZE] [--workers WORKERS] logs [logs ...]
+# Converts logs saved by /save_log (LogView with logFullState) into (observation, action,
+# next observation) samples for imitation learning. The logs only contain states, so each
+# pair of consecutive states is replayed through a Model: the action is the one that turns
+# the first state into the second. Samples are written to memory-mapped .npy shards of a
+# fixed size with an index file, see ShardDataset for reading them.
+
+# action index -> (Model method, arguments after the gripper id)
+ACTIONS = [("move", direction) for direction in MOVE_DIRECTIONS] + \
+	[("rotate", (direction,)) for direction in ROTATE_DIRECTIONS] + [("flip", ()), ("grip", ())]
+ACTION_NAMES = ["move_left", "move_up", "move_right", "move_down", "rotate_left", "rotate_right", "flip", "grip"]
+
+# observation channels
+CHANNELS = ["objs", "gripped", "grippers"]
+
+def sample_dtype(height, width, resolution):
+	"""
+	@return numpy dtype of one sample: observations are uint8 rasters of shape
+		(channels, height*resolution, width*resolution)
+	"""
+	shape = (len(CHANNELS), height * resolution, width * resolution)
+	return np.dtype([("obs", np.uint8, shape), ("action", np.int8), ("next_obs", np.uint8, shape),
+		("session", np.int32), ("step", np.int32)])
+
+def rasterize(state, types, height, width, resolution):
+	"""
+	Observation of a state. Channel 'objs' holds the type index + 1 of the object covering
+	a cell (0: empty), 'gripped' the same for gripped objects and 'grippers' 1 at the cell
+	of each gripper. A block covers resolution x resolution cells.
+	@param state 	State instance
+	@param types 	list of type names, defines the type indices
+	@return uint8 array of shape (channels, height*resolution, width*resolution)
+	"""
+	obs = np.zeros((len(CHANNELS), height * resolution, width * resolution), dtype=np.uint8)
+	rows, cols = obs.shape[1:]
+	for obj in state.objs.values():
+		channel = obs[1] if obj.gripped else obs[0]
+		value = types.index(obj.type) + 1 if obj.type in types else 255
+		y0, x0 = round(obj.y * resolution), round(obj.x * resolution)
+		for r, blocks in enumerate(obj.block_matrix):
+			for c, block in enumerate(blocks):
+				if block:
+					y, x = y0 + r * resolution, x0 + c * resolution
+					channel[max(0, y):max(0, y + resolution), max(0, x):max(0, x + resolution)] = value
+	for gripper in state.grippers.values():
+		y, x = int(gripper.y * resolution), int(gripper.x * resolution)
+		if 0 <= y < rows and 0 <= x < cols:
+			obs[2, y, x] = 1
+	return obs
+
+def infer_action(model, next_hash):
+	"""
+	Find the single action that turns the model's state into a state with the given hash.
+	The model's state is left unchanged.
+	@return action index or None if no single action (of any gripper) explains the change
+	"""
+	start = model.state
+	try:
+		for gr_id in start.grippers:
+			for index, (action, args) in enumerate(ACTIONS):
+				model.state = start.copy()
+				version = model.state.version
+				getattr(model, action)(gr_id, *args)
+				if model.state.version != version and model.state.get_hash() == next_hash:
+					return index
+	finally:
+		model.state = start
+	return None
+
+def _log_segments(data):
+	"""
+	@return list of (segment name, log) for the top-level log ('log') and each segment
+	"""
+	segments = list()
+	if type(data.get("log")) == list:
+		segments.append(("log", data["log"]))
+	for name, value in data.items():
+		if name != "log" and type(value) == dict and type(value.get("log")) == list:
+			segments.append((name, value["log"]))
+	return segments
+
+def convert_log(path, type_config, height, width, resolution):
+	"""
+	Replay a log file and collect its samples. Runs in a worker process.
+	@return list of (segment name, samples, skipped transitions), samples as a tuple
+		of arrays (obs, action, next_obs, step)
+	"""
+	with open(path, mode="r", encoding="utf-8") as file:
+		data = json.load(file)
+	types = sorted(type_config)
+	results = list()
+	for name, log in _log_segments(data):
+		obs, actions, next_obs, steps = list(), list(), list(), list()
+		skipped = 0
+		model, previous = None, None
+		for step, entry in enumerate(log):
+			if type(entry) != list or len(entry) != 2 or type(entry[1]) != dict or "objs" not in entry[1]:
+				continue
+			snapshot = entry[1]
+			config = snapshot.get("config") or dict()
+			if config.get("width", width) != width or config.get("height", height) != height:
+				# other board size, the observation shape would not fit
+				skipped += 1
+				continue
+			if model is None or _rules(config) != _rules(model.config):
+				model = Model(Config(type_config, **_rules(config)), _NoViews(), "export")
+				previous = None
+			state = _parse_state(model, snapshot)
+			if previous is not None and state.get_hash() != previous.get_hash():
+				model.state = previous
+				action = infer_action(model, state.get_hash())
+				if action is None:
+					skipped += 1
+				else:
+					obs.append(rasterize(previous, types, height, width, resolution))
+					actions.append(action)
+					next_obs.append(rasterize(state, types, height, width, resolution))
+					steps.append(step)
+			previous = state
+		if actions:
+			samples = (np.stack(obs), np.array(actions, dtype=np.int8), np.stack(next_obs),
+				np.array(steps, dtype=np.int32))
+		else:
+			samples = None
+		results.append((name, samples, skipped))
+	return results
+
+def _rules(config):
+	"""
+	@return the settings an action's outcome depends on, from a Config or a logged config dict
+	"""
+	if not isinstance(config, dict):
+		config = vars(config)
+	defaults = {"width": 20, "height": 20, "move_step": 0.5, "rotation_step": 90, "prevent_overlap": True}
+	return {key: config.get(key, default) for key, default in defaults.items()}
+
+def _parse_state(model, snapshot):
+	"""
+	@return State parsed from a logged snapshot
+	"""
+	model.set_state({"objs": snapshot["objs"], "grippers": snapshot.get("grippers") or dict()})
+	return model.state
+
+class ShardWriter:
+	def __init__(self, out_dir, dtype, shard_size):
+		"""
+		Appends samples to .npy shards of shard_size samples each, created as memory maps.
+		@param out_dir 	directory for the shards and index.json, created if necessary
+		@param dtype 	numpy dtype of a sample, see sample_dtype
+		@param shard_size 	samples per shard
+		"""
+		os.makedirs(out_dir, exist_ok=True)
+		self.out_dir = out_dir
+		self.dtype = dtype
+		self.shard_size = shard_size
+		self.shards = list() # dicts with file name and number of samples
+		self.shard = None
+		self.total = 0
+
+	def append(self, session, samples):
+		"""
+		@param session 	session number stored with the samples
+		@param samples 	tuple of arrays (obs, action, next_obs, step) as returned by convert_log
+		"""
+		obs, actions, next_obs, steps = samples
+		written = 0
+		while written < len(actions):
+			if self.shard is None or self.shards[-1]["count"] == self.shard_size:
+				self._new_shard()
+			start = self.shards[-1]["count"]
+			n = min(self.shard_size - start, len(actions) - written)
+			chunk = self.shard[start:start + n]
+			chunk["obs"] = obs[written:written + n]
+			chunk["action"] = actions[written:written + n]
+			chunk["next_obs"] = next_obs[written:written + n]
+			chunk["session"] = session
+			chunk["step"] = steps[written:written + n]
+			self.shards[-1]["count"] += n
+			written += n
+		self.total += written
+
+	def _new_shard(self):
+		if self.shard is not None:
+			self.shard.flush()
+		name = "shard-{:05d}.npy".format(len(self.shards))
+		self.shard = np.lib.format.open_memmap(os.path.join(self.out_dir, name), mode="w+",
+			dtype=self.dtype, shape=(self.shard_size,))
+		self.shards.append({"file": name, "count": 0})
+
+	def close(self, index):
+		"""
+		Flush the last shard and write index.json.
+		@param index 	dict with further information to store in the index
+		@return the complete index
+		"""
+		if self.shard is not None:
+			self.shard.flush()
+			self.shard = None
+		index = dict(index, shard_size=self.shard_size, samples=self.total, shards=self.shards)
+		with open(os.path.join(self.out_dir, "index.json"), mode="w", encoding="utf-8") as file:
+			file.write(json.dumps(index, indent=2))
+		return index
+
+def export(paths, out_dir, type_config, height=20, width=20, resolution=2, shard_size=4096, workers=None):
+	"""
+	Convert log files in parallel and write the samples to shards.
+	@param paths 	list of log files
+	@param out_dir 	output directory
+	@param type_config 	dict mapping type names to block matrices, defines the type indices
+	@param height 	board height in blocks, sessions on other boards are skipped
+	@param width 	board width in blocks
+	@param resolution 	raster cells per block, positions should be multiples of 1/resolution
+	@param shard_size 	samples per shard
+	@param workers 	number of worker processes, None for one per CPU
+	@return the index written to out_dir/index.json
+	"""
+	writer = ShardWriter(out_dir, sample_dtype(height, width, resolution), shard_size)
+	sessions = list()
+	convert = partial(convert_log, type_config=type_config, height=height, width=width, resolution=resolution)
+	with ProcessPoolExecutor(max_workers=workers) as pool:
+		# results arrive in the order of paths, so the output does not depend on scheduling
+		for path, results in zip(paths, pool.map(convert, paths)):
+			for segment, samples, skipped in results:
+				count = len(samples[1]) if samples else 0
+				sessions.append({"source": os.path.basename(path), "segment": segment,
+					"start": writer.total, "count": count, "skipped": skipped})
+				if samples:
+					writer.append(len(sessions) - 1, samples)
+	index = {"height": height, "width": width, "resolution": resolution, "channels": CHANNELS,
+		"actions": ACTION_NAMES, "types": sorted(type_config), "sessions": sessions}
+	return writer.close(index)
+
+class ShardDataset:
+	def __init__(self, out_dir):
+		"""
+		Random access to exported samples. Shards are memory-mapped read-only, so a sample
+		is read from the page cache without copying. dataset[i] returns a numpy record with
+		the fields 'obs', 'action', 'next_obs', 'session' and 'step'.
+		@param out_dir 	directory written by export
+		"""
+		with open(os.path.join(out_dir, "index.json"), mode="r", encoding="utf-8") as file:
+			self.index = json.load(file)
+		self.shard_size = self.index["shard_size"]
+		self.shards = [np.load(os.path.join(out_dir, shard["file"]), mmap_mode="r")
+			for shard in self.index["shards"]]
+
+	def __len__(self):
+		return self.index["samples"]
+
+	def __getitem__(self, i):
+		if i < 0:
+			i += len(self)
+		if not 0 <= i < len(self):
+			raise IndexError("sample index out of range")
+		return self.shards[i // self.shard_size][i % self.shard_size]
+
+def _log_files(paths):
+	files = list()
+	for path in paths:
+		if os.path.isdir(path):
+			files += sorted(os.path.join(path, name) for name in os.listdir(path) if name.endswith(".json"))
+		else:
+			files.append(path)
+	return files
+
+parser = argparse.ArgumentParser(description="Convert collected session logs into memory-mapped training shards.")
+parser.add_argument("logs", nargs="+",
+	help="Log files or directories of log files, e.g. app/static/resources/data_collection.")
+parser.add_argument("--out", type=str, default="training_data",
+	help="Output directory. Default: training_data.")
+parser.add_argument("--types", type=str, default="app/static/resources/config/pentomino_types.json",
+	help="Type configuration defining the type indices. Default: the pentomino types.")
+parser.add_argument("--width", type=int, default=20,
+	help="Board width, sessions on other boards are skipped. Default: 20.")
+parser.add_argument("--height", type=int, default=20,
+	help="Board height. Default: 20.")
+parser.add_argument("--resolution", type=int, default=2,
+	help="Raster cells per block. Default: 2 (the default move step is 0.5).")
+parser.add_argument("--shard-size", type=int, default=4096,
+	help="Samples per shard. Default: 4096.")
+parser.add_argument("--workers", type=int, default=None,
+	help="Worker processes. Default: one per CPU.")
+
+if __name__ == "__main__":
+	args = parser.parse_args()
+	with open(args.types, mode="r", encoding="utf-8") as file:
+		type_config = json.load(file)
+	index = export(_log_files(args.logs), args.out, type_config, args.height, args.width,
+		args.resolution, args.shard_size, args.workers)
+	skipped = sum(session["skipped"] for session in index["sessions"])
+	print("{} samples from {} logs in {} shards, {} transitions skipped".format(index["samples"],
+		len(set(session["source"] for session in index["sessions"])), len(index["shards"]), skipped))
@@ -0,0 +1,104 @@
+import hashlib, json, threading
+from collections import OrderedDict
+
+class TypeTable:
+	def __init__(self, types):
+		"""
+		A type configuration (object types mapped to block matrices), identified by
+		a hash of its content. Type tables must not be changed after creation.
+		@param types 	dict mapping type names to 0/1 block matrices
+		"""
+		self.types = types
+		# canonical serialization, also the body served to clients
+		self.json = json.dumps(types, sort_keys=True, separators=(",", ":"))
+		self.hash = hashlib.sha256(self.json.encode("utf-8")).hexdigest()[:16]
+		# (type, rotation, mirrored) mapped to block matrices, see compile()
+		self.orientations = None
+
+	def compile(self):
+		"""
+		Precompute the block matrices of all types in the 8 orientations
+		(rotations by multiples of 90 degrees, each mirrored or not).
+		@return this instance
+		"""
+		if self.orientations is None:
+			# import here, the state module depends on this one via Config
+			from model.state import State
+			state = State()
+			orientations = dict()
+			for type_name, matrix in self.types.items():
+				for rotation in (0, 90, 180, 270):
+					rotated = state.rotate_block_matrix(matrix, rotation)
+					orientations[(type_name, rotation, False)] = rotated
+					orientations[(type_name, rotation, True)] = state.flip_block_matrix(rotated)
+			self.orientations = orientations
+		return self
+
+	def get_orientation(self, type_name, rotation=0, mirrored=False):
+		"""
+		Block matrix of a type rotated by the given angle (rounded to a multiple of 90
+		degrees like State.rotate_block_matrix) and then mirrored if requested.
+		The matrix is shared, it must not be changed in place.
+		@return 0/1 block matrix, raises KeyError for unknown types
+		"""
+		if self.orientations is None:
+			self.compile()
+		return self.orientations[(type_name, round((rotation % 360)/90) * 90 % 360, bool(mirrored))]
+
+class TypeRegistry:
+	def __init__(self, max_tables=256):
+		"""
+		All type tables in use, keyed by content hash. Configurations send the hash
+		to clients instead of the table; clients fetch tables they don't have yet
+		from the /types/<hash> route. Tasks with different shape sets each register
+		their own table.
+		Clients can register tables with load_config, so the number of tables is
+		bounded: the least recently used table is dropped when max_tables is exceeded.
+		Sessions keep the types of a dropped table; as soon as a session sends its
+		configuration again (which looks up the table), the table is registered anew.
+		@param max_tables 	maximal number of registered tables
+		"""
+		self.max_tables = max_tables
+		# hashes mapped to tables, least recently used first
+		self.tables = OrderedDict()
+		# id of a registered types dict mapped to the dict and its table, makes repeated
+		# lookups O(1). The dict is referenced here, so its id can't be reused.
+		self.by_identity = dict()
+		self.lock = threading.Lock()
+
+	def register(self, types):
+		"""
+		@param types 	dict mapping type names to 0/1 block matrices
+		@return TypeTable for the given types, created if necessary
+		"""
+		known = self.by_identity.get(id(types))
+		if known is not None and known[0] is types:
+			with self.lock:
+				if known[1].hash in self.tables:
+					self.tables.move_to_end(known[1].hash)
+					return known[1]
+		new_table = TypeTable(types)
+		with self.lock:
+			# identical content registered before: use the existing table.
+			# Only the table's own dict is memoized, copies would pile up otherwise.
+			table = self.tables.setdefault(new_table.hash, new_table)
+			self.tables.move_to_end(table.hash)
+			if table is new_table:
+				self.by_identity[id(types)] = (types, table)
+			while len(self.tables) > self.max_tables:
+				_, dropped = self.tables.popitem(last=False)
+				self.by_identity.pop(id(dropped.types), None)
+		return table
+
+	def get(self, type_hash):
+		"""
+		@return TypeTable or None if no table with this hash is registered
+		"""
+		with self.lock:
+			table = self.tables.get(type_hash)
+			if table is not None:
+				self.tables.move_to_end(type_hash)
+		return table
+
+# shared by all sessions
+type_registry = TypeRegistry()
@@ -0,0 +1,126 @@
+from collections import OrderedDict
+from hashlib import blake2b
+
+class ZobristTable:
+	def __init__(self, seed=0, resolution=8, max_keys=1000000):
+		"""
+		Random 64-bit keys for the features of a state: the quantized position of each
+		object and gripper, the orientation (rotation, mirrored) of each object and the
+		object held by each gripper. The hash of a state is the XOR of the keys of its
+		features, so a change only needs to XOR out the old and XOR in the new features.
+		Keys are derived from the feature itself, i.e. they are the same in every process
+		and do not need to be stored.
+		@param seed 	different seeds give independent key sets
+		@param resolution 	positions are quantized to 1/resolution blocks
+		@param max_keys 	derived keys are memoized, the memo is cleared at this size
+		"""
+		self.seed = seed.to_bytes(8, "little")
+		self.resolution = resolution
+		self.max_keys = max_keys
+		self.keys = dict()
+
+	def key(self, *feature):
+		"""
+		@param feature 	hashable tuple of primitive values
+		@return 64-bit key of the feature
+		"""
+		try:
+			return self.keys[feature]
+		except KeyError:
+			if len(self.keys) >= self.max_keys:
+				self.keys.clear()
+			value = int.from_bytes(
+				blake2b(repr(feature).encode("utf-8"), digest_size=8, key=self.seed).digest(), "little")
+			self.keys[feature] = value
+			return value
+
+	def quantize(self, value):
+		return round(value * self.resolution)
+
+	def obj_key(self, obj_id, obj):
+		"""
+		@return XOR of the keys of an object's position and orientation
+		"""
+		return self.key("obj", obj_id, self.quantize(obj.x), self.quantize(obj.y)) ^ \
+			self.key("orientation", obj_id, round(obj.rotation) % 360, obj.mirrored)
+
+	def gripper_key(self, gr_id, gripper):
+		"""
+		@return XOR of the keys of a gripper's position and the object it holds
+		"""
+		return self.key("gripper", gr_id, self.quantize(gripper.x), self.quantize(gripper.y)) ^ \
+			self.key("gripped", gr_id, gripper.gripped)
+
+	def hash_state(self, state):
+		"""
+		Compute the hash of a state from scratch.
+		"""
+		value = 0
+		for obj_id, obj in state.objs.items():
+			value ^= self.obj_key(obj_id, obj)
+		for gr_id, gripper in state.grippers.items():
+			value ^= self.gripper_key(gr_id, gripper)
+		return value
+
+# keys shared by all states
+zobrist = ZobristTable()
+
+class TranspositionCache:
+	def __init__(self, max_size=100000):
+		"""
+		Bounded map from state hashes to search results, e.g. the value of a state or
+		the fact that it was already expanded. The least recently used entry is evicted
+		when the cache is full. Hashes can collide (with probability ~ n^2/2^65 for n
+		distinct states), so store data that tolerates an occasional wrong hit or
+		verify the state in the value.
+		@param max_size 	maximal number of entries
+		"""
+		self.max_size = max_size
+		self.entries = OrderedDict()
+		self.hits = 0
+		self.misses = 0
+		self.evictions = 0
+
+	def get(self, state_hash, default=None):
+		"""
+		@return the value stored for state_hash or default. Counts as hit or miss.
+		"""
+		if state_hash in self.entries:
+			self.hits += 1
+			self.entries.move_to_end(state_hash)
+			return self.entries[state_hash]
+		self.misses += 1
+		return default
+
+	def put(self, state_hash, value):
+		if state_hash in self.entries:
+			self.entries.move_to_end(state_hash)
+		elif len(self.entries) >= self.max_size:
+			self.entries.popitem(last=False)
+			self.evictions += 1
+		self.entries[state_hash] = value
+
+	def __contains__(self, state_hash):
+		return state_hash in self.entries
+
+	def __len__(self):
+		return len(self.entries)
+
+	def clear(self):
+		self.entries.clear()
+		self.hits = 0
+		self.misses = 0
+		self.evictions = 0
+
+	def stats(self):
+		"""
+		@return dict with the entry count, hits, misses, evictions and the hit rate of get
+		"""
+		lookups = self.hits + self.misses
+		return {
+			"size": len(self.entries),
+			"hits": self.hits,
+			"misses": self.misses,
+			"evictions": self.evictions,
+			"hit_rate": self.hits / lookups if lookups else None
+		}
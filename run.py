@@ -1,9 +1,9 @@
 import argparse
-from app import app, socketio, test
+from app import app, socketio, test, preload
 
 # --- GOLMi's server --- # 
 # author: clpresearch, Karla Friedrichs
-# usage: python3 run.py [-h] [--host HOST] [--port PORT] [--test]
+# usage: python3 run.py [-h] [--host HOST] [--port PORT] [--test] [--asgi]
 # Runs on host 127.0.0.1 and port 5000 per default
 
 # --- command line arguments ---
@@ -14,6 +14,8 @@ parser.add_argument("--port", type=str, default="5000",
 	help="Port to run the API on. Default: 5000.")
 parser.add_argument("--test", action="store_true", 
 	help="Pass this argument to perform some tests before the API is run.")
+parser.add_argument("--asgi", action="store_true", 
+	help="Run the asyncio server (app/asgi.py) on uvicorn instead of Flask-SocketIO.")
 
 if __name__ == "__main__":
 	args = parser.parse_args()
@@ -21,4 +23,10 @@ if __name__ == "__main__":
 		# will throw errors if something fails
 		test.selftest()
 		print("All tests passed.")
-	socketio.run(app, host=args.host, port=args.port)
\ No newline at end of file
+	# build shared data before serving
+	preload()
+	if args.asgi:
+		import uvicorn
+		uvicorn.run("app.asgi:asgi_app", host=args.host, port=int(args.port), log_level="warning")
+	else:
+		socketio.run(app, host=args.host, port=args.port)
\ No newline at end of file